@@ -21,6 +21,7 @@ Simple implementation of biometric recognition-related metrics.
 Language: Python 3  
 
 Needed libraries:
+* NumPy (https://numpy.org/)
 * matplotlib (https://matplotlib.org/)
 
 ## Needed libraries and files
@@ -35,6 +36,20 @@ Needed libraries:
 ! cat /content/test.csv
 
 # imported libraries
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import struct
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+print('NumPy version', np.__version__)
+
 import matplotlib as plt
 print(plt.__version__)
 
@@ -106,6 +121,91 @@ assert float('-inf') < _compute_var([10, 20, -30, -0.5, 0.5]) < float('inf')  #
 
 """---"""
 
+# Converts the given observations into a pair of numpy arrays:
+# a boolean array telling which observations are genuine, and an array
+# with the observation scores.
+# Observations must be either an array of (<label>,<score>) elements or
+# a (<labels>, <scores>) pair of numpy arrays (e.g., the output of
+# <code>load_scores</code>); the latter are used without copying the scores.
+# Labels must be either 0 (impostor) or something else (genuine).
+def _to_arrays(observations):
+  # columnar observations
+  if isinstance(observations, tuple) and len(observations) == 2 and \
+      isinstance(observations[0], np.ndarray) and isinstance(observations[1], np.ndarray):
+    labels, scores = observations
+    if labels.shape != scores.shape:
+      raise ValueError('Labels and scores must have the same shape.')
+    return labels != 0, scores
+
+  if _is_weighted(observations):
+    raise ValueError('Weighted observations are not supported here.')
+
+  genuine = np.array([obs[0] != 0 for obs in observations], dtype=bool)
+  scores = np.array([obs[1] for obs in observations], dtype=np.float64)
+  return genuine, scores
+
+# Tells if the given observations are a (<labels>, <scores>, <weights>)
+# triple of numpy arrays (weighted observations).
+def _is_weighted(observations):
+  return isinstance(observations, tuple) and len(observations) == 3 and \
+         all(isinstance(column, np.ndarray) for column in observations)
+
+# Converts the given observations into numpy arrays, as in
+# <code>_to_arrays</code>, also accepting weighted observations: a
+# (<labels>, <scores>, <weights>) triple of numpy arrays, where every
+# observation stands for <weight> observations (e.g., the importance
+# weights of <code>sample_impostor_pairs</code>).
+# Output: genuine boolean array, scores array, and weights array (None for
+# unweighted observations).
+def _to_weighted_arrays(observations):
+  if not _is_weighted(observations):
+    return _to_arrays(observations) + (None,)
+
+  labels, scores, weights = observations
+  if labels.shape != scores.shape or weights.shape != scores.shape:
+    raise ValueError('Labels, scores, and weights must have the same shape.')
+  return labels != 0, scores, weights
+
+# Counts the observations of the given boolean <mask>, each one counting
+# as its weight within the given <weights> (or as 1, if None).
+def _weighted_count(mask, weights=None):
+  if weights is None:
+    return np.count_nonzero(mask)
+  return float(np.sum(weights[mask]))
+
+# tests conversion of observations
+try:
+  _to_arrays(None)
+except TypeError:
+  print("Conversion won't work on None value.")
+
+genuine, scores = _to_arrays([(0, 0.1), (1, 0.2), (2, 0.3)])
+assert genuine.tolist() == [False, True, True]
+assert scores.tolist() == [0.1, 0.2, 0.3]
+
+genuine, scores = _to_arrays([])
+assert len(genuine) == 0 and len(scores) == 0
+
+genuine, scores = _to_arrays((np.array([0, 1, 2], dtype=np.int8), np.array([0.1, 0.2, 0.3])))
+assert genuine.tolist() == [False, True, True]
+assert scores.tolist() == [0.1, 0.2, 0.3]
+
+genuine, scores, weights = _to_weighted_arrays((np.array([0, 1]), np.array([0.1, 0.2]), np.array([2.0, 1.0])))
+assert genuine.tolist() == [False, True] and weights.tolist() == [2.0, 1.0]
+assert _to_weighted_arrays([(0, 0.1)])[2] is None  # unweighted
+
+try:
+  _to_arrays((np.array([0, 1]), np.array([0.1, 0.2]), np.array([2.0, 1.0])))
+except ValueError:
+  print("Conversion won't silently drop weights.")
+
+try:
+  _to_arrays((np.array([0, 1], dtype=np.int8), np.array([0.1])))
+except ValueError:
+  print("Conversion won't work on labels and scores of different sizes.")
+
+"""---"""
+
 # Loads data from the CSV file stored in the given file path.
 # Expected file line format: <label>,<score>
 # Comment lines starting with "#" will be ignored.
@@ -137,46 +237,269 @@ output = load_data('/content/test.csv')
 assert len(output) > 0
 print('observations:', len(output), output)
 
+"""---"""
+
+# Loads data from the CSV file stored in the given file path into
+# contiguous columns, with a bulk (numpy) parser.
+# Expected file line format: <label>,<score>
+# Comment lines starting with "#" will be ignored.
+# Provide <score_dtype> as np.float32 to halve the memory used by scores.
+# Output: (<labels>, <scores>) pair of numpy arrays; labels are int8 values,
+# either 0 (impostor) or 1 (genuine).
+def load_scores(file_path, score_dtype=np.float64):
+  return _parse_scores(file_path, score_dtype)
+
+# Parses the given CSV <source> (either a file path or a list of lines)
+# into (<labels>, <scores>) numpy arrays, as described in <code>load_scores</code>.
+def _parse_scores(source, score_dtype):
+  # sources with comments only are fine, there is nothing to warn about
+  with warnings.catch_warnings():
+    warnings.simplefilter('ignore', UserWarning)
+    data = np.loadtxt(source, delimiter=',', comments='#', usecols=(0, 1),
+                      dtype=[('label', np.int64), ('score', score_dtype)], ndmin=1)
+
+  labels = (data['label'] != 0).astype(np.int8)
+  scores = np.ascontiguousarray(data['score'])
+  return labels, scores
+
+# tests columnar loading of CSV file
+try:
+  load_scores('nofile.csv')
+except FileNotFoundError:
+  print("Can't read a file that doesn't exist.")
+
+labels, scores = load_scores('/content/test.csv')
+assert labels.dtype == np.int8 and scores.dtype == np.float64
+assert labels.tolist() == [int(obs[0] != 0) for obs in output]
+assert scores.tolist() == [obs[1] for obs in output]
+
+labels, scores = load_scores('/content/test.csv', score_dtype=np.float32)
+assert scores.dtype == np.float32 and len(scores) == len(output)
+assert np.allclose(scores, [obs[1] for obs in output], rtol=1e-6, atol=1e-6)
+
+"""---"""
+
+# Binary score files hold a header followed by the raw columns:
+# magic string (8 bytes), format version (uint32), score item size in bytes
+# (uint32, either 4 or 8), number of observations (uint64), and padding up to
+# 32 bytes; then the int8 labels and, aligned to 8 bytes, the float scores.
+# All values are little-endian.
+_SCORE_FILE_MAGIC = b'BIOSCORE'
+_SCORE_FILE_VERSION = 1
+_SCORE_FILE_HEADER = struct.Struct('<8sIIQ8x')
+
+# Computes the byte offset of the scores within a binary score file
+# holding <count> observations.
+def _scores_offset(count):
+  return (_SCORE_FILE_HEADER.size + count + 7) // 8 * 8
+
+# Saves the given <labels> and <scores> arrays into the binary score file
+# stored in the given file path.
+def save_scores_binary(file_path, labels, scores):
+  labels = np.ascontiguousarray(np.asarray(labels) != 0, dtype=np.int8)
+  score_dtype = np.dtype('<f4') if np.asarray(scores).dtype == np.float32 else np.dtype('<f8')
+  scores = np.ascontiguousarray(scores, dtype=score_dtype)
+  if labels.shape != scores.shape or labels.ndim != 1:
+    raise ValueError('Labels and scores must be 1-D arrays of the same size.')
+
+  with open(file_path, 'wb') as f:
+    f.write(_SCORE_FILE_HEADER.pack(_SCORE_FILE_MAGIC, _SCORE_FILE_VERSION,
+                                    scores.dtype.itemsize, len(labels)))
+    f.write(labels.tobytes())
+    f.write(bytes(_scores_offset(len(labels)) - _SCORE_FILE_HEADER.size - len(labels)))
+    f.write(scores.tobytes())
+
+# Opens the binary score file stored in the given file path, memory-mapping
+# its columns (nothing is read until the values are used).
+# Output: (<labels>, <scores>) pair of read-only numpy arrays.
+def load_scores_binary(file_path):
+  with open(file_path, 'rb') as f:
+    header = f.read(_SCORE_FILE_HEADER.size)
+  if len(header) < _SCORE_FILE_HEADER.size:
+    raise ValueError('Not a binary score file: ' + str(file_path))
+
+  magic, version, itemsize, count = _SCORE_FILE_HEADER.unpack(header)
+  if magic != _SCORE_FILE_MAGIC or version != _SCORE_FILE_VERSION or itemsize not in (4, 8):
+    raise ValueError('Not a binary score file: ' + str(file_path))
+
+  # empty files can't be memory-mapped
+  score_dtype = np.dtype('<f4') if itemsize == 4 else np.dtype('<f8')
+  if count == 0:
+    return np.empty(0, dtype=np.int8), np.empty(0, dtype=score_dtype)
+
+  labels = np.memmap(file_path, dtype=np.int8, mode='r',
+                     offset=_SCORE_FILE_HEADER.size, shape=(count,))
+  scores = np.memmap(file_path, dtype=score_dtype, mode='r',
+                     offset=_scores_offset(count), shape=(count,))
+  return labels, scores
+
+# tests binary score files
+import os
+import tempfile
+
+binary_path = os.path.join(tempfile.mkdtemp(), 'test.bin')
+labels, scores = load_scores('/content/test.csv')
+save_scores_binary(binary_path, labels, scores)
+mm_labels, mm_scores = load_scores_binary(binary_path)
+assert mm_labels.tolist() == labels.tolist()
+assert mm_scores.tolist() == scores.tolist()
+
+save_scores_binary(binary_path, labels, scores.astype(np.float32))
+mm_labels, mm_scores = load_scores_binary(binary_path)
+assert mm_scores.dtype == np.float32 and len(mm_scores) == len(scores)
+
+save_scores_binary(binary_path, np.empty(0, dtype=np.int8), np.empty(0))
+assert len(load_scores_binary(binary_path)[0]) == 0  # empty file
+
+try:
+  load_scores_binary('/content/test.csv')
+except ValueError:
+  print("Can't memory-map a file that isn't a binary score file.")
+
 """---
 
 ## d' Implementation
 """
 
-# Computes d-prime for the given observations.
-# Observations must be an array of (<label>,<score>) elements.
+# The score statistics of one class (either genuine or impostor) are kept as
+# a (<count>, <mean>, <m2>) triple, where <m2> is the sum of the squared
+# deviations of the scores from their mean.
+# Merges the two given class statistics <stats_1> and <stats_2>, as if their
+# scores had been processed together (parallel form of Welford's algorithm,
+# by Chan et al.).
+# Returns the merged (<count>, <mean>, <m2>) triple.
+def _merge_class_stats(stats_1, stats_2):
+  count_1, mean_1, m2_1 = stats_1
+  count_2, mean_2, m2_2 = stats_2
+
+  # nothing to merge
+  if count_1 == 0:
+    return stats_2
+  if count_2 == 0:
+    return stats_1
+
+  count = count_1 + count_2
+  delta = mean_2 - mean_1
+  mean = mean_1 + delta * count_2 / count
+  m2 = m2_1 + m2_2 + delta ** 2.0 * count_1 * count_2 / count
+
+  return count, mean, m2
+
+# Updates the given class statistics <stats> with the given batch of
+# <values>, in a single vectorized step. Provide <weights> to make every
+# value count as its weight (the count is then the sum of the weights).
+# Returns the updated (<count>, <mean>, <m2>) triple.
+def _update_class_stats(stats, values, weights=None):
+  values = np.asarray(values, dtype=np.float64)
+  count = len(values) if weights is None else float(np.sum(weights))
+  if count == 0:
+    return stats
+
+  # statistics of the batch, merged into the given ones
+  mean = float(np.average(values, weights=weights))
+  m2 = float(np.sum((values - mean) ** 2.0 if weights is None else weights * (values - mean) ** 2.0))
+  return _merge_class_stats(stats, (count, mean, m2))
+
+# tests class statistics
+stats = _update_class_stats((0, 0.0, 0.0), [])
+assert stats == (0, 0.0, 0.0)  # nothing added
+
+stats = _update_class_stats((0, 0.0, 0.0), [10, 20, -30, -0.5, 0.5])
+assert stats[0] == 5
+assert abs(stats[1] - _pairwise_sum([10, 20, -30, -0.5, 0.5]) / 5) < 1e-12
+assert abs(stats[2] / stats[0] - _compute_var([10, 20, -30, -0.5, 0.5])) < 1e-12
+
+# batches merged in any order give the same statistics
+stats_1 = _update_class_stats(_update_class_stats((0, 0.0, 0.0), [10, 20]), [-30, -0.5, 0.5])
+stats_2 = _merge_class_stats(_update_class_stats((0, 0.0, 0.0), [-30, -0.5, 0.5]),
+                             _update_class_stats((0, 0.0, 0.0), [10, 20]))
+for i in range(3):
+  assert abs(stats_1[i] - stats[i]) < 1e-9
+  assert abs(stats_2[i] - stats[i]) < 1e-9
+
+# weights count as repeated values
+weighted_stats = _update_class_stats((0, 0.0, 0.0), [10, 20, -30], np.array([2.0, 1.0, 3.0]))
+repeated_stats = _update_class_stats((0, 0.0, 0.0), [10, 10, 20, -30, -30, -30])
+for i in range(3):
+  assert abs(weighted_stats[i] - repeated_stats[i]) < 1e-9
+
+"""---"""
+
+# Updates the given d-prime statistics <stats> with the given batch of
+# observations, so that d-prime can be computed from a stream of observations
+# (e.g., file chunks) without holding all of them in memory.
+# Observations must be an array of (<label>,<score>) elements,
+# a (<labels>, <scores>) pair of numpy arrays, or a weighted
+# (<labels>, <scores>, <weights>) triple of numpy arrays.
 # Labels must be either 0 (impostor) or something else (genuine).
+# Provide <stats> as None to start new statistics.
+# Returns the updated statistics, a pair of genuine and impostor
+# (<count>, <mean>, <m2>) triples.
+def update_d_prime_stats(observations, stats=None):
+  if stats is None:
+    stats = ((0, 0.0, 0.0), (0, 0.0, 0.0))
+
+  genuine, scores, weights = _to_weighted_arrays(observations)
+  genuine_stats = _update_class_stats(stats[0], scores[genuine],
+                                      None if weights is None else weights[genuine])
+  impostor_stats = _update_class_stats(stats[1], scores[~genuine],
+                                       None if weights is None else weights[~genuine])
+
+  return genuine_stats, impostor_stats
+
+# Merges the given d-prime statistics <stats_1> and <stats_2>, computed
+# over different shards of observations (e.g., by different workers).
+# Returns the merged statistics.
+def merge_d_prime_stats(stats_1, stats_2):
+  return (_merge_class_stats(stats_1[0], stats_2[0]),
+          _merge_class_stats(stats_1[1], stats_2[1]))
+
+# Computes d-prime from the given d-prime statistics <stats>.
 # If either the number of impostors or genuine observations is zero,
 # it returns 'NaN' as d-prime.
-def compute_d_prime(observations):
+def compute_d_prime_from_stats(stats):
   # output
   d_prime = float('NaN') # nothing computed, returns not-a-number
 
-  # separates genuine and impostor scores
-  genuine_scores = []
-  impostor_scores = []
-
-  # for each given observation
-  for obs in observations:
-    if obs[0] == 0:  # impostor
-      impostor_scores.append(obs[1])
-    else:  # genuine
-      genuine_scores.append(obs[1])
+  genuine_count, genuine_mean, genuine_m2 = stats[0]
+  impostor_count, impostor_mean, impostor_m2 = stats[1]
 
   # if there are values for both classes (impostor and genuine)
-  if len(genuine_scores) > 0 and len(impostor_scores) > 0:
-    # computes mean values
-    genuine_mean = _pairwise_sum(genuine_scores) / len(genuine_scores)
-    impostor_mean = _pairwise_sum(impostor_scores) / len(impostor_scores)
-
+  if genuine_count > 0 and impostor_count > 0:
     # computes variances
-    genuine_var = _compute_var(genuine_scores)
-    impostor_var = _compute_var(impostor_scores)
+    genuine_var = genuine_m2 / genuine_count
+    impostor_var = impostor_m2 / impostor_count
 
     # d-prime computation
     d_prime = 2.0 ** 0.5 * abs(genuine_mean - impostor_mean) / (genuine_var + impostor_var) ** 0.5
 
   return d_prime
 
+# tests d-prime statistics
+assert not float('-inf') < compute_d_prime_from_stats(update_d_prime_stats([])) < float('inf')  # empty array, not a number
+assert not float('-inf') < compute_d_prime_from_stats(update_d_prime_stats([(0, 0.1)])) < float('inf')  # missing genuine, not a number
+assert not float('-inf') < compute_d_prime_from_stats(update_d_prime_stats([(1, 0.1)])) < float('inf')  # missing impostors, not a number
+
+stats = update_d_prime_stats([(0, 2), (1, 0)])
+stats = update_d_prime_stats([(0, 4), (1, 2)], stats)
+assert compute_d_prime_from_stats(stats) == 2.0
+
+stats = merge_d_prime_stats(update_d_prime_stats([(0, 2), (0, 4)]),
+                            update_d_prime_stats([(1, 0), (1, 2)]))
+assert compute_d_prime_from_stats(stats) == 2.0
+
+"""---"""
+
+# Computes d-prime for the given observations.
+# Observations must be an array of (<label>,<score>) elements,
+# a (<labels>, <scores>) pair of numpy arrays, or a weighted
+# (<labels>, <scores>, <weights>) triple of numpy arrays.
+# Labels must be either 0 (impostor) or something else (genuine).
+# If either the number of impostors or genuine observations is zero,
+# it returns 'NaN' as d-prime.
+def compute_d_prime(observations):
+  return compute_d_prime_from_stats(update_d_prime_stats(observations))
+
 # tests d-prime computation
 try:
     compute_d_prime(None)
@@ -195,6 +518,12 @@ assert not float('-inf') < compute_d_prime([(1, 0.1)]) < float('inf')  # missing
 d_prime = compute_d_prime([(0, 2), (0, 4), (1, 0), (1, 2)])
 assert d_prime == 2.0
 
+d_prime = compute_d_prime((np.array([0, 0, 1, 1], dtype=np.int8), np.array([2.0, 4.0, 0.0, 2.0])))
+assert d_prime == 2.0  # columnar observations
+
+d_prime = compute_d_prime((np.array([0, 0, 1]), np.array([2.0, 4.0, 0.0]), np.array([2.0, 2.0, 1.0])))
+assert d_prime == compute_d_prime([(0, 2), (0, 2), (0, 4), (0, 4), (1, 0)])  # weighted observations
+
 """---
 ### Exercise 1
 Compute d' for the content of <code>/content/test.csv</code>.
@@ -209,24 +538,25 @@ print(d_prime)
 ## FMR and FNMR Implementation
 """
 
-# Computes FMR from the given similarity observations,
-# according to the given threshold.
-# Observations must be an array of (<label>,<score>) elements.
+# Computes FMR from the given observations, according to the given threshold.
+# Provide <is_similarity> as True if scores are similarities (a score at or
+# above the threshold is a match) or False if they are distances (a score at
+# or below the threshold is a match).
+# Observations must be an array of (<label>,<score>) elements,
+# a (<labels>, <scores>) pair of numpy arrays, or a weighted
+# (<labels>, <scores>, <weights>) triple of numpy arrays.
 # Labels must be either 0 (impostor) or something else (genuine).
 # If the number of impostors is zero, it returns 'NaN' as FMR.
-def compute_sim_fmr(observations, threshold):
+def compute_fmr(observations, threshold, is_similarity=True):
   fmr = float('NaN') # nothing computed, returns not-a-number
 
   # counters
-  impostor_count = 0
-  false_match_count = 0
-
-  # for each observation
-  for obs in observations:
-    if obs[0] == 0:  # impostor
-      impostor_count = impostor_count + 1
-      if obs[1] >= threshold:
-        false_match_count = false_match_count + 1
+  genuine, scores, weights = _to_weighted_arrays(observations)
+  impostor_count = _weighted_count(~genuine, weights)
+  if is_similarity:
+    false_match_count = _weighted_count(~genuine & (scores >= threshold), weights)
+  else:
+    false_match_count = _weighted_count(~genuine & (scores <= threshold), weights)
 
   # FMR computation
   if impostor_count > 0:
@@ -234,6 +564,11 @@ def compute_sim_fmr(observations, threshold):
 
   return fmr
 
+# Computes FMR from the given similarity observations,
+# according to the given threshold (see <code>compute_fmr</code>).
+def compute_sim_fmr(observations, threshold):
+  return compute_fmr(observations, threshold, is_similarity=True)
+
 # tests FMR computation
 try:
     compute_sim_fmr(None, 0.0)
@@ -258,6 +593,18 @@ assert fmr == 0.0
 fmr = compute_sim_fmr([(0, 0.1), (0, 0.3), (1, 0.0)], 0.05)
 assert fmr == 1.0
 
+fmr = compute_sim_fmr((np.array([0, 0, 1], dtype=np.int8), np.array([0.1, 0.3, 0.0])), 0.25)
+assert fmr == 0.5  # columnar observations
+
+fmr = compute_fmr([(0, 0.1), (0, 0.3), (1, 0.0)], 0.1, is_similarity=False)
+assert fmr == 0.5  # distances
+
+fmr = compute_fmr([(0, 0.1), (0, 0.3), (1, 0.0)], 0.05, is_similarity=False)
+assert fmr == 0.0  # distances
+
+fmr = compute_sim_fmr((np.array([0, 0, 1]), np.array([0.1, 0.3, 0.0]), np.array([3.0, 1.0, 1.0])), 0.25)
+assert fmr == 0.25  # weighted observations
+
 """---
 ### Exercise 2
 What is the meaning of the threshold?
@@ -268,25 +615,25 @@ What is the meaning of the threshold?
 ---
 """
 
-# Computes FNMR from the given similarity observations,
-# according to the given threshold.
-# Observations must be an array of (<label>,<score>) elements.
+# Computes FNMR from the given observations, according to the given threshold.
+# Provide <is_similarity> as True if scores are similarities (a score below
+# the threshold is a non-match) or False if they are distances (a score above
+# the threshold is a non-match).
+# Observations must be an array of (<label>,<score>) elements,
+# a (<labels>, <scores>) pair of numpy arrays, or a weighted
+# (<labels>, <scores>, <weights>) triple of numpy arrays.
 # Labels must be either 0 (impostor) or something else (genuine).
 # If the number of genuine observations is zero, it returns 'NaN' as FNMR.
-def compute_sim_fnmr(observations, threshold):
+def compute_fnmr(observations, threshold, is_similarity=True):
   fnmr = float('NaN') # nothing computed, returns not-a-number
 
   # counters
-  genuine_count = 0
-  false_non_match_count = 0
-
-  # for each observation
-  for obs in observations:
-    if obs[0] != 0:  # genuine observation
-      genuine_count = genuine_count + 1
-
-      if obs[1] < threshold:
-        false_non_match_count = false_non_match_count + 1
+  genuine, scores, weights = _to_weighted_arrays(observations)
+  genuine_count = _weighted_count(genuine, weights)
+  if is_similarity:
+    false_non_match_count = _weighted_count(genuine & (scores < threshold), weights)
+  else:
+    false_non_match_count = _weighted_count(genuine & (scores > threshold), weights)
 
   # FNMR computation
   if genuine_count > 0:
@@ -294,6 +641,11 @@ def compute_sim_fnmr(observations, threshold):
 
   return fnmr
 
+# Computes FNMR from the given similarity observations,
+# according to the given threshold (see <code>compute_fnmr</code>).
+def compute_sim_fnmr(observations, threshold):
+  return compute_fnmr(observations, threshold, is_similarity=True)
+
 # tests FNMR computation
 try:
     compute_sim_fnmr(None, 0.0)
@@ -318,50 +670,196 @@ assert fnmr == 1.0
 fnmr = compute_sim_fnmr([(0, 0.0), (1, 0.1), (1, 0.3)], 0.05)
 assert fnmr == 0.0
 
-"""---"""
+fnmr = compute_sim_fnmr((np.array([0, 1, 1], dtype=np.int8), np.array([0.0, 0.1, 0.3])), 0.25)
+assert fnmr == 0.5  # columnar observations
 
-# Computes FNMR and FMR at EER from the given similarity observations.
-# Observations must be an array of (<label>,<score>) elements.
-# Labels must be either 0 (impostor) or something else (genuine).
-# Output: FNMR, FMR, EER_THRESHOLD.
-# If either the number of impostors or genuine observations is zero,
-# it returns 'NaN', 'NaN', 'NaN'.
-def compute_sim_fmr_fnmr_eer(observations):
-    # computed FNMR and FMR at EER, and EER threshold
-    output_fnmr = float('NaN') # nothing computed, returns not-a-number
-    output_fmr = float('NaN')
-    output_threshold = float('NaN')
+fnmr = compute_fnmr([(0, 0.0), (1, 0.1), (1, 0.3)], 0.1, is_similarity=False)
+assert fnmr == 0.5  # distances
 
-    # holds the difference between FMR and FNMR
-    fnmr_fmr_diff = float('inf') # a very large float
+fnmr = compute_fnmr([(0, 0.0), (1, 0.1), (1, 0.3)], 0.3, is_similarity=False)
+assert fnmr == 0.0  # distances
 
-    # sorted list of scores
-    scores = sorted([obs[1] for obs in observations])
-    if len(scores) > 0:
-      # for each score taken as threshold
-      for threshold in scores:
-        current_fnmr = compute_sim_fnmr(observations, threshold)
-        current_fmr = compute_sim_fmr(observations, threshold)
+"""---
+## Sort-once FMR and FNMR curve
 
-        # cancels computation if any of the FNMR or FMR values are 'NaN' (impossible to compute them)
-        if not float('-inf') < current_fnmr < float('inf') or not float('-inf') < current_fmr < float('inf'):
-          break
+Instead of calling <code>compute_fmr</code> and <code>compute_fnmr</code> once per threshold (O(N²)),
+the scores are sorted only once and the genuine and impostor observations are counted cumulatively (O(N log N)).
+The same engine serves similarity scores (e.g., fingerprint match ratios) and distance scores
+(e.g., ArcFace or iris Hamming distances).
+"""
 
-        # updates the difference between FNMR and FMR, if it is the case
-        current_diff = abs(current_fnmr - current_fmr)
-        if current_diff <= fnmr_fmr_diff:
-          fnmr_fmr_diff = current_diff
+# Computes the FMR and FNMR curve from the given <genuine> boolean array and
+# respective <scores> array, sorting the scores only once.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances; distances are handled as they are (no negated copies).
+# Every distinct score is taken as a threshold; tied scores share the same
+# threshold, therefore they are counted exactly as in
+# <code>compute_fmr</code> and <code>compute_fnmr</code>.
+# Thresholds go from the most permissive to the strictest one (ascending
+# similarities or descending distances), thus, for both polarities, FMR
+# never increases and FNMR never decreases along the curve.
+# If <weights> are given, every observation counts as its weight.
+# Output: array of distinct thresholds, array with FMR values, array with
+# FNMR values, and array with the number of scores tied at each threshold.
+# If either the number of impostors or genuine observations is zero,
+# it returns four empty arrays.
+def _compute_curve(genuine, scores, is_similarity=True, weights=None):
+  # sorts the scores only once; stable sorting keeps the curve deterministic
+  order = np.argsort(scores, kind='stable')
+  sorted_scores = scores[order]
+  sorted_genuine = genuine[order]
+
+  # nothing to compute if any of the classes is missing
+  genuine_count = np.count_nonzero(sorted_genuine)
+  if genuine_count == 0 or genuine_count == len(sorted_scores):
+    empty = np.empty(0)
+    return empty, empty, empty, np.empty(0, dtype=np.int64)
+
+  # number (or weight) of genuine and of all observations with index
+  # smaller than each position; unweighted totals are the positions themselves
+  if weights is None:
+    genuine_cumsum = np.concatenate(([0], np.cumsum(sorted_genuine, dtype=np.int64)))
+    total_cumsum = None
+    impostor_count = len(sorted_scores) - genuine_count
+  else:
+    sorted_weights = weights[order]
+    genuine_cumsum = np.concatenate(([0.0], np.cumsum(sorted_weights * sorted_genuine)))
+    total_cumsum = np.concatenate(([0.0], np.cumsum(sorted_weights)))
+    genuine_count = genuine_cumsum[-1]
+    impostor_count = total_cumsum[-1] - genuine_count
+
+  # first position of each run of tied scores
+  firsts = np.flatnonzero(np.concatenate(([True], sorted_scores[1:] != sorted_scores[:-1])))
+  thresholds = sorted_scores[firsts]
+  tie_counts = np.diff(np.append(firsts, len(sorted_scores)))
+
+  if is_similarity:
+    # genuine and impostor observations below each threshold
+    genuine_below = genuine_cumsum[firsts]
+    impostor_below = (firsts if total_cumsum is None else total_cumsum[firsts]) - genuine_below
+
+    # FNMR: genuine observations below the threshold;
+    # FMR: impostor observations at or above the threshold
+    fnmrs = genuine_below / genuine_count
+    fmrs = (impostor_count - impostor_below) / impostor_count
 
-          # updates current values
-          output_fnmr = current_fnmr
-          output_fmr = current_fmr
-          output_threshold = threshold
+  else:
+    # genuine and impostor observations at or below each threshold
+    lasts = firsts + tie_counts
+    genuine_below = genuine_cumsum[lasts]
+    impostor_below = (lasts if total_cumsum is None else total_cumsum[lasts]) - genuine_below
+
+    # FNMR: genuine observations above the threshold;
+    # FMR: impostor observations at or below the threshold;
+    # reversed views put the most permissive distance first
+    fnmrs = ((genuine_count - genuine_below) / genuine_count)[::-1]
+    fmrs = (impostor_below / impostor_count)[::-1]
+    thresholds = thresholds[::-1]
+    tie_counts = tie_counts[::-1]
+
+  return thresholds, fmrs, fnmrs, tie_counts
+
+# Computes the whole FMR and FNMR curve from the given observations.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Observations must be an array of (<label>,<score>) elements,
+# a (<labels>, <scores>) pair of numpy arrays, or a weighted
+# (<labels>, <scores>, <weights>) triple of numpy arrays.
+# Labels must be either 0 (impostor) or something else (genuine).
+# Output: array of distinct thresholds (from the most permissive to the
+# strictest one), array with FMR values, array with FNMR values.
+# If either the number of impostors or genuine observations is zero,
+# it returns three empty arrays.
+def compute_fmr_fnmr_curve(observations, is_similarity=True):
+  genuine, scores, weights = _to_weighted_arrays(observations)
+  thresholds, fmrs, fnmrs, _ = _compute_curve(genuine, scores, is_similarity, weights)
+  return thresholds, fmrs, fnmrs
+
+# Computes the whole FMR and FNMR curve from the given similarity
+# observations (see <code>compute_fmr_fnmr_curve</code>); thresholds are
+# ascending.
+def compute_sim_fmr_fnmr_curve(observations):
+  return compute_fmr_fnmr_curve(observations, is_similarity=True)
+
+# tests FMR and FNMR curve
+try:
+    compute_sim_fmr_fnmr_curve(None)
+except TypeError:
+    print("FMR and FNMR curve calculation won't work on None value.")
 
-        else:
-          # difference will start to increase, nothing to do anymore
-          break
+try:
+    compute_sim_fmr_fnmr_curve([0])
+except TypeError:
+    print("FMR and FNMR curve calculation won't work on arrays not containing (<label>,<score>) elements.")
+
+assert len(compute_sim_fmr_fnmr_curve([])[0]) == 0  # empty array, nothing to do
+assert len(compute_sim_fmr_fnmr_curve([(0, 0.1)])[0]) == 0  # missing genuine, nothing to do
+assert len(compute_sim_fmr_fnmr_curve([(1, 0.1)])[0]) == 0  # missing impostors, nothing to do
+
+# tied scores share the same threshold
+thresholds, fmrs, fnmrs = compute_sim_fmr_fnmr_curve([(0, 0.1), (0, 0.3), (1, 0.3), (1, 0.5)])
+assert thresholds.tolist() == [0.1, 0.3, 0.5]
+assert fmrs.tolist() == [1.0, 0.5, 0.0]
+assert fnmrs.tolist() == [0.0, 0.0, 0.5]
+
+# the curve must agree with compute_sim_fmr and compute_sim_fnmr at every threshold
+import random
+random_observations = [(random.randint(0, 1), random.randint(0, 20) / 20.0) for _ in range(500)]
+thresholds, fmrs, fnmrs = compute_sim_fmr_fnmr_curve(random_observations)
+for i in range(len(thresholds)):
+  assert fmrs[i] == compute_sim_fmr(random_observations, thresholds[i])
+  assert fnmrs[i] == compute_sim_fnmr(random_observations, thresholds[i])
+
+# same for distances, whose thresholds are descending
+thresholds, fmrs, fnmrs = compute_fmr_fnmr_curve(random_observations, is_similarity=False)
+assert np.all(np.diff(thresholds) < 0.0)
+for i in range(len(thresholds)):
+  assert fmrs[i] == compute_fmr(random_observations, thresholds[i], is_similarity=False)
+  assert fnmrs[i] == compute_fnmr(random_observations, thresholds[i], is_similarity=False)
+
+"""---"""
 
-    return output_fnmr, output_fmr, output_threshold
+# Finds FNMR and FMR at EER, and the EER threshold, within the given curve
+# of <thresholds> (from the most permissive to the strictest one), <fmrs>
+# and <fnmrs>.
+# As FNMR never decreases and FMR never increases along the thresholds,
+# |FNMR - FMR| decreases until the EER and increases afterwards; among
+# thresholds with the same smallest difference, the strictest one is taken.
+# Output: FNMR, FMR, EER_THRESHOLD; 'NaN', 'NaN', 'NaN' for an empty curve.
+def _find_eer(thresholds, fmrs, fnmrs):
+    # nothing computed, returns not-a-number
+    if len(thresholds) == 0:
+      return float('NaN'), float('NaN'), float('NaN')
+
+    i = _find_eer_index(fmrs, fnmrs)
+    return float(fnmrs[i]), float(fmrs[i]), float(thresholds[i])
+
+# Finds the position of the EER within the given non-empty curve of <fmrs>
+# and <fnmrs> (see <code>_find_eer</code>).
+def _find_eer_index(fmrs, fnmrs):
+    # last position holding the smallest difference between FNMR and FMR
+    diffs = np.abs(fnmrs - fmrs)
+    return len(diffs) - 1 - int(np.argmin(diffs[::-1]))
+
+# Computes FNMR and FMR at EER from the given observations.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Observations must be an array of (<label>,<score>) elements,
+# a (<labels>, <scores>) pair of numpy arrays, or a weighted
+# (<labels>, <scores>, <weights>) triple of numpy arrays.
+# Labels must be either 0 (impostor) or something else (genuine).
+# Output: FNMR, FMR, EER_THRESHOLD.
+# If either the number of impostors or genuine observations is zero,
+# it returns 'NaN', 'NaN', 'NaN'.
+def compute_fmr_fnmr_eer(observations, is_similarity=True):
+    genuine, scores, weights = _to_weighted_arrays(observations)
+    thresholds, fmrs, fnmrs, _ = _compute_curve(genuine, scores, is_similarity, weights)
+    return _find_eer(thresholds, fmrs, fnmrs)
+
+# Computes FNMR and FMR at EER from the given similarity observations
+# (see <code>compute_fmr_fnmr_eer</code>).
+def compute_sim_fmr_fnmr_eer(observations):
+    return compute_fmr_fnmr_eer(observations, is_similarity=True)
 
 # tests FNMR and FMR at EER
 try:
@@ -391,6 +889,24 @@ assert fnmr == 0.0
 assert fmr == 0.0
 assert eer == 0.5
 
+# tied genuine and impostor scores; equally good thresholds keep the largest one
+fnmr, fmr, eer = compute_sim_fmr_fnmr_eer([(0, 0.2), (0, 0.5), (1, 0.5), (1, 0.7)])
+assert fnmr == 0.5
+assert fmr == 0.0
+assert eer == 0.7
+
+# columnar observations give the same results
+assert compute_sim_fmr_fnmr_eer(load_scores('/content/test.csv')) == compute_sim_fmr_fnmr_eer(load_data('/content/test.csv'))
+
+# distances (e.g., ArcFace or Hamming distances) behave as negated similarities
+fnmr, fmr, eer = compute_fmr_fnmr_eer([(0, 0.8), (0, 0.7), (0, 0.6), (1, 0.5), (1, 0.4), (1, 0.3)], is_similarity=False)
+assert fnmr == 0.0
+assert fmr == 0.0
+assert eer == 0.5
+
+fnmr, fmr, eer = compute_fmr_fnmr_eer([(obs[0], -obs[1]) for obs in output], is_similarity=False)
+assert (fnmr, fmr, -eer) == compute_sim_fmr_fnmr_eer(output)
+
 """---
 ### Exercise 3
 Compute FNMR and FMR at EER for the content of <code>/content/test.csv</code>.
@@ -404,46 +920,46 @@ file_fnmr, file_fmr, eer_threshold = compute_sim_fmr_fnmr_eer(output)
 ## FMR versus TMR AUC
 """
 
-# Computes FMR x TMR (a.k.a. 1.0 - FNMR) AUC from the given similarity observations.
-# Observations must be an array of (<label>,<score>) elements.
+# Computes the trapezoidal area under the given curve of <fmrs> and <tmrs>,
+# closing it on [0.0, 0.0].
+def _compute_auc(fmrs, tmrs):
+    fmrs = np.append(fmrs, 0.0)
+    tmrs = np.append(tmrs, 0.0)
+    return float(np.sum(np.abs(fmrs[:-1] - fmrs[1:]) * (tmrs[:-1] + tmrs[1:]) / 2.0))
+
+# Computes FMR x TMR (a.k.a. 1.0 - FNMR) AUC from the given observations.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Observations must be an array of (<label>,<score>) elements,
+# a (<labels>, <scores>) pair of numpy arrays, or a weighted
+# (<labels>, <scores>, <weights>) triple of numpy arrays.
 # Labels must be either 0 (impostor) or something else (genuine).
-# Output: AUC, array with FMR values, array with TMR values.
-# If either the number of impostors or genuine observations is zero, it returns 'NaN', [], [].
-def compute_sim_fmr_tmr_auc(observations):
+# Output: AUC, array with FMR values, array with TMR values, from the most
+# permissive to the strictest threshold.
+# If either the number of impostors or genuine observations is zero, it returns 'NaN' and two empty arrays.
+def compute_fmr_tmr_auc(observations, is_similarity=True):
     # output values
     auc = float('NaN') # nothing computed, returns not-a-number
-    fmrs = []
-    tmrs = []
-
-    # sorted list of scores
-    scores = sorted([obs[1] for obs in observations])
-    if len(scores) > 0:
-      # for each score taken as a threshold
-      for threshold in scores:
-        current_fmr = compute_sim_fmr(observations, threshold)
-        current_fnmr = compute_sim_fnmr(observations, threshold)
-
-        # cancels computation if any of the FNMR or FMR values are 'NaN' (impossible to compute them)
-        if not float('-inf') < current_fmr < float('inf') or not float('-inf') < current_fnmr < float('inf'):
-          break
+    fmrs = np.empty(0)
+    tmrs = np.empty(0)
 
-        # adds the computed values to the proper lists
-        fmrs.append(current_fmr)
-        tmrs.append(1.0 - current_fnmr)
+    genuine, scores, weights = _to_weighted_arrays(observations)
+    thresholds, curve_fmrs, curve_fnmrs, tie_counts = _compute_curve(genuine, scores, is_similarity, weights)
+    if len(thresholds) > 0:
+      auc = _compute_auc(curve_fmrs, 1.0 - curve_fnmrs)
 
-      # computes the AUC
-      if len(fmrs) > 0 and len(tmrs) > 0:
-        # adds the last points on [0.0, 0.0] for completeness
-        fmrs.append(0.0)
-        tmrs.append(0.0)
-
-        auc_parts = []
-        for i in range(len(fmrs) - 1):
-          auc_parts.append(abs(fmrs[i] - fmrs[i + 1]) * (tmrs[i] + tmrs[i + 1]) / 2.0)
-        auc = _pairwise_sum(auc_parts)
+      # one point per score taken as a threshold (tied scores repeat the same point),
+      # plus the last point on [0.0, 0.0] for completeness
+      fmrs = np.append(np.repeat(curve_fmrs, tie_counts), 0.0)
+      tmrs = np.append(np.repeat(1.0 - curve_fnmrs, tie_counts), 0.0)
 
     return auc, fmrs, tmrs
 
+# Computes FMR x TMR AUC from the given similarity observations
+# (see <code>compute_fmr_tmr_auc</code>).
+def compute_sim_fmr_tmr_auc(observations):
+    return compute_fmr_tmr_auc(observations, is_similarity=True)
+
 # tests FMR x FMR AUC
 try:
     compute_sim_fmr_tmr_auc(None)
@@ -474,6 +990,14 @@ assert len(fmrs) > 0
 assert len(tmrs) > 0
 assert len(fmrs) == len(tmrs)
 print('AUC:', auc)
+
+# columnar observations give the same results
+assert compute_sim_fmr_tmr_auc(load_scores('/content/test.csv'))[0] == compute_sim_fmr_tmr_auc(load_data('/content/test.csv'))[0]
+
+# distances
+auc, fmrs, tmrs = compute_fmr_tmr_auc([(0, 0.8), (0, 0.7), (0, 0.6), (1, 0.5), (1, 0.4), (1, 0.3)], is_similarity=False)
+assert auc == compute_sim_fmr_tmr_auc([(0, -0.8), (0, -0.7), (0, -0.6), (1, -0.5), (1, -0.4), (1, -0.3)])[0]
+assert compute_fmr_tmr_auc([(obs[0], -obs[1]) for obs in output], is_similarity=False)[0] == compute_sim_fmr_tmr_auc(output)[0]
 print('FMR:', fmrs)
 print('TMR:', tmrs)
 
@@ -487,43 +1011,1927 @@ file_auc, file_fmrs, file_tmrs = compute_sim_fmr_tmr_auc(output)
 print(file_auc, file_fmrs, file_tmrs)
 
 """---
-## Plot Functions
+## AUC from ranks
+
+The FMR x TMR AUC equals the Mann-Whitney U statistic normalized by the number of
+genuine-impostor pairs: the chance that a genuine score is better than an impostor one,
+with ties counting as half. It is computed from the sorted genuine and impostor scores,
+without building the curve, and for many systems (score columns) at once.
+"""
+
+# Computes twice the Mann-Whitney U statistic of the given ascending
+# <sorted_genuine_scores> against the ascending <sorted_impostor_scores>.
+# Ties are corrected with midranks: a genuine score counts every impostor
+# score below it, plus half of the impostor scores equal to it.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Provide the <genuine_weights> and <impostor_weights> of the sorted scores
+# to make every score count as its weight (weighted rank sums).
+# Output: 2U, as an exact integer (a float, for weighted scores).
+def _compute_double_u(sorted_genuine_scores, sorted_impostor_scores, is_similarity=True,
+                      genuine_weights=None, impostor_weights=None):
+  # impostors below and up to each genuine score, with one binary search of
+  # each side per genuine score
+  impostor_below = np.searchsorted(sorted_impostor_scores, sorted_genuine_scores, side='left')
+  impostor_upto = np.searchsorted(sorted_impostor_scores, sorted_genuine_scores, side='right')
+  if genuine_weights is None:
+    double_u = int(np.sum(impostor_below, dtype=np.int64)) + int(np.sum(impostor_upto, dtype=np.int64))
+    genuine_count, impostor_count = len(sorted_genuine_scores), len(sorted_impostor_scores)
+
+  # weighted: impostor weights below and up to each genuine score, from
+  # their cumulative sums
+  else:
+    impostor_cumsum = np.concatenate(([0.0], np.cumsum(impostor_weights, dtype=np.float64)))
+    double_u = float(genuine_weights @ (impostor_cumsum[impostor_below] + impostor_cumsum[impostor_upto]))
+    genuine_count, impostor_count = float(np.sum(genuine_weights)), impostor_cumsum[-1]
+
+  # distances: impostors above each genuine score instead of below
+  if not is_similarity:
+    double_u = 2 * genuine_count * impostor_count - double_u
+
+  return double_u
+
+# Computes FMR x TMR AUC for each column of the given <scores> matrix
+# (<num_pairs> x <num_systems>), sharing the given <labels> array.
+# Labels must be either 0 (impostor) or something else (genuine).
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Provide <weights> (one per label) to make every pair count as its weight.
+# Genuine and impostor scores of all the systems are sorted at once, each
+# score only once.
+# Output: array with one AUC per column; 'NaN' for all of them if either
+# the number of impostors or genuine observations is zero.
+def compute_auc_columns(labels, scores, is_similarity=True, weights=None):
+  genuine = np.asarray(labels) != 0
+  scores = np.asarray(scores)
+  if scores.ndim != 2 or scores.shape[0] != len(genuine):
+    raise ValueError('Scores must be a matrix with one row per label.')
+
+  genuine_count = _weighted_count(genuine, weights)
+  impostor_count = _weighted_count(~genuine, weights)
+  if genuine_count == 0 or impostor_count == 0:
+    return np.full(scores.shape[1], float('NaN'))
+
+  # one row per system, so every sort runs over contiguous memory; weighted
+  # scores are sorted together with their weights
+  if weights is None:
+    sorted_genuine_scores = np.sort(scores[genuine].T, axis=1)
+    sorted_impostor_scores = np.sort(scores[~genuine].T, axis=1)
+  else:
+    genuine_order = np.argsort(scores[genuine].T, axis=1)
+    impostor_order = np.argsort(scores[~genuine].T, axis=1)
+    sorted_genuine_scores = np.take_along_axis(scores[genuine].T, genuine_order, axis=1)
+    sorted_impostor_scores = np.take_along_axis(scores[~genuine].T, impostor_order, axis=1)
+    sorted_genuine_weights = weights[genuine][genuine_order]
+    sorted_impostor_weights = weights[~genuine][impostor_order]
+
+  aucs = np.empty(scores.shape[1])
+  for k in range(scores.shape[1]):
+    if weights is None:
+      double_u = _compute_double_u(sorted_genuine_scores[k], sorted_impostor_scores[k], is_similarity)
+    else:
+      double_u = _compute_double_u(sorted_genuine_scores[k], sorted_impostor_scores[k], is_similarity,
+                                   sorted_genuine_weights[k], sorted_impostor_weights[k])
+    aucs[k] = double_u / (2.0 * genuine_count * impostor_count)
+
+  return aucs
+
+# Computes FMR x TMR AUC from the given observations, without building the
+# FMR and FNMR curve (see <code>compute_fmr_tmr_auc</code> for the curve).
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Observations must be an array of (<label>,<score>) elements,
+# a (<labels>, <scores>) pair of numpy arrays, or a weighted
+# (<labels>, <scores>, <weights>) triple of numpy arrays.
+# Labels must be either 0 (impostor) or something else (genuine).
+# If either the number of impostors or genuine observations is zero, it returns 'NaN'.
+def compute_auc(observations, is_similarity=True):
+  genuine, scores, weights = _to_weighted_arrays(observations)
+  return float(compute_auc_columns(genuine, scores[:, None], is_similarity, weights)[0])
+
+# tests AUC from ranks
+assert not float('-inf') < compute_auc([]) < float('inf')  # empty array, not a number
+assert not float('-inf') < compute_auc([(0, 0.1)]) < float('inf')  # missing genuine, not a number
+assert compute_auc([(0, 0.2), (0, 0.3), (0, 0.4), (1, 0.5), (1, 0.6), (1, 0.7)]) == 1.0
+assert compute_auc([(0, 0.5), (1, 0.5)]) == 0.5  # tied scores count as half
+assert compute_auc([(0, 0.8), (0, 0.7), (1, 0.5), (1, 0.3)], is_similarity=False) == 1.0
+
+# weights count as repeated observations
+weighted_observations = (np.array([0, 0, 1, 1]), np.array([0.2, 0.5, 0.5, 0.1]), np.array([3.0, 1.0, 2.0, 1.0]))
+repeated_observations = [(0, 0.2)] * 3 + [(0, 0.5)] + [(1, 0.5)] * 2 + [(1, 0.1)]
+for is_similarity in (True, False):
+  assert abs(compute_auc(weighted_observations, is_similarity) -
+             compute_auc(repeated_observations, is_similarity)) < 1e-12
+
+# same AUC as the trapezoidal area under the curve, with or without ties
+import random
+for i in range(20):
+  random_observations = [(random.randint(0, 1), random.randint(0, 10) / 10.0) for j in range(50)]
+  for is_similarity in (True, False):
+    assert abs(compute_auc(random_observations, is_similarity) -
+               compute_fmr_tmr_auc(random_observations, is_similarity)[0]) < 1e-12
+assert abs(compute_auc(load_scores('/content/test.csv')) - compute_sim_fmr_tmr_auc(output)[0]) < 1e-12
+
+# many systems at once
+labels, scores = load_scores('/content/test.csv')
+score_matrix = np.stack((scores, -scores, np.round(scores, 1)), axis=1)
+aucs = compute_auc_columns(labels, score_matrix)
+for k in range(score_matrix.shape[1]):
+  assert abs(aucs[k] - compute_sim_fmr_tmr_auc((labels, score_matrix[:, k]))[0]) < 1e-12
+print('AUCs:', aucs)
+
+"""---
+## Many systems at once
+
+Several systems (e.g., matcher configurations) scored over the same labeled pairs give a
+(<num_pairs> x <num_systems>) score matrix. Its columns are evaluated in blocks, with
+vectorized sorts and cumulative sums, into a table with one row per system.
 """
 
-# Plots the histograms of the scores of the impostors and of the genuine observations together.
-# Observations must be an array of (<label>,<score>) elements.
+# Computes d-prime, FNMR, FMR and threshold at EER, and FMR x TMR AUC for
+# each row of the given <block> of scores (<num_systems> x <num_pairs>),
+# sharing the given <genuine> boolean array.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Both classes must have observations.
+# Output: one array per metric, with one value per row.
+def _compute_block_metrics(genuine, block, is_similarity=True):
+  b, n = block.shape
+  genuine_count = int(np.count_nonzero(genuine))
+  impostor_count = n - genuine_count
+  rows = np.arange(b)
+
+  # d-prime from the class means and variances
+  genuine_scores = block[:, genuine]
+  impostor_scores = block[:, ~genuine]
+  d_primes = 2.0 ** 0.5 * np.abs(np.mean(genuine_scores, axis=1) - np.mean(impostor_scores, axis=1)) / \
+             (np.var(genuine_scores, axis=1) + np.var(impostor_scores, axis=1)) ** 0.5
+  del genuine_scores, impostor_scores
+
+  # one sort per system
+  order = np.argsort(block, axis=1, kind='stable')
+  sorted_scores = np.take_along_axis(block, order, axis=1)
+  sorted_genuine = genuine[order]
+  del order
+
+  # genuine observations with index smaller than each position
+  genuine_cumsum = np.zeros((b, n + 1), dtype=np.int64)
+  np.cumsum(sorted_genuine, axis=1, out=genuine_cumsum[:, 1:])
+  impostor_cumsum = np.arange(n + 1) - genuine_cumsum
+
+  # first and last positions of the tie run of every score
+  positions = np.arange(n)
+  is_first = np.ones((b, n), dtype=bool)
+  is_first[:, 1:] = sorted_scores[:, 1:] != sorted_scores[:, :-1]
+  is_last = np.ones((b, n), dtype=bool)
+  is_last[:, :-1] = is_first[:, 1:]
+
+  # EER, with the same thresholds and tie rules of compute_fmr_fnmr_eer
+  with np.errstate(invalid='ignore'):
+    if is_similarity:
+      fnmrs = genuine_cumsum[:, :-1] / genuine_count
+      fmrs = (impostor_count - impostor_cumsum[:, :-1]) / impostor_count
+      diffs = np.where(is_first, np.abs(fnmrs - fmrs), float('inf'))
+      i = n - 1 - np.argmin(diffs[:, ::-1], axis=1)  # strictest: highest similarity
+    else:
+      fnmrs = (genuine_count - genuine_cumsum[:, 1:]) / genuine_count
+      fmrs = impostor_cumsum[:, 1:] / impostor_count
+      diffs = np.where(is_last, np.abs(fnmrs - fmrs), float('inf'))
+      i = np.argmin(diffs, axis=1)  # strictest: lowest distance
+  eers = (fnmrs[rows, i], fmrs[rows, i], sorted_scores[rows, i])
+  del fnmrs, fmrs, diffs
+
+  # AUC from twice the Mann-Whitney U statistic (see _compute_double_u)
+  run_firsts = np.maximum.accumulate(np.where(is_first, positions, 0), axis=1)
+  run_lasts = np.minimum.accumulate(np.where(is_last, positions, n - 1)[:, ::-1], axis=1)[:, ::-1]
+  impostor_below = np.take_along_axis(impostor_cumsum, run_firsts, axis=1)
+  impostor_upto = np.take_along_axis(impostor_cumsum, run_lasts + 1, axis=1)
+  double_u = np.sum((impostor_below + impostor_upto) * sorted_genuine, axis=1)
+  if not is_similarity:
+    double_u = 2 * genuine_count * impostor_count - double_u
+  aucs = double_u / (2.0 * genuine_count * impostor_count)
+
+  return (d_primes,) + eers + (aucs,)
+
+# Computes d-prime, FNMR and FMR at EER, EER threshold, and FMR x TMR AUC
+# for each column of the given <scores> matrix (<num_pairs> x <num_systems>),
+# sharing the given <labels> array.
 # Labels must be either 0 (impostor) or something else (genuine).
-def plot_hist(observations):
-    impostors = []
-    genuine = []
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances, either for all systems or as one value per system.
+# Systems are named after the given <system_names> (default: column indices).
+# Columns are evaluated in blocks of <block_size> systems (memory grows
+# with block_size x num_pairs).
+# Output: structured numpy array (table) with one row per system and the
+# fields 'system', 'd_prime', 'fnmr', 'fmr', 'eer_threshold', and 'auc';
+# metrics are 'NaN' if either the number of impostors or genuine
+# observations is zero.
+def compute_system_metrics(labels, scores, system_names=None, is_similarity=True, block_size=8):
+  genuine = np.asarray(labels) != 0
+  scores = np.asarray(scores)
+  if scores.ndim != 2 or scores.shape[0] != len(genuine):
+    raise ValueError('Scores must be a matrix with one row per label.')
+
+  num_systems = scores.shape[1]
+  if system_names is None:
+    system_names = np.arange(num_systems)
+  system_names = np.asarray(system_names)
+  is_similarity = np.broadcast_to(np.asarray(is_similarity, dtype=bool), (num_systems,))
+  if len(system_names) != num_systems:
+    raise ValueError('There must be one name per system.')
+
+  fields = ['d_prime', 'fnmr', 'fmr', 'eer_threshold', 'auc']
+  table = np.zeros(num_systems, dtype=[('system', system_names.dtype)] + [(f, np.float64) for f in fields])
+  table['system'] = system_names
+  for f in fields:
+    table[f] = float('NaN')
+
+  # nothing to compute if any of the classes is missing
+  genuine_count = int(np.count_nonzero(genuine))
+  if genuine_count == 0 or genuine_count == len(genuine):
+    return table
+
+  # systems of the same polarity share blocks
+  for polarity in (True, False):
+    columns = np.flatnonzero(is_similarity == polarity)
+    for b in range(0, len(columns), block_size):
+      block_columns = columns[b:b + block_size]
+      block = np.ascontiguousarray(scores[:, block_columns].T, dtype=np.float64)
+      for f, values in zip(fields, _compute_block_metrics(genuine, block, polarity)):
+        table[f][block_columns] = values
+
+  return table
+
+# tests many systems at once
+table = compute_system_metrics(np.array([0, 0]), np.empty((2, 3)))
+assert len(table) == 3 and not float('-inf') < table['auc'][0] < float('inf')  # missing genuine, nan
+
+labels, scores = load_scores('/content/test.csv')
+score_matrix = np.stack((scores, -scores, np.round(scores, 1), np.round(-scores, 1)), axis=1)
+is_similarity = [True, False, True, False]
+table = compute_system_metrics(labels, score_matrix, ['a', 'b', 'c', 'd'], is_similarity, block_size=3)
+for k in range(score_matrix.shape[1]):
+  system = (labels, score_matrix[:, k])
+  assert table['system'][k] == 'abcd'[k]
+  assert abs(table['d_prime'][k] - compute_d_prime(system)) < 1e-9
+  assert (table['fnmr'][k], table['fmr'][k], table['eer_threshold'][k]) == \
+         compute_fmr_fnmr_eer(system, is_similarity[k])
+  assert abs(table['auc'][k] - compute_fmr_tmr_auc(system, is_similarity[k])[0]) < 1e-12
+
+# many tied scores
+for i in range(20):
+  random_labels = np.array([random.randint(0, 1) for j in range(50)])
+  random_scores = np.array([[random.randint(0, 10) / 10.0 for k in range(4)] for j in range(50)])
+  table = compute_system_metrics(random_labels, random_scores, is_similarity=[True, False, True, False])
+  for k in range(4):
+    system = (random_labels, random_scores[:, k])
+    assert (table['fnmr'][k], table['fmr'][k], table['eer_threshold'][k]) == \
+           compute_fmr_fnmr_eer(system, k % 2 == 0)
+    assert abs(table['auc'][k] - compute_fmr_tmr_auc(system, k % 2 == 0)[0]) < 1e-12
+print(table)
+
+"""---
+## Operating points
+
+The FMR and FNMR curve given by <code>compute_fmr_fnmr_curve</code> is computed only once;
+operating points are then found through binary search, for one or many target rates at once.
+A curve searched many times is prepared once with <code>prepare_operating_curve</code>.
+"""
+
+# Curve prepared for finding many operating points (see
+# <code>prepare_operating_curve</code>): the <thresholds>, <fmrs> and
+# <fnmrs> of a curve extended with the rejection of everything, and the
+# negated <fmrs>, which are ascending.
+OperatingCurve = collections.namedtuple('OperatingCurve', ['thresholds', 'fmrs', 'fnmrs', 'negated_fmrs'])
+
+# Prepares the given <curve> (a (<thresholds>, <fmrs>, <fnmrs>) triple, as
+# given by <code>compute_fmr_fnmr_curve</code>) for finding operating
+# points, so that each search costs O(log N) for every target rate.
+# Provide <is_similarity> as True if the curve scores are similarities or
+# False if they are distances.
+# Output: the prepared curve, to be given instead of <curve> to
+# <code>compute_operating_point_at_fmr</code> and
+# <code>compute_operating_point_at_fnmr</code>; None for an empty curve.
+def prepare_operating_curve(curve, is_similarity=True):
+  thresholds, fmrs, fnmrs = curve
+  if len(thresholds) == 0:
+    return None
+
+  # curve extended with the rejection of everything
+  fmrs = np.append(fmrs, 0.0)
+  return OperatingCurve(np.append(thresholds, float('inf') if is_similarity else float('-inf')),
+                        fmrs, np.append(fnmrs, 1.0), -fmrs)
+
+# Finds the operating point of the given <curve> (a (<thresholds>, <fmrs>,
+# <fnmrs>) triple, as given by <code>compute_fmr_fnmr_curve</code>, or a
+# curve given by <code>prepare_operating_curve</code>, to be preferred
+# when searching the same curve many times) with the most permissive
+# threshold whose FMR is not above <target_fmr>.
+# <target_fmr> can be either a number or an array of numbers.
+# Provide <is_similarity> as True if the curve scores are similarities or
+# False if they are distances.
+# If no threshold within the curve is good enough, the threshold rejects
+# everything ('inf' for similarities, '-inf' for distances), with FMR 0.0
+# and FNMR 1.0.
+# Output: FNMR, FMR, THRESHOLD (arrays, for an array of targets);
+# 'NaN', 'NaN', 'NaN' for an empty curve.
+def compute_operating_point_at_fmr(curve, target_fmr, is_similarity=True):
+  target_fmr = np.asarray(target_fmr, dtype=np.float64)
+  if not isinstance(curve, OperatingCurve):
+    curve = prepare_operating_curve(curve, is_similarity)
+  if curve is None:
+    return _get_operating_point(curve, target_fmr)
+
+  # FMR never increases along the thresholds; the rejection of everything
+  # is left out of the search, and taken when no threshold is good enough
+  i = np.searchsorted(curve.negated_fmrs[:-1], -target_fmr, side='left')
+  return _get_operating_point(curve, i)
+
+# Finds the operating point of the given <curve> (see
+# <code>compute_operating_point_at_fmr</code>) with the strictest threshold
+# whose FNMR is not above <target_fnmr>.
+# <target_fnmr> can be either a number or an array of numbers.
+# Output: FNMR, FMR, THRESHOLD (arrays, for an array of targets);
+# 'NaN', 'NaN', 'NaN' for an empty curve.
+def compute_operating_point_at_fnmr(curve, target_fnmr, is_similarity=True):
+  target_fnmr = np.asarray(target_fnmr, dtype=np.float64)
+  if not isinstance(curve, OperatingCurve):
+    curve = prepare_operating_curve(curve, is_similarity)
+  if curve is None:
+    return _get_operating_point(curve, target_fnmr)
+
+  # FNMR never decreases along the thresholds, and it is 0.0 at the first
+  # one; the rejection of everything is left out of the search
+  i = np.searchsorted(curve.fnmrs[:-1], target_fnmr, side='right') - 1
+  return _get_operating_point(curve, np.maximum(i, 0))
+
+# Finds the operating point of the given similarity <curve> with the
+# smallest threshold whose FMR is not above <target_fmr>
+# (see <code>compute_operating_point_at_fmr</code>).
+def compute_sim_operating_point_at_fmr(curve, target_fmr):
+  return compute_operating_point_at_fmr(curve, target_fmr, is_similarity=True)
+
+# Finds the operating point of the given similarity <curve> with the
+# largest threshold whose FNMR is not above <target_fnmr>
+# (see <code>compute_operating_point_at_fnmr</code>).
+def compute_sim_operating_point_at_fnmr(curve, target_fnmr):
+  return compute_operating_point_at_fnmr(curve, target_fnmr, is_similarity=True)
+
+# Gets the FNMR, FMR, THRESHOLD operating points at the given positions <i>
+# of the given prepared <curve> (see <code>prepare_operating_curve</code>);
+# the last position rejects everything. For a missing (empty) curve, <i>
+# only gives the shape of the output.
+def _get_operating_point(curve, i):
+  if curve is None:
+    nans = np.full(np.shape(i), float('NaN'))
+    return _to_scalars(nans, nans, nans)
+  return _to_scalars(curve.fnmrs[i], curve.fmrs[i], curve.thresholds[i])
+
+# Converts the given 0-dimensional arrays into Python floats,
+# keeping the other arrays as they are.
+def _to_scalars(*values):
+  return tuple(float(v) if np.ndim(v) == 0 else v for v in values)
+
+# Saves the given <curve> into the file stored in the given file path
+# (numpy .npz format), so that operating points can be found without
+# the raw scores.
+def save_fmr_fnmr_curve(file_path, curve):
+  thresholds, fmrs, fnmrs = curve
+  with open(file_path, 'wb') as f:
+    np.savez(f, thresholds=thresholds, fmrs=fmrs, fnmrs=fnmrs)
+
+# Loads the curve saved in the file stored in the given file path.
+# Output: (<thresholds>, <fmrs>, <fnmrs>) triple.
+def load_fmr_fnmr_curve(file_path):
+  with np.load(file_path) as data:
+    return data['thresholds'], data['fmrs'], data['fnmrs']
+
+# tests operating points
+curve = compute_sim_fmr_fnmr_curve([(0, 0.1), (0, 0.2), (0, 0.3), (0, 0.4), (1, 0.3), (1, 0.5)])
+assert compute_sim_operating_point_at_fmr(curve, 0.25) == (0.5, 0.25, 0.4)
+assert compute_sim_operating_point_at_fmr(curve, 0.5) == (0.0, 0.5, 0.3)
+assert compute_sim_operating_point_at_fmr(curve, 0.0) == (0.5, 0.0, 0.5)
+assert compute_sim_operating_point_at_fmr(curve, 1.0) == (0.0, 1.0, 0.1)
+assert compute_sim_operating_point_at_fnmr(curve, 0.0) == (0.0, 0.5, 0.3)
+assert compute_sim_operating_point_at_fnmr(curve, 0.5) == (0.5, 0.0, 0.5)
+
+curve = compute_sim_fmr_fnmr_curve([(0, 0.1), (1, 0.3), (0, 0.5)])
+assert compute_sim_operating_point_at_fmr(curve, 0.0) == (1.0, 0.0, float('inf'))  # everything rejected
+
+# distances
+curve = compute_fmr_fnmr_curve([(0, 0.9), (0, 0.8), (0, 0.7), (0, 0.6), (1, 0.7), (1, 0.5)], is_similarity=False)
+assert compute_operating_point_at_fmr(curve, 0.25, is_similarity=False) == (0.5, 0.25, 0.6)
+assert compute_operating_point_at_fnmr(curve, 0.0, is_similarity=False) == (0.0, 0.5, 0.7)
+assert compute_operating_point_at_fmr(curve, 0.0, is_similarity=False) == (0.5, 0.0, 0.5)
+
+curve = compute_fmr_fnmr_curve([(0, 0.1), (1, 0.3), (0, 0.5)], is_similarity=False)
+assert compute_operating_point_at_fmr(curve, 0.0, is_similarity=False) == (1.0, 0.0, float('-inf'))  # everything rejected
+
+assert not float('-inf') < compute_sim_operating_point_at_fmr(compute_sim_fmr_fnmr_curve([]), 0.1)[0] < float('inf')  # empty curve
+assert not float('-inf') < compute_sim_operating_point_at_fnmr(compute_sim_fmr_fnmr_curve([]), 0.1)[0] < float('inf')  # empty curve
+
+# many targets in one call agree with one call per target, and with the thresholds given by a scan
+curve = compute_sim_fmr_fnmr_curve(output)
+prepared_curve = prepare_operating_curve(curve)
+targets = np.array([0.0, 0.001, 0.01, 0.1, 0.5, 1.0])
+fnmrs, fmrs, thresholds = compute_sim_operating_point_at_fmr(curve, targets)
+for i in range(len(targets)):
+  assert compute_sim_operating_point_at_fmr(curve, targets[i]) == (fnmrs[i], fmrs[i], thresholds[i])
+  assert compute_sim_operating_point_at_fmr(prepared_curve, targets[i]) == (fnmrs[i], fmrs[i], thresholds[i])
+  assert compute_sim_operating_point_at_fnmr(prepared_curve, targets[i]) == compute_sim_operating_point_at_fnmr(curve, targets[i])
+  assert fmrs[i] == max([compute_sim_fmr(output, t) for t in curve[0] if compute_sim_fmr(output, t) <= targets[i]] + [0.0])
+
+fnmrs, fmrs, thresholds = compute_sim_operating_point_at_fnmr(curve, targets)
+for i in range(len(targets)):
+  assert fmrs[i] == compute_sim_fmr(output, thresholds[i])
+  assert fnmrs[i] == compute_sim_fnmr(output, thresholds[i]) <= targets[i]
+
+# curves are loaded back without the raw scores
+curve_path = os.path.join(tempfile.mkdtemp(), 'curve.npz')
+save_fmr_fnmr_curve(curve_path, curve)
+loaded_curve = load_fmr_fnmr_curve(curve_path)
+for i in range(3):
+  assert loaded_curve[i].tolist() == curve[i].tolist()
+
+"""---
+## Out-of-core metrics
 
-    for item in observations:
-        if item[0] == 0:
-            impostors.append(item[1])
-        else:
-            genuine.append(item[1])
+Score files larger than the available memory are read in chunks.
+d' is computed exactly from streamed statistics, while EER and AUC are computed from
+fixed-resolution score histograms, whose number of bins sets the trade-off between
+threshold resolution and memory (two integer counters per bin).
+"""
+
+# Reads the score file stored in the given file path in chunks of, at most,
+# <chunk_size> observations. The file can either be a CSV file (see
+# <code>load_scores</code>) or a binary score file (see <code>save_scores_binary</code>).
+# Yields (<labels>, <scores>) pairs of numpy arrays.
+def iter_score_chunks(file_path, chunk_size=1000000, score_dtype=np.float64):
+  with open(file_path, 'rb') as f:
+    is_binary = f.read(len(_SCORE_FILE_MAGIC)) == _SCORE_FILE_MAGIC
+
+  # binary score files are memory-mapped and sliced
+  if is_binary:
+    labels, scores = load_scores_binary(file_path)
+    for i in range(0, len(labels), chunk_size):
+      yield np.array(labels[i:i + chunk_size]), np.array(scores[i:i + chunk_size], dtype=score_dtype)
+
+  # CSV files are parsed every <chunk_size> lines
+  else:
+    with open(file_path) as f:
+      while True:
+        lines = list(itertools.islice(f, chunk_size))
+        if len(lines) == 0:
+          break
+
+        labels, scores = _parse_scores(lines, score_dtype)
+        if len(labels) > 0:
+          yield labels, scores
+
+# tests reading of score files in chunks
+chunks = list(iter_score_chunks('/content/test.csv', chunk_size=100))
+labels, scores = load_scores('/content/test.csv')
+assert np.concatenate([c[0] for c in chunks]).tolist() == labels.tolist()
+assert np.concatenate([c[1] for c in chunks]).tolist() == scores.tolist()
+
+save_scores_binary(binary_path, labels, scores)
+chunks = list(iter_score_chunks(binary_path, chunk_size=100))
+assert len(chunks) == (len(labels) + 99) // 100
+assert np.concatenate([c[1] for c in chunks]).tolist() == scores.tolist()
+
+"""---"""
+
+# Computes the histogram bin of each one of the given <scores>, with
+# <num_bins> bins of the same width covering the given <score_range>
+# (<min_score>, <max_score>). Scores out of the range go to the first or
+# last bins.
+def _compute_bins(scores, score_range, num_bins):
+  min_score, max_score = score_range
+  if max_score <= min_score:
+    return np.zeros(len(scores), dtype=np.int64)
+
+  bins = np.floor((scores - min_score) * (num_bins / (max_score - min_score)))
+  return np.clip(bins, 0, num_bins - 1).astype(np.int64)
+
+# Computes the FMR and FNMR curve from the given per-bin <genuine_hist> and
+# <impostor_hist> score counts. Bins cover the given <score_range> with the
+# same width. Similarity thresholds are the lower edges of the bins, while
+# distance thresholds are their upper edges; as in <code>_compute_curve</code>,
+# thresholds go from the most permissive to the strictest one.
+# Output: array of thresholds, array with FMR values, and array with FNMR
+# values; three empty arrays if any class has no scores.
+def _compute_hist_curve(genuine_hist, impostor_hist, score_range, is_similarity=True):
+  genuine_count = int(np.sum(genuine_hist))
+  impostor_count = int(np.sum(impostor_hist))
+  if genuine_count == 0 or impostor_count == 0:
+    empty = np.empty(0)
+    return empty, empty, empty
+
+  edges = np.linspace(score_range[0], score_range[1], len(genuine_hist) + 1)
+  if is_similarity:
+    # scores within bins below each threshold
+    genuine_below = np.concatenate(([0], np.cumsum(genuine_hist)[:-1]))
+    impostor_below = np.concatenate(([0], np.cumsum(impostor_hist)[:-1]))
+
+    thresholds = edges[:-1]
+    fnmrs = genuine_below / genuine_count
+    fmrs = (impostor_count - impostor_below) / impostor_count
+
+  else:
+    # scores within bins up to each threshold
+    genuine_below = np.cumsum(genuine_hist)
+    impostor_below = np.cumsum(impostor_hist)
+
+    thresholds = edges[1:][::-1]
+    fnmrs = ((genuine_count - genuine_below) / genuine_count)[::-1]
+    fmrs = (impostor_below / impostor_count)[::-1]
+
+  return thresholds, fmrs, fnmrs
+
+# Computes d-prime, FNMR and FMR at EER, and FMR x TMR AUC from the score
+# file stored in the given file path, reading it in chunks of <chunk_size>
+# observations, thus with bounded memory.
+# The file can either be a CSV or a binary score file (see <code>iter_score_chunks</code>).
+# EER and AUC are computed over <num_bins> thresholds evenly spread over
+# <score_range> (<min_score>, <max_score>); the default range is the one of
+# the file scores, found with an extra reading of the file.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Output: d-prime, (FNMR, FMR, EER_THRESHOLD), (AUC, array with FMR values,
+# array with TMR values), shaped as the outputs of <code>compute_d_prime</code>,
+# <code>compute_fmr_fnmr_eer</code>, and <code>compute_fmr_tmr_auc</code>.
+def compute_streamed_metrics(file_path, num_bins=65536, score_range=None,
+                             chunk_size=1000000, is_similarity=True):
+  # first reading: d-prime statistics and score range
+  stats = None
+  min_score = float('inf')
+  max_score = float('-inf')
+  for chunk in iter_score_chunks(file_path, chunk_size):
+    stats = update_d_prime_stats(chunk, stats)
+    min_score = min(min_score, float(np.min(chunk[1])))
+    max_score = max(max_score, float(np.max(chunk[1])))
+
+  if stats is None:
+    return float('NaN'), (float('NaN'),) * 3, (float('NaN'), np.empty(0), np.empty(0))
+  d_prime = compute_d_prime_from_stats(stats)
+
+  # second reading: per-class score histograms
+  if score_range is None:
+    score_range = (min_score, max_score)
+
+  genuine_hist = np.zeros(num_bins, dtype=np.int64)
+  impostor_hist = np.zeros(num_bins, dtype=np.int64)
+  for chunk in iter_score_chunks(file_path, chunk_size):
+    genuine, scores = _to_arrays(chunk)
+    bins = _compute_bins(scores, score_range, num_bins)
+    genuine_hist += np.bincount(bins[genuine], minlength=num_bins)
+    impostor_hist += np.bincount(bins[~genuine], minlength=num_bins)
+
+  # EER and AUC from the histograms
+  thresholds, fmrs, fnmrs = _compute_hist_curve(genuine_hist, impostor_hist, score_range, is_similarity)
+  eer = _find_eer(thresholds, fmrs, fnmrs)
+
+  auc = float('NaN')
+  tmrs = 1.0 - fnmrs
+  if len(thresholds) > 0:
+    auc = _compute_auc(fmrs, tmrs)
+    fmrs = np.append(fmrs, 0.0)
+    tmrs = np.append(tmrs, 0.0)
+
+  return d_prime, eer, (auc, fmrs, tmrs)
+
+# tests streamed metrics
+d_prime, eer, auc = compute_streamed_metrics('/content/test.csv', chunk_size=50)
+assert abs(d_prime - compute_d_prime(output)) < 1e-9  # exact d-prime
+
+# a file written with 3 decimal places, so 1000 bins per unit are enough to be exact
+rng = np.random.default_rng(0)
+decimal_path = os.path.join(tempfile.mkdtemp(), 'decimal.csv')
+np.savetxt(decimal_path, np.column_stack((rng.integers(0, 2, 500), np.round(rng.normal(0.5, 0.2, 500), 3))),
+           fmt=['%d', '%.3f'], delimiter=',')
+decimal_output = load_data(decimal_path)
+labels, scores = load_scores(decimal_path)
+score_range = (np.min(scores) - 0.0005, np.max(scores) + 0.0005)
+num_bins = int(round((score_range[1] - score_range[0]) * 1000))
+d_prime, eer, auc = compute_streamed_metrics(decimal_path, num_bins, score_range, chunk_size=50)
+assert eer[0:2] == compute_sim_fmr_fnmr_eer(decimal_output)[0:2]
+assert abs(eer[2] - compute_sim_fmr_fnmr_eer(decimal_output)[2]) < 0.001
+assert abs(auc[0] - compute_sim_fmr_tmr_auc(decimal_output)[0]) < 1e-9
+
+# distances
+save_scores_binary(binary_path, labels, -scores)
+d_prime, eer, auc = compute_streamed_metrics(binary_path, num_bins, (-score_range[1], -score_range[0]),
+                                             is_similarity=False)
+assert eer[0:2] == compute_sim_fmr_fnmr_eer(decimal_output)[0:2]
+assert abs(auc[0] - compute_sim_fmr_tmr_auc(decimal_output)[0]) < 1e-9
+save_scores_binary(binary_path, labels, scores)
+
+# coarser resolutions trade accuracy for memory
+d_prime, eer, auc = compute_streamed_metrics(binary_path, num_bins=16)
+assert len(auc[1]) == 17
+assert abs(auc[0] - compute_sim_fmr_tmr_auc(decimal_output)[0]) < 0.05
+
+"""---
+## Incremental metrics
 
-    plt.xlabel('score')
-    plt.ylabel('frequency')
+Scores that keep arriving are counted into two Fenwick trees (one per class) over quantized
+scores, so that inserting or expiring a batch of B observations costs O(B log num_bins).
+The EER and operating points are then found by descending the trees in O(log num_bins), while
+the AUC is kept up to date with every batch.
+"""
+
+# Adds the given <values> to the bins at the given <positions> of the given
+# Fenwick <tree> (in place).
+def _fenwick_add(tree, positions, values):
+  positions = positions + 1
+  while len(positions) > 0:
+    np.add.at(tree, positions - 1, values)
+    positions = positions + (positions & -positions)
+    keep = positions <= len(tree)
+    positions = positions[keep]
+    values = values[keep]
+
+# Sums the first <positions> bins of the given Fenwick <tree>.
+# <positions> can be either a number or an array of numbers.
+def _fenwick_prefix(tree, positions):
+  positions = np.array(positions, dtype=np.int64)
+  sums = np.zeros(positions.shape, dtype=tree.dtype)
+  while np.any(positions > 0):
+    sums += np.where(positions > 0, tree[positions - 1], 0)
+    positions = positions & (positions - 1)
+  return sums
+
+# Finds the largest number of first bins for which the given <condition>
+# holds, descending both the <genuine_tree> and the <impostor_tree> at
+# once. <condition> is called with the genuine and impostor counts of the
+# first bins, and it must hold for zero bins and stop holding after the
+# first time it fails.
+def _fenwick_search(genuine_tree, impostor_tree, condition):
+  position = 0
+  genuine_below = 0
+  impostor_below = 0
+
+  step = 1 << (len(genuine_tree).bit_length() - 1)
+  while step > 0:
+    next_position = position + step
+    if next_position <= len(genuine_tree):
+      next_genuine = genuine_below + int(genuine_tree[next_position - 1])
+      next_impostor = impostor_below + int(impostor_tree[next_position - 1])
+      if condition(next_genuine, next_impostor):
+        position, genuine_below, impostor_below = next_position, next_genuine, next_impostor
+    step >>= 1
+
+  return position
+
+# Index of scores for incremental metrics: its settings, the genuine and
+# impostor Fenwick trees over the bins, the class totals and the window of
+# the latest batches (see <code>create_score_index</code>).
+ScoreIndex = collections.namedtuple('ScoreIndex', ['score_range', 'num_bins', 'is_similarity', 'window_size',
+                                                   'genuine_tree', 'impostor_tree', 'totals', 'window'])
+
+# Creates an empty index of scores for incremental metrics, with
+# <num_bins> bins of the same width covering the given <score_range>
+# (<min_score>, <max_score>); scores out of the range go to the first or
+# last bins.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# If <window_size> is given, only the latest <window_size> observations are
+# kept, older ones expiring as new ones arrive.
+# Output: index to be given to <code>update_score_index</code> and to the
+# <code>compute_score_index_*</code> functions.
+def create_score_index(score_range, num_bins=65536, is_similarity=True, window_size=None):
+  # <totals> holds the genuine and impostor counts, and twice the
+  # Mann-Whitney U statistic; <window> holds batches of (<genuine>, <bins>)
+  # arrays within the window, oldest first
+  return ScoreIndex(score_range, num_bins, is_similarity, window_size,
+                    np.zeros(num_bins, dtype=np.int64), np.zeros(num_bins, dtype=np.int64),
+                    np.zeros(3, dtype=np.int64), collections.deque())
+
+# Inserts (<sign> 1) or removes (<sign> -1) the observations given by the
+# <genuine> boolean array and their respective <bins> into the trees of the
+# given <index>, updating the class counts and twice the U statistic (see
+# <code>_compute_double_u</code>). Removing a batch exactly undoes its
+# insertion.
+def _update_index_trees(index, genuine, bins, sign):
+  genuine_tree, impostor_tree, totals = index.genuine_tree, index.impostor_tree, index.totals
+  impostor_bins, impostor_counts = np.unique(bins[~genuine], return_counts=True)
+  genuine_bins, genuine_counts = np.unique(bins[genuine], return_counts=True)
+
+  # pairs between genuine and impostor observations of the batch are
+  # counted when the genuine observations are added (or removed first)
+  steps = [(impostor_tree, impostor_bins, impostor_counts, genuine_tree, True),
+           (genuine_tree, genuine_bins, genuine_counts, impostor_tree, False)]
+  if sign < 0:
+    steps.reverse()
+
+  for tree, tree_bins, counts, other_tree, is_impostor in steps:
+    if len(tree_bins) == 0:
+      continue
+
+    # other class observations below and up to each bin; a genuine score
+    # counts impostors below it, an impostor score counts genuine above it
+    other_below = _fenwick_prefix(other_tree, tree_bins)
+    other_upto = _fenwick_prefix(other_tree, tree_bins + 1)
+    if is_impostor:
+      double_u = np.sum(counts * (2 * totals[0] - other_below - other_upto))
+    else:
+      double_u = np.sum(counts * (other_below + other_upto))
+
+    _fenwick_add(tree, tree_bins, sign * counts)
+    totals[1 if is_impostor else 0] += sign * int(np.sum(counts))
+    totals[2] += sign * int(double_u)
+
+# Inserts the given observations into the given score <index>, expiring
+# the oldest ones if the index has a window.
+# Observations must be an array of (<label>,<score>) elements,
+# or a (<labels>, <scores>) pair of numpy arrays.
+# Labels must be either 0 (impostor) or something else (genuine).
+# Output: the updated index (the given one, updated in place).
+def update_score_index(index, observations):
+  genuine, scores = _to_arrays(observations)
+  window = index.window
+
+  # distances are binned in reverse, so that bins always go from the most
+  # permissive to the strictest score
+  bins = _compute_bins(scores, index.score_range, index.num_bins)
+  if not index.is_similarity:
+    bins = index.num_bins - 1 - bins
+
+  _update_index_trees(index, genuine, bins, 1)
+
+  if index.window_size is not None:
+    window.append((genuine, bins))
+    excess = int(index.totals[0] + index.totals[1]) - index.window_size
+    while excess > 0:
+      genuine, bins = window[0]
+      if len(bins) <= excess:
+        window.popleft()
+      else:
+        window[0] = (genuine[excess:], bins[excess:])
+        genuine, bins = genuine[:excess], bins[:excess]
+      _update_index_trees(index, genuine, bins, -1)
+      excess -= len(bins)
+
+  return index
+
+# Gets the FNMR, FMR, THRESHOLD operating point of the given score <index>
+# at the given number <k> of first bins: the lower edge of bin <k> for
+# similarities, or the upper edge of the respective bin for distances, as
+# in <code>_compute_hist_curve</code>; <k> past the last bin rejects
+# everything.
+def _get_index_point(index, k):
+  score_range, num_bins, is_similarity = index.score_range, index.num_bins, index.is_similarity
+  genuine_tree, impostor_tree, totals = index.genuine_tree, index.impostor_tree, index.totals
+  genuine_count, impostor_count = int(totals[0]), int(totals[1])
+  if k >= num_bins:
+    return 1.0, 0.0, float('inf') if is_similarity else float('-inf')
+
+  genuine_below, impostor_below = _fenwick_prefix(genuine_tree, k), _fenwick_prefix(impostor_tree, k)
+  fnmr = float(genuine_below / genuine_count)
+  fmr = float((impostor_count - impostor_below) / impostor_count)
+
+  # bin edge computed as within np.linspace, without building all the edges
+  edge = k if is_similarity else num_bins - k
+  threshold = float(score_range[1]) if edge == num_bins else \
+              float(edge * ((score_range[1] - score_range[0]) / num_bins) + score_range[0])
+  return fnmr, fmr, threshold
+
+# Computes FNMR and FMR at EER from the given score <index>, over the
+# thresholds of <code>_compute_hist_curve</code>.
+# Output: FNMR, FMR, EER_THRESHOLD.
+# If either the number of impostors or genuine observations is zero,
+# it returns 'NaN', 'NaN', 'NaN'.
+def compute_score_index_eer(index):
+  num_bins, genuine_tree, impostor_tree = index.num_bins, index.genuine_tree, index.impostor_tree
+  genuine_count, impostor_count = int(index.totals[0]), int(index.totals[1])
+  if genuine_count == 0 or impostor_count == 0:
+    return float('NaN'), float('NaN'), float('NaN')
+
+  # FNMR - FMR never decreases along the bins and it is proportional to
+  # genuine_below x I + impostor_below x G - G x I
+  def diff(genuine_below, impostor_below):
+    return genuine_below * impostor_count + impostor_below * genuine_count - genuine_count * impostor_count
+
+  # last threshold with FNMR <= FMR, and the next one
+  k = _fenwick_search(genuine_tree, impostor_tree, lambda g, i: diff(g, i) <= 0)
+  if k + 1 < num_bins:
+    fnmr, fmr, _ = _get_index_point(index, k)
+    next_fnmr, next_fmr, _ = _get_index_point(index, k + 1)
+
+    # among thresholds with the same smallest difference, the strictest one
+    # is taken; differences are compared as in _find_eer
+    if abs(next_fnmr - next_fmr) <= abs(fnmr - fmr):
+      next_diff = diff(_fenwick_prefix(genuine_tree, k + 1), _fenwick_prefix(impostor_tree, k + 1))
+      k = min(_fenwick_search(genuine_tree, impostor_tree, lambda g, i: diff(g, i) <= next_diff), num_bins - 1)
+
+  return _get_index_point(index, k)
+
+# Computes FMR x TMR AUC from the given score <index>, over the thresholds
+# of <code>_compute_hist_curve</code> (scores within the same bin are tied).
+# If either the number of impostors or genuine observations is zero, it returns 'NaN'.
+def compute_score_index_auc(index):
+  genuine_count, impostor_count, double_u = (int(v) for v in index.totals)
+  if genuine_count == 0 or impostor_count == 0:
+    return float('NaN')
+  return double_u / (2.0 * genuine_count * impostor_count)
+
+# Finds the operating point of the given score <index> with the most
+# permissive threshold whose FMR is not above <target_fmr>
+# (see <code>compute_operating_point_at_fmr</code>).
+# Output: FNMR, FMR, THRESHOLD; 'NaN', 'NaN', 'NaN' if any class is missing.
+def compute_score_index_operating_point_at_fmr(index, target_fmr):
+  genuine_tree, impostor_tree, totals = index.genuine_tree, index.impostor_tree, index.totals
+  impostor_count = int(totals[1])
+  if totals[0] == 0 or impostor_count == 0:
+    return float('NaN'), float('NaN'), float('NaN')
+  if target_fmr >= 1.0:
+    return _get_index_point(index, 0)
+
+  # FMR never increases along the bins
+  k = _fenwick_search(genuine_tree, impostor_tree, lambda g, i: (impostor_count - i) / impostor_count > target_fmr)
+  return _get_index_point(index, k + 1)
+
+# Finds the operating point of the given score <index> with the strictest
+# threshold whose FNMR is not above <target_fnmr>
+# (see <code>compute_operating_point_at_fnmr</code>).
+# Output: FNMR, FMR, THRESHOLD; 'NaN', 'NaN', 'NaN' if any class is missing.
+def compute_score_index_operating_point_at_fnmr(index, target_fnmr):
+  genuine_tree, impostor_tree, totals = index.genuine_tree, index.impostor_tree, index.totals
+  genuine_count = int(totals[0])
+  if genuine_count == 0 or totals[1] == 0:
+    return float('NaN'), float('NaN'), float('NaN')
+
+  # FNMR never decreases along the bins, and it is 0.0 at the first one
+  k = _fenwick_search(genuine_tree, impostor_tree, lambda g, i: g / genuine_count <= target_fnmr)
+  return _get_index_point(index, min(k, index.num_bins - 1))
+
+# tests Fenwick trees
+tree = np.zeros(10, dtype=np.int64)
+_fenwick_add(tree, np.array([0, 3, 3, 9]), np.array([1, 2, 3, 4]))
+assert _fenwick_prefix(tree, [0, 1, 4, 9, 10]).tolist() == [0, 1, 6, 6, 10]
+
+# tests incremental metrics against the histogram-based ones, on a file
+# written with 3 decimal places, so that 1000 bins per unit are exact
+rng = np.random.default_rng(1)
+decimal_path = os.path.join(tempfile.mkdtemp(), 'decimal.csv')
+np.savetxt(decimal_path, np.column_stack((rng.integers(0, 2, 500), np.round(rng.normal(0.5, 0.2, 500), 3))),
+           fmt=['%d', '%.3f'], delimiter=',')
+decimal_output = load_data(decimal_path)
+labels, scores = load_scores(decimal_path)
+score_range = (np.min(scores) - 0.0005, np.max(scores) + 0.0005)
+num_bins = int(round((score_range[1] - score_range[0]) * 1000))
+for is_similarity in (True, False):
+  index_range = score_range if is_similarity else (-score_range[1], -score_range[0])
+  index_scores = scores if is_similarity else -scores
+  index = create_score_index(index_range, num_bins, is_similarity)
+  assert not float('-inf') < compute_score_index_eer(index)[0] < float('inf')  # empty index, not a number
+
+  for b in range(0, len(labels), 70):
+    update_score_index(index, (labels[b:b + 70], index_scores[b:b + 70]))
+
+  genuine_hist = np.bincount(_compute_bins(index_scores[labels != 0], index_range, num_bins), minlength=num_bins)
+  impostor_hist = np.bincount(_compute_bins(index_scores[labels == 0], index_range, num_bins), minlength=num_bins)
+  curve = _compute_hist_curve(genuine_hist, impostor_hist, index_range, is_similarity)
+  assert compute_score_index_eer(index) == _find_eer(*curve)
+  assert abs(compute_score_index_auc(index) - compute_sim_fmr_tmr_auc(decimal_output)[0]) < 1e-12
+  for target in (0.0, 0.01, 0.1, 0.5, 1.0):
+    assert compute_score_index_operating_point_at_fmr(index, target) == \
+           compute_operating_point_at_fmr(curve, target, is_similarity)
+    assert compute_score_index_operating_point_at_fnmr(index, target) == \
+           compute_operating_point_at_fnmr(curve, target, is_similarity)
+
+# tests sliding window: only the latest observations count
+index = create_score_index(score_range, num_bins, window_size=100)
+for b in range(0, len(labels), 30):
+  update_score_index(index, (labels[b:b + 30], scores[b:b + 30]))
+
+window_index = update_score_index(create_score_index(score_range, num_bins), (labels[-100:], scores[-100:]))
+assert compute_score_index_eer(index) == compute_score_index_eer(window_index)
+assert compute_score_index_auc(index) == compute_score_index_auc(window_index)
+assert index.totals.tolist() == window_index.totals.tolist()
+print('EER:', compute_score_index_eer(index), 'AUC:', compute_score_index_auc(index))
 
-    plt.hist(impostors, facecolor='red', alpha=0.5, label='impostor', align='mid')
-    plt.hist(genuine, facecolor='blue', alpha=0.5, label='genuine', align='mid')
-    plt.legend(loc='lower right')
+"""---
+## Bootstrap confidence intervals
+
+Observations are sorted only once; every bootstrap replicate is then expressed as the number of times
+each sorted observation was drawn, so its FMR and FNMR curve comes from weighted cumulative counts,
+without sorting again. Replicates are computed in vectorized batches, spread over a pool of processes.
+"""
+
+# data shared by the bootstrap replicates of a worker process of the pool, set
+# only once per process by <code>_init_bootstrap_worker</code>
+_bootstrap_data = None
+
+# Sets the data shared by the bootstrap replicates computed by the current
+# worker process: the <sorted_genuine> boolean array, the sorted scores centered on
+# their class means <centered_scores>, the genuine and impostor
+# <class_means>, and the first position of every run of tied scores
+# <run_starts>.
+def _init_bootstrap_worker(sorted_genuine, centered_scores, class_means, run_starts):
+  global _bootstrap_data
+  _bootstrap_data = (sorted_genuine, centered_scores, class_means, run_starts)
+
+# Prepares the data shared by the bootstrap replicates from the given
+# <genuine> and <scores> arrays, sorting the scores only once.
+# Output: the shared data, as the arguments of <code>_init_bootstrap_worker</code>.
+def _prepare_bootstrap_data(genuine, scores):
+  order = np.argsort(scores, kind='stable')
+  sorted_scores = scores[order].astype(np.float64)
+  sorted_genuine = genuine[order]
+  run_starts = np.flatnonzero(np.concatenate(([True], sorted_scores[1:] != sorted_scores[:-1])))
+
+  # centering on the class means keeps the weighted sums of squares accurate
+  class_means = (np.mean(sorted_scores[sorted_genuine]), np.mean(sorted_scores[~sorted_genuine]))
+  centered_scores = sorted_scores
+  centered_scores[sorted_genuine] -= class_means[0]
+  centered_scores[~sorted_genuine] -= class_means[1]
+
+  return sorted_genuine, centered_scores, class_means, run_starts
+
+# Computes <num_replicates> bootstrap replicates of EER, AUC, and d-prime
+# over the given <shared_data> (see <code>_prepare_bootstrap_data</code>), in
+# vectorized batches of <batch_size> replicates. Random draws come from the
+# given <seed>.
+# The EER of a replicate is the average of its FNMR and FMR at EER.
+# Output: array of EER values, array of AUC values, array of d-prime values;
+# 'NaN' values are given to replicates missing one of the classes.
+def _run_bootstrap_replicates(shared_data, seed, num_replicates, batch_size=8):
+  sorted_genuine, centered_scores, class_means, run_starts = shared_data
+  n = len(sorted_genuine)
+  run_ends = np.append(run_starts[1:], n)
+  rng = np.random.default_rng(seed)
+
+  eers = []
+  aucs = []
+  d_primes = []
+  for b in range(0, num_replicates, batch_size):
+    b = min(batch_size, num_replicates - b)
+
+    # number of times each sorted observation is drawn in each replicate
+    draws = rng.integers(0, n, size=(b, n)) + np.arange(b)[:, None] * n
+    weights = np.bincount(draws.ravel(), minlength=b * n).reshape(b, n)
+    genuine_weights = weights * sorted_genuine
+
+    # weighted counts below each position
+    zeros = np.zeros((b, 1), dtype=weights.dtype)
+    total_cumsum = np.concatenate((zeros, np.cumsum(weights, axis=1)), axis=1)
+    genuine_cumsum = np.concatenate((zeros, np.cumsum(genuine_weights, axis=1)), axis=1)
+    genuine_count = genuine_cumsum[:, -1:]
+    impostor_count = n - genuine_count
+
+    # FMR and FNMR curves, at every distinct score of the original observations
+    with np.errstate(divide='ignore', invalid='ignore'):
+      genuine_below = genuine_cumsum[:, run_starts]
+      impostor_below = total_cumsum[:, run_starts] - genuine_below
+      fnmrs = genuine_below / genuine_count
+      fmrs = (impostor_count - impostor_below) / impostor_count
+
+    # EER, ignoring thresholds not drawn in the replicate
+    diffs = np.abs(fnmrs - fmrs)
+    diffs[total_cumsum[:, run_ends] == total_cumsum[:, run_starts]] = float('inf')
+    i = diffs.shape[1] - 1 - np.argmin(diffs[:, ::-1], axis=1)
+    rows = np.arange(b)
+    eers.append((fnmrs[rows, i] + fmrs[rows, i]) / 2.0)
+
+    # AUC; thresholds not drawn just repeat points, adding no area
+    fmrs = np.concatenate((fmrs, zeros), axis=1)
+    tmrs = np.concatenate((1.0 - fnmrs, zeros), axis=1)
+    aucs.append(np.sum(np.abs(fmrs[:, :-1] - fmrs[:, 1:]) * (tmrs[:, :-1] + tmrs[:, 1:]) / 2.0, axis=1))
+
+    # d-prime from weighted sums of the centered scores
+    with np.errstate(divide='ignore', invalid='ignore'):
+      class_stats = []
+      for class_weights, count, class_mean in ((genuine_weights, genuine_count[:, 0], class_means[0]),
+                                               (weights - genuine_weights, impostor_count[:, 0], class_means[1])):
+        mean = class_weights @ centered_scores / count
+        var = class_weights @ centered_scores ** 2.0 / count - mean ** 2.0
+        class_stats.append((class_mean + mean, np.maximum(var, 0.0)))
+      d_primes.append(2.0 ** 0.5 * np.abs(class_stats[0][0] - class_stats[1][0]) /
+                      (class_stats[0][1] + class_stats[1][1]) ** 0.5)
+
+  if num_replicates == 0:
+    return np.empty(0), np.empty(0), np.empty(0)
+  return np.concatenate(eers), np.concatenate(aucs), np.concatenate(d_primes)
+
+# Computes bootstrap replicates (see <code>_run_bootstrap_replicates</code>)
+# over the data set by <code>_init_bootstrap_worker</code>, within a worker
+# process of the pool.
+def _run_bootstrap_task(seed, num_replicates, batch_size):
+  return _run_bootstrap_replicates(_bootstrap_data, seed, num_replicates, batch_size)
+
+# Computes bootstrap confidence intervals of EER, FMR x TMR AUC, and d-prime
+# for the given observations, with <num_replicates> replicates.
+# Observations must be an array of (<label>,<score>) elements,
+# or a (<labels>, <scores>) pair of numpy arrays.
+# Labels must be either 0 (impostor) or something else (genuine).
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Replicates are spread over <num_workers> processes (default: all CPUs;
+# 1 to compute everything within the current process), in vectorized
+# batches of <batch_size> replicates (memory grows with batch_size x N).
+# The same <seed> gives the same intervals, regardless of <num_workers>.
+# The EER is the average of FNMR and FMR at EER.
+# Output: three (<estimate>, <lower_bound>, <upper_bound>) triples,
+# respectively for EER, AUC, and d-prime; bounds are percentiles of the
+# replicates, according to the given <confidence> level.
+# If either the number of impostors or genuine observations is zero,
+# all values are 'NaN'.
+def compute_bootstrap_cis(observations, num_replicates=1000, confidence=0.95,
+                          num_workers=None, batch_size=8, seed=None, is_similarity=True):
+  # point estimates
+  genuine, scores = _to_arrays(observations)
+  thresholds, fmrs, fnmrs, _ = _compute_curve(genuine, scores, is_similarity)
+  fnmr, fmr, _ = _find_eer(thresholds, fmrs, fnmrs)
+  eer = (fnmr + fmr) / 2.0
+  auc = _compute_auc(fmrs, 1.0 - fnmrs) if len(thresholds) > 0 else float('NaN')
+  d_prime = compute_d_prime((genuine, scores))
+
+  # nothing to resample if any class is missing
+  if len(thresholds) == 0:
+    return (eer, float('NaN'), float('NaN')), (auc, float('NaN'), float('NaN')), \
+           (d_prime, float('NaN'), float('NaN'))
+
+  # one global sort, shared by all the replicates; negated distances are
+  # similarities with the same EER, AUC, and d-prime
+  shared_data = _prepare_bootstrap_data(genuine, scores if is_similarity else -scores)
+
+  # replicates are split into tasks with their own random seeds
+  task_sizes = [batch_size] * (num_replicates // batch_size)
+  if num_replicates % batch_size > 0:
+    task_sizes.append(num_replicates % batch_size)
+  task_seeds = np.random.SeedSequence(seed).spawn(len(task_sizes))
+  task_batch_sizes = [batch_size] * len(task_sizes)
+
+  # within the current process, the data is given explicitly; worker
+  # processes get it once, through _init_bootstrap_worker
+  if num_workers == 1:
+    results = [_run_bootstrap_replicates(shared_data, task_seed, task_size, task_batch_size)
+               for task_seed, task_size, task_batch_size in zip(task_seeds, task_sizes, task_batch_sizes)]
+  else:
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers,
+                                                initializer=_init_bootstrap_worker,
+                                                initargs=shared_data) as executor:
+      results = list(executor.map(_run_bootstrap_task, task_seeds, task_sizes, task_batch_sizes))
+
+  # percentile intervals
+  percentiles = [(1.0 - confidence) / 2.0 * 100.0, (1.0 + confidence) / 2.0 * 100.0]
+  output = []
+  for estimate, k in ((eer, 0), (auc, 1), (d_prime, 2)):
+    replicates = np.concatenate([r[k] for r in results])
+    lower, upper = np.nanpercentile(replicates, percentiles)
+    output.append((estimate, float(lower), float(upper)))
+
+  return tuple(output)
+
+# tests bootstrap replicates against explicitly resampled observations
+sorted_observations = sorted(output, key=lambda obs: obs[1])
+shared_data = _prepare_bootstrap_data(*_to_arrays(sorted_observations))
+
+eers, aucs, d_primes = _run_bootstrap_replicates(shared_data, 42, 5, batch_size=2)
+rng = np.random.default_rng(42)
+for i in range(5):
+  draws = rng.integers(0, len(sorted_observations), size=len(sorted_observations))
+  resampled = [sorted_observations[j] for j in draws]
+  fnmr, fmr, _ = compute_sim_fmr_fnmr_eer(resampled)
+  assert abs(eers[i] - (fnmr + fmr) / 2.0) < 1e-12
+  assert abs(aucs[i] - compute_sim_fmr_tmr_auc(resampled)[0]) < 1e-12
+  assert abs(d_primes[i] - compute_d_prime(resampled)) < 1e-9
+
+# tests bootstrap confidence intervals
+eer_ci, auc_ci, d_prime_ci = compute_bootstrap_cis([], num_replicates=10)
+assert not float('-inf') < eer_ci[1] < float('inf')  # empty array, not a number
+
+eer_ci, auc_ci, d_prime_ci = compute_bootstrap_cis(output, num_replicates=100, num_workers=1, seed=7)
+assert _bootstrap_data is None  # nothing pinned within the current process
+for ci in (eer_ci, auc_ci, d_prime_ci):
+  assert np.all(np.isfinite(ci)) and ci[1] <= ci[2]  # the point estimate may fall outside
+
+# same seed, same intervals, regardless of the number of processes
+assert compute_bootstrap_cis(output, num_replicates=100, num_workers=2, seed=7) == (eer_ci, auc_ci, d_prime_ci)
+
+# distances
+labels, scores = _to_arrays(output)
+distance_cis = compute_bootstrap_cis((labels, -scores), num_replicates=100, num_workers=1, seed=7, is_similarity=False)
+for ci, distance_ci in zip((eer_ci, auc_ci, d_prime_ci), distance_cis):
+  assert np.allclose(ci, distance_ci)
+print('EER:', eer_ci, 'AUC:', auc_ci, "d':", d_prime_ci)
+
+"""---
+## Identification metrics
+
+In 1:N searches, every probe is compared to all the gallery entries, giving a
+(<num_probes> x <num_gallery>) score matrix. Only the best <max_rank> candidates of each
+probe are kept, selected with <code>np.argpartition</code> block after block of gallery
+entries, so the whole matrix never needs to be in memory at once.
+"""
+
+# Selects the best <k> scores of each row of the given <scores> matrix,
+# together with their respective <positions> (same shape), without sorting.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Output: (<num_rows> x min(<k>, <num_columns>)) scores and positions.
+def _select_top_k(scores, positions, k, is_similarity=True):
+  n = scores.shape[1]
+  if n <= k:
+    return scores, positions
+
+  if is_similarity:
+    keep = np.argpartition(scores, n - k, axis=1)[:, n - k:]
+  else:
+    keep = np.argpartition(scores, k - 1, axis=1)[:, :k]
+  return np.take_along_axis(scores, keep, axis=1), np.take_along_axis(positions, keep, axis=1)
+
+# Computes the candidate list of each probe: its best <max_rank> gallery
+# entries, from the best to the worst one (ties go to the first gallery
+# entry; ties at the last rank are broken arbitrarily).
+# <scores> is either a (<num_probes> x <num_gallery>) matrix, read in
+# blocks of <block_size> gallery entries, or an iterable of
+# (<num_probes> x <block_size>) blocks of consecutive gallery entries
+# (e.g., computed on demand), so that the whole matrix is never stored.
+# <gallery_ids> is the array with the identity of every gallery entry.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Output: (<num_probes> x min(<max_rank>, <num_gallery>)) arrays with the
+# candidate scores and the candidate identities.
+def compute_candidate_lists(scores, gallery_ids, max_rank=20, is_similarity=True, block_size=1024):
+  gallery_ids = np.asarray(gallery_ids)
+  blocks = scores
+  if isinstance(scores, np.ndarray):
+    blocks = (scores[:, b:b + block_size] for b in range(0, scores.shape[1], block_size))
+
+  top_scores = None
+  top_positions = None
+  start = 0
+  for block in blocks:
+    # best candidates within the block, then merged with the best ones so far
+    positions = np.broadcast_to(np.arange(start, start + block.shape[1]), block.shape)
+    block_scores, block_positions = _select_top_k(block, positions, max_rank, is_similarity)
+    if top_scores is not None:
+      block_scores = np.concatenate((top_scores, block_scores), axis=1)
+      block_positions = np.concatenate((top_positions, block_positions), axis=1)
+    top_scores, top_positions = _select_top_k(block_scores, block_positions, max_rank, is_similarity)
+    start += block.shape[1]
+
+  if start != len(gallery_ids):
+    raise ValueError('Scores must have one column per gallery identity.')
+
+  # best candidates first, then by gallery order
+  order = np.lexsort((top_positions, -top_scores if is_similarity else top_scores), axis=1)
+  top_scores = np.take_along_axis(top_scores, order, axis=1)
+  top_positions = np.take_along_axis(top_positions, order, axis=1)
+  return top_scores, gallery_ids[top_positions]
+
+# Finds the rank (1 for the first candidate) of the first candidate of each
+# probe with the probe identity, within the given candidate identities
+# <candidate_ids> (as given by <code>compute_candidate_lists</code>) of the
+# probes with the given <probe_ids>; 0 if there is none.
+def _find_mated_ranks(candidate_ids, probe_ids):
+  hits = candidate_ids == np.asarray(probe_ids)[:, None]
+  return np.where(np.any(hits, axis=1), np.argmax(hits, axis=1) + 1, 0)
+
+# Computes the CMC (Cumulative Match Characteristic) curve from the given
+# <candidates> (as given by <code>compute_candidate_lists</code>) of the
+# probes with the given <probe_ids>. Only probes whose identity is in the
+# given <gallery_ids> (mated probes) are considered.
+# Output: array with the rank-k identification rate at every rank k, from
+# 1 to the candidate list length (the rank-k rate is <cmc[k - 1]>);
+# 'NaN' values if there are no mated probes.
+def compute_cmc(candidates, probe_ids, gallery_ids):
+  _, candidate_ids = candidates
+  probe_ids = np.asarray(probe_ids)
+  mated = np.isin(probe_ids, gallery_ids)
+  if not np.any(mated):
+    return np.full(candidate_ids.shape[1], float('NaN'))
+
+  ranks = _find_mated_ranks(candidate_ids[mated], probe_ids[mated])
+  rank_counts = np.bincount(ranks, minlength=candidate_ids.shape[1] + 1)[1:]
+  return np.cumsum(rank_counts) / len(ranks)
+
+# Computes the open-set FPIR (False Positive Identification Rate) and FNIR
+# (False Negative Identification Rate) at each one of the given
+# <thresholds>, from the given <candidates> (as given by
+# <code>compute_candidate_lists</code>) of the probes with the given
+# <probe_ids>, considering the first <candidate_list_length> candidates.
+# FPIR is the rate of probes not in the given <gallery_ids> (non-mated)
+# with any candidate matching the threshold; FNIR is the rate of mated
+# probes whose identity is not among the candidates matching it.
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Output: array with FPIR values and array with FNIR values (one per
+# threshold); 'NaN' values for missing non-mated or mated probes.
+def compute_fpir_fnir(candidates, probe_ids, gallery_ids, thresholds, candidate_list_length=1,
+                      is_similarity=True):
+  candidate_scores, candidate_ids = candidates
+  candidate_scores = candidate_scores[:, :candidate_list_length]
+  candidate_ids = candidate_ids[:, :candidate_list_length]
+  probe_ids = np.asarray(probe_ids)
+  mated = np.isin(probe_ids, gallery_ids)
+  thresholds = np.asarray(thresholds, dtype=np.float64)
+
+  # similarities are negated, so that smaller values are always better
+  sign = -1.0 if is_similarity else 1.0
+
+  # non-mated probes: best candidate score
+  fpirs = np.full(thresholds.shape, float('NaN'))
+  if np.any(~mated):
+    best_scores = np.sort(sign * candidate_scores[~mated, 0])
+    fpirs = np.searchsorted(best_scores, sign * thresholds, side='right') / len(best_scores)
+
+  # mated probes: score of their identity, if among the candidates
+  fnirs = np.full(thresholds.shape, float('NaN'))
+  if np.any(mated):
+    ranks = _find_mated_ranks(candidate_ids[mated], probe_ids[mated])
+    mated_scores = np.full(len(ranks), float('inf'))
+    found = ranks > 0
+    mated_scores[found] = sign * candidate_scores[mated][found, ranks[found] - 1]
+    mated_scores = np.sort(mated_scores)
+    fnirs = 1.0 - np.searchsorted(mated_scores, sign * thresholds, side='right') / len(mated_scores)
+
+  return fpirs, fnirs
+
+# tests identification metrics
+gallery_ids = np.array(['a', 'b', 'c', 'd'])
+probe_ids = np.array(['a', 'b', 'c', 'x'])
+scores = np.array([[0.9, 0.1, 0.2, 0.3],   # 'a' at rank 1
+                   [0.8, 0.7, 0.1, 0.1],   # 'b' at rank 2
+                   [0.9, 0.8, 0.1, 0.7],   # 'c' at rank 4
+                   [0.4, 0.3, 0.2, 0.1]])  # 'x' not in the gallery
+candidates = compute_candidate_lists(scores, gallery_ids, max_rank=3, block_size=2)
+assert candidates[1].tolist() == [['a', 'd', 'c'], ['a', 'b', 'c'], ['a', 'b', 'd'], ['a', 'b', 'c']]
+assert np.allclose(compute_cmc(candidates, probe_ids, gallery_ids), [1 / 3, 2 / 3, 2 / 3])
+
+fpirs, fnirs = compute_fpir_fnir(candidates, probe_ids, gallery_ids, [0.3, 0.5, 0.95])
+assert fpirs.tolist() == [1.0, 0.0, 0.0]
+assert np.allclose(fnirs, [2 / 3, 2 / 3, 1.0])
+fpirs, fnirs = compute_fpir_fnir(candidates, probe_ids, gallery_ids, [0.5], candidate_list_length=2)
+assert np.allclose(fnirs, [1 / 3])
+
+# distances
+candidates = compute_candidate_lists(1.0 - scores, gallery_ids, max_rank=3, is_similarity=False)
+assert candidates[1][:, 0].tolist() == ['a', 'a', 'a', 'a']
+assert np.allclose(compute_fpir_fnir(candidates, probe_ids, gallery_ids, [0.5], is_similarity=False)[1], [2 / 3])
+
+# blocks of gallery entries computed on demand give the same candidates as full sorting
+random_scores = np.random.default_rng(0).random((50, 300))
+random_gallery_ids = np.arange(300) % 120
+blocks = (random_scores[:, b:b + 64] for b in range(0, 300, 64))
+candidate_scores, candidate_ids = compute_candidate_lists(blocks, random_gallery_ids, max_rank=10)
+order = np.argsort(-random_scores, axis=1, kind='stable')[:, :10]
+assert (candidate_ids == random_gallery_ids[order]).all()
+assert (candidate_scores == np.take_along_axis(random_scores, order, axis=1)).all()
+print('CMC:', compute_cmc((candidate_scores, candidate_ids), np.arange(50), random_gallery_ids))
+
+"""---
+## Benchmark
+
+Synthetic genuine and impostor scores of any size are generated to measure how the metrics
+scale. Each metric is timed (best of a few runs), its peak memory is traced, and its output
+is checked against a reference computation. Results are saved as a JSON report, so that
+reports of different versions can be compared.
+"""
+
+# Generates <num_observations> synthetic similarity observations, with
+# normally distributed impostor (mean 0.0) and genuine (mean <d_prime>)
+# scores of unit variance, so that the expected d-prime is <d_prime>.
+# <genuine_ratio> is the expected fraction of genuine observations.
+# <tie_density> is the expected fraction of observations tied with others:
+# scores are rounded to a grid with about <num_observations> x
+# (1 - <tie_density>) values.
+# Output: (<labels>, <scores>) pair of numpy arrays.
+def generate_scores(num_observations, genuine_ratio=0.5, tie_density=0.0, d_prime=2.0, seed=None):
+  rng = np.random.default_rng(seed)
+  labels = (rng.random(num_observations) < genuine_ratio).astype(np.int8)
+  scores = rng.standard_normal(num_observations)
+  scores += labels * d_prime
+
+  if tie_density > 0.0 and num_observations > 0:
+    num_values = max(1, int(num_observations * (1.0 - tie_density)))
+    step = (np.max(scores) - np.min(scores)) / num_values
+    if step > 0.0:
+      scores = np.round(scores / step) * step
+
+  return labels, scores
+
+# Computes FNMR and FMR at EER from the given similarity <observations>,
+# taking one threshold at a time, as defined by <code>compute_fmr</code>
+# and <code>compute_fnmr</code>; quadratic, only for checking.
+# Output: FNMR, FMR, EER_THRESHOLD.
+def _compute_reference_eer(observations):
+  output = (float('NaN'), float('NaN'), float('NaN'))
+  smallest_diff = float('inf')
+  for threshold in np.unique(observations[1]):
+    fnmr = compute_fnmr(observations, threshold)
+    fmr = compute_fmr(observations, threshold)
+    if not float('-inf') < fnmr < float('inf') or not float('-inf') < fmr < float('inf'):
+      break
+
+    # the strictest threshold among the ones with the smallest difference
+    if abs(fnmr - fmr) <= smallest_diff:
+      smallest_diff = abs(fnmr - fmr)
+      output = (fnmr, fmr, float(threshold))
+
+  return output
+
+# Computes the FMR x TMR AUC of the given similarity <observations> by
+# comparing every genuine score with every impostor score (a tie counts
+# half), <block_size> genuine scores at a time; quadratic, only for checking.
+# Output: AUC; 'NaN' if either class is missing.
+def _compute_reference_auc(observations, block_size=1000):
+  genuine, scores = _to_arrays(observations)
+  genuine_scores, impostor_scores = scores[genuine], scores[~genuine]
+  if len(genuine_scores) == 0 or len(impostor_scores) == 0:
+    return float('NaN')
+
+  wins = 0.0
+  for b in range(0, len(genuine_scores), block_size):
+    block = genuine_scores[b:b + block_size, np.newaxis]
+    wins += np.count_nonzero(block > impostor_scores) + 0.5 * np.count_nonzero(block == impostor_scores)
+
+  return wins / (len(genuine_scores) * len(impostor_scores))
+
+# Runs the given <function> over the given <args>, <repeats> times.
+# Output: output of the function, best time (seconds), and peak memory
+# allocated during the first run (bytes).
+def _measure(function, args, repeats=3):
+  tracemalloc.start()
+  try:
+    start = time.perf_counter()
+    output = function(*args)
+    best_time = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+  for i in range(repeats - 1):
+    start = time.perf_counter()
+    function(*args)
+    best_time = min(best_time, time.perf_counter() - start)
+
+  return output, best_time, peak_memory
+
+# Benchmarks d-prime, EER, AUC (curve and rank-based), and CSV loading over
+# synthetic scores (see <code>generate_scores</code>) of every given size,
+# genuine ratio, and tie density.
+# Outputs are checked against reference computations: the threshold-by-
+# threshold EER and the pairwise AUC up to <reference_limit> observations,
+# and numpy means and variances for d-prime. CSV loading is measured up to
+# <load_limit> observations.
+# Provide <report_path> to save the report as a JSON file.
+# Output: report, a dictionary with the NumPy version and one record per
+# measurement (function, num_observations, genuine_ratio, tie_density,
+# seconds, peak_bytes, error, and ok, telling if the error is within
+# <tolerance>; error is 'None' if there is no reference).
+def run_metrics_benchmark(sizes=(10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 10 ** 8),
+                          genuine_ratios=(0.5, 0.01), tie_densities=(0.0, 0.9), repeats=3,
+                          reference_limit=10 ** 4, load_limit=10 ** 6, tolerance=1e-9,
+                          report_path=None, seed=0):
+  records = []
+  for num_observations, genuine_ratio, tie_density in itertools.product(sizes, genuine_ratios, tie_densities):
+    observations = generate_scores(num_observations, genuine_ratio, tie_density, seed=seed)
+    labels, scores = observations
+    genuine = labels != 0
+
+    # reference values
+    d_prime_reference = 2.0 ** 0.5 * abs(np.mean(scores[genuine]) - np.mean(scores[~genuine])) / \
+                        (np.var(scores[genuine]) + np.var(scores[~genuine])) ** 0.5
+    eer_reference, auc_reference = None, None
+    if num_observations <= reference_limit:
+      eer_reference = _compute_reference_eer(observations)
+      auc_reference = _compute_reference_auc(observations)
+
+    benchmarks = [('compute_d_prime', compute_d_prime, (observations,), lambda d: abs(d - d_prime_reference)),
+                  ('compute_sim_fmr_fnmr_eer', compute_sim_fmr_fnmr_eer, (observations,),
+                   None if eer_reference is None else lambda eer: np.max(np.abs(np.subtract(eer, eer_reference)))),
+                  ('compute_sim_fmr_tmr_auc', compute_sim_fmr_tmr_auc, (observations,),
+                   None if auc_reference is None else lambda auc: abs(auc[0] - auc_reference)),
+                  ('compute_auc', compute_auc, (observations,),
+                   None if auc_reference is None else lambda auc: abs(auc - auc_reference))]
+
+    # CSV loading, from a temporary file
+    csv_path = None
+    if num_observations <= load_limit:
+      csv_path = os.path.join(tempfile.mkdtemp(), 'benchmark.csv')
+      np.savetxt(csv_path, np.column_stack((labels, scores)), fmt=['%d', '%.17g'], delimiter=',')
+      benchmarks.append(('load_data', load_data, (csv_path,),
+                         lambda output: float(np.max(np.abs(np.array([obs[1] for obs in output]) - scores)))))
+      benchmarks.append(('load_scores', load_scores, (csv_path,),
+                         lambda output: float(np.max(np.abs(output[1] - scores)))))
+
+    for name, function, args, compute_error in benchmarks:
+      output, seconds, peak_bytes = _measure(function, args, repeats)
+      error = None if compute_error is None else float(compute_error(output))
+      records.append({'function': name, 'num_observations': num_observations,
+                      'genuine_ratio': genuine_ratio, 'tie_density': tie_density,
+                      'seconds': seconds, 'peak_bytes': peak_bytes,
+                      'error': error, 'ok': error is None or error <= tolerance})
+
+    if csv_path is not None:
+      os.remove(csv_path)
+
+  report = {'numpy_version': np.__version__, 'records': records}
+  if report_path is not None:
+    with open(report_path, 'w') as f:
+      json.dump(report, f, indent=2)
+
+  return report
+
+# tests synthetic scores
+labels, scores = generate_scores(10000, genuine_ratio=0.1, seed=1)
+assert abs(np.mean(labels) - 0.1) < 0.02
+assert abs(compute_d_prime((labels, scores)) - 2.0) < 0.2
+labels, scores = generate_scores(10000, tie_density=0.9, seed=1)
+assert len(np.unique(scores)) < 2000
+
+# tests pairwise AUC
+assert _compute_reference_auc([(0, 0.1), (1, 0.2), (0, 0.2), (1, 0.3)], block_size=1) == 0.875
+
+# tests benchmark report
+report_path = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+report = run_metrics_benchmark(sizes=(10 ** 3, 10 ** 4), repeats=1, report_path=report_path)
+with open(report_path) as f:
+  assert json.load(f) == report
+assert all(record['ok'] for record in report['records'])
+for record in report['records']:
+  print(record['function'], record['num_observations'], record['genuine_ratio'], record['tie_density'],
+        '{:.4f}s'.format(record['seconds']), record['peak_bytes'], 'bytes')
+
+"""---
+## Per-subject metrics
+
+Comparisons are grouped by the subjects involved (a sort of the subject identities, followed
+by <code>np.bincount</code> reductions), telling which subjects are hard to match (goats),
+easy to imitate (lambs), or good at imitating others (wolves), following Doddington's zoo.
+"""
+
+# Computes the count, mean, and variance of the given <values> within each
+# one of the <num_groups> groups, according to the given <groups> array
+# (group index of every value).
+# Output: array of counts, array of means, array of variances; means and
+# variances are 'NaN' for empty groups.
+def _compute_group_stats(groups, values, num_groups):
+  counts = np.bincount(groups, minlength=num_groups)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    means = np.bincount(groups, weights=values, minlength=num_groups) / counts
+    # deviations from the group means keep the variances accurate
+    deviations = (values - means[groups]) ** 2.0
+    variances = np.bincount(groups, weights=deviations, minlength=num_groups) / counts
+  return counts, means, variances
+
+# Computes the metrics of every subject from the given observations, whose
+# comparisons are between the probes and references of the given
+# <probe_ids> and <reference_ids> subject arrays.
+# Observations must be an array of (<label>,<score>) elements,
+# or a (<labels>, <scores>) pair of numpy arrays.
+# Labels must be either 0 (impostor) or something else (genuine).
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Genuine comparisons are credited to the probe subject, and impostor
+# comparisons both to the probe subject (as an attacker) and to the
+# reference subject (as a target). FNMR and FMR are computed at the given
+# global <threshold>. The worst <zoo_fraction> of the subjects are
+# goats (lowest genuine scores), lambs (highest impostor scores as
+# reference), and wolves (highest impostor scores as probe); a subject may
+# be in more than one category, and subjects in none are sheep.
+# Output: structured numpy array (table) with one row per subject and the
+# fields 'subject', 'genuine_count', 'genuine_mean', 'genuine_var',
+# 'fnmr', 'probe_impostor_count', 'probe_impostor_mean',
+# 'probe_impostor_var', 'probe_fmr', 'reference_impostor_count',
+# 'reference_impostor_mean', 'reference_impostor_var', 'reference_fmr',
+# 'goat', 'lamb', and 'wolf'; 'NaN' values for subjects without the
+# respective comparisons.
+def compute_subject_metrics(observations, probe_ids, reference_ids, threshold, is_similarity=True,
+                            zoo_fraction=0.025):
+  genuine, scores = _to_arrays(observations)
+  probe_ids = np.asarray(probe_ids)
+  reference_ids = np.asarray(reference_ids)
+  if probe_ids.shape != scores.shape or reference_ids.shape != scores.shape:
+    raise ValueError('There must be one probe and one reference subject per observation.')
+
+  # subject index of every probe and reference, sorting the identities only once
+  subjects, indices = np.unique(np.concatenate((probe_ids, reference_ids)), return_inverse=True)
+  probes, references = indices[:len(scores)], indices[len(scores):]
+  num_subjects = len(subjects)
+  matches = scores >= threshold if is_similarity else scores <= threshold
+
+  table = np.zeros(num_subjects, dtype=[('subject', subjects.dtype),
+                                        ('genuine_count', np.int64), ('genuine_mean', np.float64),
+                                        ('genuine_var', np.float64), ('fnmr', np.float64),
+                                        ('probe_impostor_count', np.int64), ('probe_impostor_mean', np.float64),
+                                        ('probe_impostor_var', np.float64), ('probe_fmr', np.float64),
+                                        ('reference_impostor_count', np.int64),
+                                        ('reference_impostor_mean', np.float64),
+                                        ('reference_impostor_var', np.float64), ('reference_fmr', np.float64),
+                                        ('goat', bool), ('lamb', bool), ('wolf', bool)])
+  table['subject'] = subjects
+
+  # genuine scores, per probe subject
+  groups = probes[genuine]
+  counts, table['genuine_mean'], table['genuine_var'] = _compute_group_stats(groups, scores[genuine], num_subjects)
+  table['genuine_count'] = counts
+  with np.errstate(divide='ignore', invalid='ignore'):
+    table['fnmr'] = np.bincount(groups, weights=~matches[genuine], minlength=num_subjects) / counts
+
+  # impostor scores, per probe and per reference subject
+  for prefix, subject_indices in (('probe_', probes), ('reference_', references)):
+    groups = subject_indices[~genuine]
+    counts, table[prefix + 'impostor_mean'], table[prefix + 'impostor_var'] = \
+      _compute_group_stats(groups, scores[~genuine], num_subjects)
+    table[prefix + 'impostor_count'] = counts
+    with np.errstate(divide='ignore', invalid='ignore'):
+      table[prefix + 'fmr'] = np.bincount(groups, weights=matches[~genuine], minlength=num_subjects) / counts
+
+  # zoo: the worst fraction of the subjects with the respective scores;
+  # distances are negated, so that smaller genuine values are always worse
+  sign = 1.0 if is_similarity else -1.0
+  for category, field, worst_is_low in (('goat', 'genuine_mean', True),
+                                        ('lamb', 'reference_impostor_mean', False),
+                                        ('wolf', 'probe_impostor_mean', False)):
+    values = sign * table[field] if worst_is_low else -sign * table[field]
+    valid = ~np.isnan(values)
+    if np.any(valid):
+      table[category] = valid & (values <= np.quantile(values[valid], zoo_fraction))
+
+  return table
+
+# tests per-subject metrics
+labels = np.array([1, 1, 1, 1, 0, 0, 0, 0])
+scores = np.array([0.9, 0.8, 0.2, 0.4, 0.1, 0.7, 0.2, 0.1])
+probe_ids = np.array(['a', 'a', 'b', 'b', 'a', 'b', 'c', 'c'])
+reference_ids = np.array(['a', 'a', 'b', 'b', 'b', 'a', 'a', 'b'])
+table = compute_subject_metrics((labels, scores), probe_ids, reference_ids, 0.5, zoo_fraction=0.3)
+assert table['subject'].tolist() == ['a', 'b', 'c']
+assert table['genuine_count'].tolist() == [2, 2, 0]
+assert np.allclose(table['genuine_mean'][:2], [0.85, 0.3]) and np.isnan(table['genuine_mean'][2])
+assert np.allclose(table['genuine_var'][:2], [0.0025, 0.01])
+assert np.allclose(table['fnmr'][:2], [0.0, 1.0])
+assert table['probe_impostor_count'].tolist() == [1, 1, 2]
+assert np.allclose(table['probe_fmr'], [0.0, 1.0, 0.0])
+assert table['reference_impostor_count'].tolist() == [2, 2, 0]
+assert np.allclose(table['reference_fmr'][:2], [0.5, 0.0])
+assert table['goat'].tolist() == [False, True, False]  # 'b' genuine scores are the lowest
+assert table['lamb'].tolist() == [True, False, False]  # 'a' is the easiest to imitate
+assert table['wolf'].tolist() == [False, True, False]  # 'b' imitates the best
+
+# distances give the same zoo
+distance_table = compute_subject_metrics((labels, 1.0 - scores), probe_ids, reference_ids, 0.5,
+                                         is_similarity=False, zoo_fraction=0.3)
+for category in ('goat', 'lamb', 'wolf', 'fnmr', 'probe_fmr'):
+  assert distance_table[category][:2].tolist() == table[category][:2].tolist()
+
+# same values as grouping the scores one by one
+random_labels, random_scores = generate_scores(5000, genuine_ratio=0.2, seed=3)
+random_probe_ids = np.random.default_rng(3).integers(0, 50, 5000)
+random_reference_ids = np.where(random_labels != 0, random_probe_ids, (random_probe_ids + 1) % 50)
+table = compute_subject_metrics((random_labels, random_scores), random_probe_ids, random_reference_ids, 1.0)
+for row in table[:5]:
+  subject_scores = random_scores[(random_probe_ids == row['subject']) & (random_labels != 0)]
+  assert abs(row['genuine_mean'] - np.mean(subject_scores)) < 1e-12
+  assert abs(row['genuine_var'] - np.var(subject_scores)) < 1e-12
+  assert abs(row['fnmr'] - np.mean(subject_scores < 1.0)) < 1e-12
+print('goats:', table['subject'][table['goat']], 'lambs:', table['subject'][table['lamb']],
+      'wolves:', table['subject'][table['wolf']])
+
+"""---
+## Score normalization
+
+Raw scores of different matchers lie on different scales. Cohort normalization rescales each
+score with the mean and standard deviation of the scores of a template against a cohort of
+impostors: the reference template (Z-norm), the probe template (T-norm), or both (S-norm).
+Cohort statistics are computed once per template and kept in a sorted cache, so normalizing a
+batch of comparisons is only a vectorized lookup.
+"""
+
+# Computes the cohort mean and standard deviation of every template, from
+# the given <cohort_scores> matrix (<num_templates> x <cohort_size>: the
+# scores of each template against the cohort), in blocks of <block_size>
+# templates (memory grows with block_size x cohort_size).
+# Output: array of means and array of standard deviations, one per template.
+def compute_cohort_stats(cohort_scores, block_size=1024):
+  num_templates = cohort_scores.shape[0]
+  means = np.empty(num_templates)
+  stds = np.empty(num_templates)
+  for b in range(0, num_templates, block_size):
+    block = np.asarray(cohort_scores[b:b + block_size], dtype=np.float64)
+    means[b:b + block_size] = np.mean(block, axis=1)
+    stds[b:b + block_size] = np.std(block, axis=1)
+
+  return means, stds
+
+# Updates the given cohort statistics cache <cache> with the templates of
+# the given <template_ids>, whose scores against the cohort are the rows of
+# the given <cohort_scores> matrix (see <code>compute_cohort_stats</code>).
+# Templates already in the cache are replaced.
+# Output: the updated cache, a (<template_ids>, <means>, <stds>) triple of
+# arrays sorted by template.
+def update_cohort_cache(template_ids, cohort_scores, cache=None, block_size=1024):
+  template_ids = np.asarray(template_ids)
+  if len(template_ids) != np.shape(cohort_scores)[0]:
+    raise ValueError('There must be one row of cohort scores per template.')
+  means, stds = compute_cohort_stats(cohort_scores, block_size)
+
+  # cached templates that were not given again
+  if cache is not None:
+    kept = ~np.isin(cache[0], template_ids)
+    template_ids = np.concatenate((cache[0][kept], template_ids))
+    means = np.concatenate((cache[1][kept], means))
+    stds = np.concatenate((cache[2][kept], stds))
+
+  order = np.argsort(template_ids, kind='stable')
+  return template_ids[order], means[order], stds[order]
+
+# Finds which ones of the given <template_ids> are missing from the given
+# cohort statistics <cache> (None for an empty cache), so that only their
+# cohort scores need to be computed.
+# Output: array with the missing template identities, without repetitions.
+def find_uncached_templates(template_ids, cache=None):
+  template_ids = np.unique(template_ids)
+  if cache is None:
+    return template_ids
+  return template_ids[~np.isin(template_ids, cache[0])]
+
+# Looks up the cohort mean and standard deviation of each one of the given
+# <template_ids> within the given cohort statistics <cache>.
+# Raises KeyError if any template is not in the cache.
+def _lookup_cohort_stats(cache, template_ids):
+  cached_ids, means, stds = cache
+  template_ids = np.asarray(template_ids)
+  i = np.minimum(np.searchsorted(cached_ids, template_ids), max(len(cached_ids) - 1, 0))
+  if len(cached_ids) == 0 or not np.all(cached_ids[i] == template_ids):
+    raise KeyError('Templates missing from the cohort cache: ' +
+                   str(find_uncached_templates(template_ids, cache)))
+  return means[i], stds[i]
+
+# Normalizes the given <scores> of comparisons between the probe and
+# reference templates of the given <probe_ids> and <reference_ids>, with
+# the cohort statistics of the given <cache>.
+# <method> is 'z' (Z-norm, reference cohort statistics), 't' (T-norm, probe
+# cohort statistics), or 's' (S-norm, the average of both).
+# Templates with zero cohort deviation give 'inf' or 'NaN' scores.
+# Normalization keeps the score polarity (similarity or distance), so the
+# output can be given to the metrics together with the labels, e.g.,
+# <code>compute_fmr_fnmr_eer((labels, normalized_scores))</code>.
+# Output: array of normalized scores.
+def normalize_scores(scores, probe_ids, reference_ids, cache, method='s'):
+  scores = np.asarray(scores, dtype=np.float64)
+  if method not in ('z', 't', 's'):
+    raise ValueError("Normalization method must be 'z', 't', or 's'.")
+
+  with np.errstate(divide='ignore', invalid='ignore'):
+    if method in ('z', 's'):
+      means, stds = _lookup_cohort_stats(cache, reference_ids)
+      z_scores = (scores - means) / stds
+    if method in ('t', 's'):
+      means, stds = _lookup_cohort_stats(cache, probe_ids)
+      t_scores = (scores - means) / stds
+
+  if method == 'z':
+    return z_scores
+  if method == 't':
+    return t_scores
+  return (z_scores + t_scores) / 2.0
+
+# tests cohort statistics
+cohort_scores = np.array([[0.1, 0.2, 0.3], [0.5, 0.5, 0.5], [0.0, 1.0, 2.0]])
+means, stds = compute_cohort_stats(cohort_scores, block_size=2)
+assert np.allclose(means, [0.2, 0.5, 1.0])
+assert np.allclose(stds, np.std(cohort_scores, axis=1))
+
+# tests cohort cache: statistics are computed only for new templates
+cache = update_cohort_cache(['c', 'a'], cohort_scores[[2, 0]])
+assert find_uncached_templates(['a', 'b', 'b', 'c'], cache).tolist() == ['b']
+cache = update_cohort_cache(['b'], cohort_scores[[1]], cache)
+assert cache[0].tolist() == ['a', 'b', 'c']
+assert np.allclose(cache[1], means)
+
+try:
+  normalize_scores([0.5], ['a'], ['x'], cache)
+except KeyError:
+  print("Normalization won't work on templates missing from the cache.")
+
+# tests normalization
+z_scores = normalize_scores([0.3, 2.0], ['c', 'a'], ['a', 'c'], cache, 'z')
+assert np.allclose(z_scores, [(0.3 - 0.2) / stds[0], (2.0 - 1.0) / stds[2]])
+t_scores = normalize_scores([0.3, 2.0], ['c', 'a'], ['a', 'c'], cache, 't')
+assert np.allclose(t_scores, [(0.3 - 1.0) / stds[2], (2.0 - 0.2) / stds[0]])
+assert np.allclose(normalize_scores([0.3, 2.0], ['c', 'a'], ['a', 'c'], cache), (z_scores + t_scores) / 2.0)
+
+# normalized scores feed the metrics directly
+rng = np.random.default_rng(5)
+template_offsets = rng.normal(0.0, 2.0, 100)  # unstable scale of each template
+cache = update_cohort_cache(np.arange(100), rng.normal(template_offsets[:, None], 1.0, (100, 500)))
+labels, scores = generate_scores(20000, seed=5)
+probe_ids = rng.integers(0, 100, 20000)
+reference_ids = rng.integers(0, 100, 20000)
+raw_scores = scores + template_offsets[probe_ids] + template_offsets[reference_ids]
+normalized_scores = normalize_scores(raw_scores, probe_ids, reference_ids, cache)
+assert compute_auc((labels, normalized_scores)) > compute_auc((labels, raw_scores))
+print('EER raw:', compute_sim_fmr_fnmr_eer((labels, raw_scores)),
+      'EER S-norm:', compute_sim_fmr_fnmr_eer((labels, normalized_scores)))
+
+"""---
+## Impostor pair sampling
+
+Impostor pairs grow quadratically with the number of samples, so only a fraction of them is
+compared. Pairs are drawn per subject (stratum), without replacement, and each one carries an
+importance weight: the number of impostor pairs of its stratum that it stands for. Weighted
+observations keep FMR and EER estimates unbiased (see <code>_to_weighted_arrays</code>).
+"""
+
+# Draws <k> distinct integers from [0, <population>) with the given random
+# generator <rng>, in O(k) time and memory, regardless of the population size.
+def _sample_without_replacement(rng, population, k):
+  if 2 * k >= population:
+    return rng.permutation(population)[:k]
+
+  # distinct values of independent draws are a uniform random subset of the
+  # population, so a uniform random subset of them is too
+  draws = np.unique(rng.integers(0, population, k + k // 4 + 16))
+  while len(draws) < k:
+    draws = np.unique(np.concatenate((draws, rng.integers(0, population, k - len(draws) + 16))))
+  return rng.choice(draws, k, replace=False)
+
+# Groups the samples of the given <subject_ids> by subject.
+# Output: positions of the samples sorted by subject, and start of each
+# subject within them (one more, for the end of the last subject).
+def _group_by_subject(subject_ids):
+  _, indices = np.unique(subject_ids, return_inverse=True)
+  order = np.argsort(indices, kind='stable')
+  starts = np.concatenate(([0], np.cumsum(np.bincount(indices))))
+  return order, starts
+
+# Lists all genuine pairs of samples of the given <subject_ids> (the
+# subject of every sample).
+# Output: array with the first sample and array with the second sample of
+# every pair (positions within <subject_ids>).
+def enumerate_genuine_pairs(subject_ids):
+  order, starts = _group_by_subject(np.asarray(subject_ids))
+  firsts = [np.empty(0, dtype=np.int64)]
+  seconds = [np.empty(0, dtype=np.int64)]
+  for start, end in zip(starts[:-1], starts[1:]):
+    a, b = np.triu_indices(end - start, 1)
+    firsts.append(order[start + a])
+    seconds.append(order[start + b])
+
+  return np.concatenate(firsts), np.concatenate(seconds)
+
+# Draws about <num_pairs> impostor pairs of samples of the given
+# <subject_ids> (the subject of every sample), without replacement, at O(1)
+# cost per pair, with random draws from the given <seed>.
+# Every impostor pair belongs to the stratum of its first subject (in
+# sorted order); each stratum gives the same fraction of its pairs, and at
+# least one pair.
+# Output: array with the first sample and array with the second sample of
+# every pair (positions within <subject_ids>), and array with the
+# importance weight of every pair (number of pairs of its stratum divided
+# by the number of pairs drawn from it), so that weights add up to the
+# number of impostor pairs.
+def sample_impostor_pairs(subject_ids, num_pairs, seed=None):
+  rng = np.random.default_rng(seed)
+  order, starts = _group_by_subject(np.asarray(subject_ids))
+
+  # stratum of each subject: its samples versus the samples of later subjects
+  sizes = np.diff(starts)
+  later_sizes = starts[-1] - starts[1:]
+  populations = sizes * later_sizes
+  total = int(np.sum(populations))
+
+  fraction = min(1.0, num_pairs / total) if total > 0 else 0.0
+  allocations = np.minimum(populations, np.maximum(np.round(populations * fraction).astype(np.int64),
+                                                   populations > 0))
+
+  firsts = [np.empty(0, dtype=np.int64)]
+  seconds = [np.empty(0, dtype=np.int64)]
+  weights = [np.empty(0)]
+  for s in np.flatnonzero(allocations > 0):
+    # pair codes: first sample x later sample
+    codes = _sample_without_replacement(rng, int(populations[s]), int(allocations[s]))
+    firsts.append(order[starts[s] + codes // later_sizes[s]])
+    seconds.append(order[starts[s + 1] + codes % later_sizes[s]])
+    weights.append(np.full(len(codes), populations[s] / allocations[s]))
+
+  return np.concatenate(firsts), np.concatenate(seconds), np.concatenate(weights)
+
+# tests genuine pairs
+firsts, seconds = enumerate_genuine_pairs(['a', 'b', 'a', 'a', 'c'])
+assert sorted(zip(firsts.tolist(), seconds.tolist())) == [(0, 2), (0, 3), (2, 3)]
+
+# tests impostor pair sampling
+subject_ids = np.repeat(np.arange(200), 5)
+firsts, seconds, weights = sample_impostor_pairs(subject_ids, 10000, seed=0)
+assert abs(len(firsts) - 10000) < 200
+assert np.all(subject_ids[firsts] != subject_ids[seconds])  # impostors only
+assert len(set(zip(np.minimum(firsts, seconds).tolist(), np.maximum(firsts, seconds).tolist()))) == len(firsts)
+assert abs(np.sum(weights) - (1000 * 999 // 2 - 200 * 10)) < 1e-6  # all impostor pairs
+
+firsts, seconds, weights = sample_impostor_pairs(subject_ids[:10], 10 ** 6)
+assert len(firsts) == 25 and np.all(weights == 1.0)  # fewer pairs than asked, all of them
+
+# weighted FMR and EER of sampled pairs estimate the exhaustive ones
+rng = np.random.default_rng(1)
+features = rng.normal(size=(1000, 8)) + rng.normal(size=(200, 8))[subject_ids] * 1.5
+def pair_scores(features, firsts, seconds):
+  return -np.linalg.norm(features[firsts] - features[seconds], axis=1)
+
+genuine_firsts, genuine_seconds = enumerate_genuine_pairs(subject_ids)
+all_firsts, all_seconds = np.triu_indices(1000, 1)
+impostor = subject_ids[all_firsts] != subject_ids[all_seconds]
+exhaustive = (np.concatenate((np.ones(len(genuine_firsts)), np.zeros(np.count_nonzero(impostor)))),
+              np.concatenate((pair_scores(features, genuine_firsts, genuine_seconds),
+                              pair_scores(features, all_firsts[impostor], all_seconds[impostor]))))
+
+impostor_firsts, impostor_seconds, impostor_weights = sample_impostor_pairs(subject_ids, 10000, seed=2)
+sampled = (np.concatenate((np.ones(len(genuine_firsts)), np.zeros(len(impostor_firsts)))),
+           np.concatenate((pair_scores(features, genuine_firsts, genuine_seconds),
+                           pair_scores(features, impostor_firsts, impostor_seconds))),
+           np.concatenate((np.ones(len(genuine_firsts)), impostor_weights)))
+threshold = compute_sim_fmr_fnmr_eer(exhaustive)[2]
+assert abs(compute_sim_fmr(sampled, threshold) - compute_sim_fmr(exhaustive, threshold)) < 0.01
+assert abs(compute_sim_fmr_fnmr_eer(sampled)[1] - compute_sim_fmr_fnmr_eer(exhaustive)[1]) < 0.01
+assert abs(compute_d_prime(sampled) - compute_d_prime(exhaustive)) < 0.05 * compute_d_prime(exhaustive)
+assert abs(compute_auc(sampled) - compute_auc(exhaustive)) < 0.01
+assert abs(compute_auc(sampled) - compute_sim_fmr_tmr_auc(sampled)[0]) < 1e-9  # weighted ranks, as the curve
+print('exhaustive EER:', compute_sim_fmr_fnmr_eer(exhaustive), 'sampled EER:', compute_sim_fmr_fnmr_eer(sampled))
+
+"""---
+## Plot Functions
+
+
+The plots below render either on screen (through pyplot, imported only when needed) or
+headless into image files (through a bare matplotlib figure). Histograms are drawn from
+per-bin counts, and ROC curves from an already-computed FMR and FNMR curve, decimated to
+a polyline with bounded error.
+"""
+
+# Creates the figure and axes of a plot, to be saved into the given
+# <file_path> (headless, without pyplot) or shown on screen (if None).
+# Output: figure, axes.
+def _create_plot(file_path=None):
+    if file_path is not None:
+        from matplotlib.figure import Figure
+        figure = Figure()
+    else:
+        import matplotlib.pyplot as plt
+        figure = plt.figure()
+
+    return figure, figure.add_subplot()
+
+# Finishes the given <figure>, saving it into the given <file_path> or
+# showing it on screen (if None).
+def _finish_plot(figure, file_path=None):
+    if file_path is not None:
+        figure.savefig(file_path)
+    else:
+        import matplotlib.pyplot as plt
+        plt.show()
+
+# Plots the histograms of impostor and genuine scores from the given per-bin
+# score counts <impostor_hist> and <genuine_hist>, with bins of the same
+# width covering the given <score_range> (<min_score>, <max_score>).
+# <d_prime> is shown on the title, if it is a number.
+# Provide <file_path> to save the plot into an image file instead of
+# showing it.
+def plot_hist_counts(impostor_hist, genuine_hist, score_range, d_prime=float('NaN'), file_path=None):
+    figure, axes = _create_plot(file_path)
+    axes.set_xlabel('score')
+    axes.set_ylabel('frequency')
+
+    # one bar per bin, with the bin count as weight
+    edges = np.linspace(score_range[0], score_range[1], len(impostor_hist) + 1)
+    axes.hist(edges[:-1], bins=edges, weights=impostor_hist, facecolor='red', alpha=0.5, label='impostor')
+    axes.hist(edges[:-1], bins=edges, weights=genuine_hist, facecolor='blue', alpha=0.5, label='genuine')
+    axes.legend(loc='lower right')
 
-    d_prime = compute_d_prime(observations)
     if float('-inf') < d_prime < float('inf'):
-        plt.title("Score distribution, d'=" + '{:.2f}'.format(d_prime))
+        axes.set_title("Score distribution, d'=" + '{:.2f}'.format(d_prime))
     else:
-        plt.title('Score distribution')
+        axes.set_title('Score distribution')
 
-    plt.show()
+    _finish_plot(figure, file_path)
+
+# Plots the histograms of the scores of the impostors and of the genuine observations together,
+# with <num_bins> bins over the range of all the scores.
+# Observations must be an array of (<label>,<score>) elements,
+# or a (<labels>, <scores>) pair of numpy arrays.
+# Labels must be either 0 (impostor) or something else (genuine).
+# Provide <file_path> to save the plot into an image file instead of
+# showing it.
+def plot_hist(observations, num_bins=10, file_path=None):
+    genuine, scores = _to_arrays(observations)
+    score_range = (0.0, 1.0)
+    if len(scores) > 0:
+        score_range = (float(np.min(scores)), float(np.max(scores)))
+
+    bins = _compute_bins(scores, score_range, num_bins)
+    impostor_hist = np.bincount(bins[~genuine], minlength=num_bins)
+    genuine_hist = np.bincount(bins[genuine], minlength=num_bins)
+
+    plot_hist_counts(impostor_hist, genuine_hist, score_range, compute_d_prime((genuine, scores)), file_path)
 
 # histogram plot test 1
-import matplotlib.pyplot as plt
 plot_hist([])
 
 # histogram plot test 2
-import matplotlib.pyplot as plt
 plot_hist([(0, 0.2), (0, 0.3), (0, 0.4), (1, 0.5), (1, 0.6), (1, 0.7)])
 
 """---
@@ -532,34 +2940,107 @@ Plot the histogram for the content of <code>/content/test.csv</code>.
 """
 
 # add your code here
-plot_sim_fmr_tmr_auc(output)
+plot_hist(output)
 
 """---"""
 
-# Plots the FMR x TMR AUC from the given similarity observations.
-# Observations must be an array of (<label>,<score>) elements.
+# Decimates the polyline given by the <xs> and <ys> arrays (values within
+# [0.0, 1.0]), both never increasing (or both never decreasing), so that
+# every dropped point lies within <tolerance> (in each coordinate) of the
+# segment replacing it.
+# Points are grouped into square cells of <tolerance> side; as the polyline
+# is monotone, each cell is crossed only once and only its first and last
+# points are needed. The points at the given <keep> positions are kept too.
+# Output: sorted array with the positions of the kept points.
+def decimate_polyline(xs, ys, tolerance=1e-3, keep=()):
+    if len(xs) <= 2:
+        return np.arange(len(xs))
+
+    cells = np.floor(np.asarray(xs) / tolerance) * (np.floor(1.0 / tolerance) + 2) + \
+            np.floor(np.asarray(ys) / tolerance)
+    changes = cells[1:] != cells[:-1]
+    firsts = np.flatnonzero(np.concatenate(([True], changes)))
+    lasts = np.flatnonzero(np.concatenate((changes, [True])))
+
+    return np.unique(np.concatenate((firsts, lasts, np.asarray(keep, dtype=np.int64))))
+
+# Plots the FMR x TMR ROC curve from the given <curve> (a (<thresholds>,
+# <fmrs>, <fnmrs>) triple, as given by <code>compute_fmr_fnmr_curve</code>),
+# decimated with the given <tolerance> (see <code>decimate_polyline</code>).
+# The EER and the operating points at the given <target_fmrs> are always
+# kept and marked.
+# Provide <file_path> to save the plot into an image file instead of
+# showing it.
+def plot_fmr_tmr_curve(curve, tolerance=1e-3, target_fmrs=(0.001, 0.01, 0.1), file_path=None):
+    figure, axes = _create_plot(file_path)
+    axes.set_xlabel('FMR')
+    axes.set_ylabel('TMR')
+
+    thresholds, fmrs, fnmrs = curve
+    if len(thresholds) > 0:
+        auc = _compute_auc(fmrs, 1.0 - fnmrs)
+
+        # curve closed on [0.0, 0.0], as in compute_fmr_tmr_auc
+        fmrs = np.append(fmrs, 0.0)
+        tmrs = np.append(1.0 - fnmrs, 0.0)
+
+        # key points: EER and the operating points at the target FMRs
+        eer_index = _find_eer_index(fmrs[:-1], fnmrs)
+        target_indices = np.searchsorted(-fmrs, -np.asarray(target_fmrs, dtype=np.float64), side='left')
+        keep = np.concatenate(([eer_index], target_indices))
+
+        kept = decimate_polyline(fmrs, tmrs, tolerance, keep)
+        axes.plot(fmrs[kept], tmrs[kept], label='AUC: ' + '{:.2f}'.format(auc))
+        axes.plot([0, 1], [0, 1], color='gray', linestyle='--')
+        axes.plot(fmrs[eer_index], tmrs[eer_index], 'o', color='black', label='EER')
+        axes.plot(fmrs[target_indices], tmrs[target_indices], 'x', color='black', label='target FMRs')
+        axes.legend(loc='lower right')
+
+    axes.set_title('ROC curve')
+    _finish_plot(figure, file_path)
+
+# Plots the FMR x TMR AUC from the given observations.
+# Observations must be an array of (<label>,<score>) elements,
+# or a (<labels>, <scores>) pair of numpy arrays.
 # Labels must be either 0 (impostor) or something else (genuine).
-def plot_sim_fmr_tmr_auc(observations):
-    plt.xlabel('FMR')
-    plt.ylabel('TMR')
-
-    auc, fmrs, tmrs = compute_sim_fmr_tmr_auc(observations)
-    if float('-inf') < auc < float('inf'):
-        plt.plot(fmrs, tmrs, label='AUC: ' + '{:.2f}'.format(auc))
-        plt.plot([0, 1], [0, 1], color='gray', linestyle='--')
-        plt.legend(loc='lower right')
-
-    plt.title('ROC curve')
-    plt.show()
+# Provide <is_similarity> as True if scores are similarities or False if
+# they are distances.
+# Provide <file_path> to save the plot into an image file instead of
+# showing it.
+def plot_fmr_tmr_auc(observations, is_similarity=True, file_path=None):
+    plot_fmr_tmr_curve(compute_fmr_fnmr_curve(observations, is_similarity), file_path=file_path)
+
+# Plots the FMR x TMR AUC from the given similarity observations
+# (see <code>plot_fmr_tmr_auc</code>).
+def plot_sim_fmr_tmr_auc(observations, file_path=None):
+    plot_fmr_tmr_auc(observations, is_similarity=True, file_path=file_path)
+
+# tests polyline decimation
+xs = np.linspace(1.0, 0.0, 100001)
+kept = decimate_polyline(xs, xs ** 0.5, tolerance=0.01, keep=[12345])
+assert kept[0] == 0 and kept[-1] == 100000 and 12345 in kept
+assert len(kept) < 1000
+for i in range(len(kept) - 1):  # dropped points stay close to the kept segments
+  a, b = kept[i], kept[i + 1]
+  segment_ys = np.interp(xs[a:b + 1][::-1], [xs[b], xs[a]], [xs[b] ** 0.5, xs[a] ** 0.5])[::-1]
+  assert np.all(np.abs(segment_ys - xs[a:b + 1] ** 0.5) <= 0.01)
 
 # AUC plot test 1
-import matplotlib.pyplot as plt
 plot_sim_fmr_tmr_auc([])
 
 # AUC plot test 2
-import matplotlib.pyplot as plt
 plot_sim_fmr_tmr_auc([(0, 0.2), (0, 0.3), (0, 0.4), (1, 0.5), (1, 0.6), (1, 0.7)])
 
+# AUC plot test 3
+plot_fmr_tmr_auc([(0, 0.8), (0, 0.7), (0, 0.6), (1, 0.5), (1, 0.4), (1, 0.3)], is_similarity=False)
+
+# headless plots of a million scores, into image files
+labels, scores = generate_scores(1000000, seed=0)
+plot_dir = tempfile.mkdtemp()
+plot_hist((labels, scores), num_bins=100, file_path=os.path.join(plot_dir, 'hist.svg'))
+plot_fmr_tmr_curve(compute_sim_fmr_fnmr_curve((labels, scores)), file_path=os.path.join(plot_dir, 'roc.svg'))
+assert os.path.getsize(os.path.join(plot_dir, 'roc.svg')) < 1000000
+
 """---
 ### Exercise 6
 Plot the AUC for the content of <code>/content/test.csv</code>.
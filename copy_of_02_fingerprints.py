@@ -160,8 +160,13 @@ print('Enhanced fingerprint info; Size:', enhanced_fp_2.shape, 'Type:', enhanced
 ### Auxiliary functions
 * <code>_draw_minutiae</code>: to draw the detected minutiae.
 * <code>_sample_angle_patches</code>: to generate and sample patches with angles to detect over the minutiae.
+* <code>_stack_angle_patches</code>: to stack the angle patches into a single array.
+* <code>_get_angle_patches</code>: to get the stacked angle patches, sampled only once.
+* <code>_compute_minutiae_angles</code>: to compute the angles of a batch of minutiae.
 * <code>_compute_minutiae_angle</code>: to compute the angle of a given minutiae.
 * <code>_detect_minutiae</code>: to detect minutiae over a given fringerprint.
+* <code>_find_close_minutiae</code>: to find the pairs of minutiae that are close to each other.
+* <code>_compute_ridge_extents</code>: to compute the first and last ridge pixels of every row and column.
 * <code>_remove_minutiae</code>: to remove the spurious minutiae.
 """
 
@@ -249,6 +254,101 @@ for patch in random.sample(angle_samples, 3):
   plt.pyplot.title('{:.2f}'.format(patch[1]) + ' rad, ' + '{:.2f}'.format(patch[1] * 180 / np.pi) + ' degrees')
   plt.pyplot.show()
 
+# Stacks the given <angle_samples> (a list of (patch, angle) pairs) into a
+# single (K x patch_size x patch_size) array of patches.
+# Returns the stacked patches followed by the array of their K angles.
+def _stack_angle_patches(angle_samples):
+  patches = np.stack([p[0] for p in angle_samples])
+  angles = np.array([p[1] for p in angle_samples])
+  return patches, angles
+
+# Returns the stacked angle patches of the given <patch_size>, sampled only
+# once and cached for all the following calls.
+_angle_patch_cache = {}
+def _get_angle_patches(patch_size = 11):
+  if patch_size not in _angle_patch_cache:
+    _angle_patch_cache[patch_size] = _stack_angle_patches(
+      _sample_angle_patches(patch_size))
+  return _angle_patch_cache[patch_size]
+
+# tests the stacking of the angle patches
+angle_patches, patch_angles = _get_angle_patches()
+assert angle_patches.shape == (len(angle_samples), 11, 11)
+assert _get_angle_patches()[0] is angle_patches
+for k, sample in enumerate(angle_samples):
+  assert np.array_equal(angle_patches[k], sample[0])
+  assert patch_angles[k] == sample[1]
+
+# Computes the angles of a batch of minutiae over a given <fingerprint>.
+# The minutiae are expressed by the arrays of their <xs> and <ys> positions.
+# The stacked angle patches <angle_patches> (K x patch_size x patch_size) and
+# their respective <patch_angles> to try to match for must also be given.
+# Provide <is_ridge_ending> as True if the minutiae are ridge endings or
+# False if they are bifurcations.
+# Returns the array of computed angles and the array of qualities of the
+# minutiae (the larger, the better).
+def _compute_minutiae_angles(fingerprint, xs, ys, angle_patches, patch_angles,
+                             is_ridge_ending):
+  xs = np.asarray(xs, dtype=np.int64)
+  ys = np.asarray(ys, dtype=np.int64)
+
+  # gathers at once the patches from the fingerprint whose centers hold the
+  # minutiae (zero padded, so minutiae close to the border are still covered)
+  offset = angle_patches.shape[1] // 2
+  padded = np.pad(fingerprint, offset)
+  windows = np.lib.stride_tricks.sliding_window_view(
+    padded, angle_patches.shape[1:])
+  patches = windows[ys, xs]
+
+  # fits all the obtained patches with each angle patch sample
+  values_type = np.result_type(fingerprint.dtype, np.int64)
+  fitting = np.tensordot(patches.astype(values_type),
+                         angle_patches.astype(values_type),
+                         axes=([1, 2], [1, 2]))
+  rows = np.arange(len(fitting))
+
+  # rindge ending? the angle is the best fit (the first one, in case of ties)
+  if is_ridge_ending:
+    best = np.argmax(fitting, axis=1)
+    return patch_angles[best], fitting[rows, best]
+
+  # else, we have bifurcations
+  # let's focus on the three best angle fitting
+  # (ties are broken by the order of the angle samples, as a stable sort would)
+  k = fitting.shape[1]
+  third = np.argpartition(fitting, k - 3, axis=1)[:, k - 3]
+  third_fit = fitting[rows, third][:, None]
+  above = fitting > third_fit
+  tied = fitting == third_fit
+  tied = tied & (np.cumsum(tied, axis=1) <= 3 - np.sum(above, axis=1)[:, None])
+  best = np.nonzero(above | tied)[1].reshape(-1, 3)
+  order = np.argsort(-fitting[rows[:, None], best], axis=1, kind='stable')
+  best = best[rows[:, None], order]
+  a0, a1, a2 = (patch_angles[best[:, i]] for i in range(3))
+
+  # angle differences
+  adiff_01 = np.abs(a0 - a1)
+  adiff_01 = np.where(adiff_01 > np.pi, 2.0 * np.pi - adiff_01, adiff_01)
+
+  adiff_02 = np.abs(a0 - a2)
+  adiff_02 = np.where(adiff_02 > np.pi, 2.0 * np.pi - adiff_02, adiff_02)
+
+  adiff_12 = np.abs(a1 - a2)
+  adiff_12 = np.where(adiff_12 > np.pi, 2.0 * np.pi - adiff_12, adiff_12)
+
+  # sum of closest angles
+  angles = np.where((adiff_01 < adiff_02) & (adiff_01 < adiff_12), a0 + a1,
+                    np.where(adiff_02 < adiff_12, a0 + a2, a1 + a2))
+
+  # average of closest angles
+  angles = np.where(angles > np.pi, 2.0 * np.pi - angles, angles)
+  angles = angles / 2.0
+
+  # quality is the sum of the three best
+  qualities = np.sum(fitting[rows[:, None], best], axis=1)
+
+  return angles, qualities
+
 # Computes the angle of a given minutiae over a given <fingerprint>.
 # The minutiae is expressed by its (x, y) position <pos>. The samples
 # of angles <angle_samples> to try to match for must also be given.
@@ -257,63 +357,11 @@ for patch in random.sample(angle_samples, 3):
 # Returns the computed angle and the quality of the minutiae (the larger,
 # the better).
 def _compute_minutiae_angle(fingerprint, pos, angle_samples, is_ridge_ending):
-  # output
-  angle = None
-  quality = None
-
-  # gets the patch from the fingerprint whose center holds the minutiae
-  offset = angle_samples[0][0].shape[0] // 2
-  patch = fingerprint[pos[1] - offset:pos[1] + offset + 1,
-                      pos[0] - offset:pos[0] + offset + 1]
-
-  # fits the obtained patch with each angle patch sample
-  fitting = []
-  for p in angle_samples:
-    fitting.append((np.sum(patch * p[0]), p[1]))
-  fitting.sort(key=lambda x: x[0], reverse=True)
-
-  # rindge ending? the angle is the best fit
-  if is_ridge_ending:
-    angle = fitting[0][1]
-    quality = fitting[0][0]
-
-  # else, we have a bifurcation
-  else:
-    # let's focus on the three best angle fitting
-    # angle differences
-    adiff_01 = abs(fitting[0][1] - fitting[1][1])
-    if adiff_01 > np.pi:
-      adiff_01 = 2.0 * np.pi - adiff_01
-
-    adiff_02 = abs(fitting[0][1] - fitting[2][1])
-    if adiff_02 > np.pi:
-      adiff_02 = 2.0 * np.pi - adiff_02
-
-    adiff_12 = abs(fitting[1][1] - fitting[2][1])
-    if adiff_12 > np.pi:
-      adiff_12 = 2.0 * np.pi - adiff_12
-
-    # adiff_01 is the smallest difference...
-    if adiff_01 < adiff_02 and adiff_01 < adiff_12:
-      angle = fitting[0][1] + fitting[1][1] # sum of closest angles
-
-    # adiff_02 is the smallest difference...
-    elif adiff_02 < adiff_12:
-      angle = fitting[0][1] + fitting[2][1] # sum of closest angles
-
-    # adiff_12 is the smallest difference...
-    else:
-      angle = fitting[1][1] + fitting[2][1] # sum of closest angles
-
-    # average of closest angles
-    if angle > np.pi:
-      angle = 2.0 * np.pi - angle
-    angle = angle / 2.0
-
-    # quality is the sum of the three best
-    quality = fitting[0][0] + fitting[1][0] + fitting[2][0]
-
-  return angle, quality
+  angle_patches, patch_angles = _stack_angle_patches(angle_samples)
+  angles, qualities = _compute_minutiae_angles(fingerprint, [pos[0]], [pos[1]],
+                                               angle_patches, patch_angles,
+                                               is_ridge_ending)
+  return angles[0], qualities[0]
 
 # tests the computation of the angle of the given minutiae
 # all ridge endings...
@@ -348,37 +396,42 @@ def _detect_minutiae(fingerprint, view=False):
     ridge_bifurcs = []
 
     # angle samples
-    angle_samples = _sample_angle_patches()
+    angle_patches, patch_angles = _get_angle_patches()
 
     # fingerprint dimensions
     h, w = fingerprint.shape[:2]
 
-    # for each ridge pixel
-    for x in range(1, w - 1):
-        for y in range(1, h - 1):
-            # if the current pixel belongs to a ridge
-            if fingerprint[y, x]:
-                # current 3x3 block
-                block = fingerprint[y - 1: y + 2, x - 1: x + 2]
-
-                # number of ridge pixels in the neighborhood
-                ridge_count = np.sum(block)
-
-                # if the number of ridge pixels is bellow 3,
-                # we may have a ridge ending
-                if ridge_count < 3:
-                    a, q = _compute_minutiae_angle(fingerprint, (x, y),
-                                                   angle_samples,
-                                                   is_ridge_ending = True)
-                    ridge_endings.append((x, y, a, q))
-
-                # else, if the number of ridge pixels is above 3,
-                # we may have a bifurcation
-                elif ridge_count > 3:
-                    a, q = _compute_minutiae_angle(fingerprint, (x, y),
-                                                   angle_samples,
-                                                   is_ridge_ending=False)
-                    ridge_bifurcs.append((x, y, a, q))
+    # number of ridge pixels in the 3x3 block of every inner pixel,
+    # computed for the whole image at once as a 3x3 box convolution
+    # (sum of the nine shifted views of the fingerprint)
+    values = fingerprint.astype(np.int64)
+    ridge_counts = np.zeros((h - 2, w - 2), dtype=np.int64)
+    for dy in range(3):
+        for dx in range(3):
+            ridge_counts += values[dy:dy + h - 2, dx:dx + w - 2]
+
+    # inner ridge pixels, transposed so that candidates come in the
+    # column-by-column (x, then y) order of a pixel scan
+    is_ridge = fingerprint[1:h - 1, 1:w - 1].T != 0
+    ridge_counts = ridge_counts.T
+
+    # if the number of ridge pixels is bellow 3,
+    # we may have a ridge ending
+    xs, ys = np.nonzero(is_ridge & (ridge_counts < 3))
+    angles, qualities = _compute_minutiae_angles(fingerprint, xs + 1, ys + 1,
+                                                 angle_patches, patch_angles,
+                                                 is_ridge_ending=True)
+    for x, y, a, q in zip(xs.tolist(), ys.tolist(), angles, qualities):
+        ridge_endings.append((x + 1, y + 1, a, q))
+
+    # else, if the number of ridge pixels is above 3,
+    # we may have a bifurcation
+    xs, ys = np.nonzero(is_ridge & (ridge_counts > 3))
+    angles, qualities = _compute_minutiae_angles(fingerprint, xs + 1, ys + 1,
+                                                 angle_patches, patch_angles,
+                                                 is_ridge_ending=False)
+    for x, y, a, q in zip(xs.tolist(), ys.tolist(), angles, qualities):
+        ridge_bifurcs.append((x + 1, y + 1, a, q))
 
     # shows the detected minutiae, if it is the case
     if view:
@@ -390,92 +443,160 @@ def _detect_minutiae(fingerprint, view=False):
     return ridge_endings, ridge_bifurcs
 
 # tests the detection of minutiae
+# toy-case skeleton: a ridge with two endings and a bifurcation
+skeleton = np.zeros((30, 30), dtype=bool)
+skeleton[15, 8:22] = True
+skeleton[8:15, 15] = True
+endings, bifurcs = _detect_minutiae(skeleton)
+assert [(x, y) for x, y, a, q in endings] == [(8, 15), (15, 8), (21, 15)]
+assert (15, 15) in [(x, y) for x, y, a, q in bifurcs]
+
 ridge_endings_1, bifurcations_1 = _detect_minutiae(enhanced_fp_1, view=True)
 ridge_endings_2, bifurcations_2 = _detect_minutiae(enhanced_fp_2, view=True)
 
+# Finds all the pairs of minutiae that are closer than <max_dist> to each
+# other, given the (n x 2) array of their (x, y) <positions>.
+# Minutiae are hashed into a grid of <max_dist>-sized cells, so only the
+# minutiae within the 3x3 neighboring cells of each other are compared.
+# Returns the arrays of the first and second indices of the pairs (first
+# index smaller than the second one), in lexicographic order, followed by the
+# array of their distances.
+def _find_close_minutiae(positions, max_dist):
+  positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+  if len(positions) < 2:
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+  # grid cells of the minutiae (shifted to leave room for neighbor cells)
+  cells = np.floor((positions - positions.min(axis=0)) / max_dist).astype(np.int64) + 1
+  row_length = cells[:, 1].max() + 2
+  keys = cells[:, 0] * row_length + cells[:, 1]
+  order = np.argsort(keys, kind='stable')
+  sorted_keys = keys[order]
+
+  # candidate pairs from the 3x3 neighboring cells of every minutiae
+  firsts = []
+  seconds = []
+  for dx in (-1, 0, 1):
+    for dy in (-1, 0, 1):
+      neighbor_keys = keys + dx * row_length + dy
+      starts = np.searchsorted(sorted_keys, neighbor_keys, side='left')
+      ends = np.searchsorted(sorted_keys, neighbor_keys, side='right')
+      counts = ends - starts
+      firsts.append(np.repeat(np.arange(len(keys)), counts))
+      seconds.append(order[np.repeat(starts - np.cumsum(counts) + counts, counts) +
+                           np.arange(counts.sum())])
+  firsts = np.concatenate(firsts)
+  seconds = np.concatenate(seconds)
+
+  # keeps each pair once, within the given distance
+  deltas = positions[firsts] - positions[seconds]
+  dists = np.sqrt(deltas[:, 0] ** 2 + deltas[:, 1] ** 2)
+  selected = (firsts < seconds) & (dists < max_dist)
+  firsts, seconds, dists = firsts[selected], seconds[selected], dists[selected]
+  order = np.lexsort((seconds, firsts))
+  return firsts[order], seconds[order], dists[order]
+
+# tests the search for close minutiae against all the pairs
+positions = np.random.randint(0, 100, (300, 2))
+firsts, seconds, dists = _find_close_minutiae(positions, 10)
+expected = [(i, j) for i in range(len(positions) - 1)
+            for j in range(i + 1, len(positions))
+            if np.sqrt(np.sum((positions[i] - positions[j]) ** 2)) < 10]
+assert list(zip(firsts.tolist(), seconds.tolist())) == expected
+assert len(_find_close_minutiae(positions[:1], 10)[0]) == 0
+
+# Computes the first and last ridge pixel indices of every row and column of
+# the given <fingerprint> skeleton, in a single pass over the image.
+# Rows (columns) without ridge pixels get the image height (width) as first
+# index and -1 as last index.
+# Returns the first and last ridge x of each row, followed by the first and
+# last ridge y of each column; together, they bound the fingerprint foreground.
+def _compute_ridge_extents(fingerprint):
+  h, w = fingerprint.shape[0:2]
+  is_ridge = fingerprint != 0
+
+  # rows
+  has_ridge = np.any(is_ridge, axis=1)
+  first_in_rows = np.where(has_ridge, np.argmax(is_ridge, axis=1), w)
+  last_in_rows = np.where(has_ridge, w - 1 - np.argmax(is_ridge[:, ::-1], axis=1), -1)
+
+  # columns
+  has_ridge = np.any(is_ridge, axis=0)
+  first_in_cols = np.where(has_ridge, np.argmax(is_ridge, axis=0), h)
+  last_in_cols = np.where(has_ridge, h - 1 - np.argmax(is_ridge[::-1, :], axis=0), -1)
+
+  return first_in_rows, last_in_rows, first_in_cols, last_in_cols
+
+# tests the computation of ridge extents
+skeleton = np.zeros((6, 8), dtype=bool)
+skeleton[1, 2:5] = True
+skeleton[3:5, 6] = True
+first_in_rows, last_in_rows, first_in_cols, last_in_cols = _compute_ridge_extents(skeleton)
+assert first_in_rows.tolist() == [8, 2, 8, 6, 6, 8]
+assert last_in_rows.tolist() == [-1, 4, -1, 6, 6, -1]
+assert first_in_cols.tolist() == [6, 6, 1, 1, 1, 6, 3, 6]
+assert last_in_cols.tolist() == [-1, -1, 1, 1, 1, -1, 4, -1]
+
 # Removes spurious minutiae detected on the given <fingerprint> image.
 # Minutiae are provided through the <ridge_endings> and <ridge_bifurcations>
 # parameters. Each one is a list of (x, y, angle, quality) items.
 # Provide <view> as True if you want to see the results of computations.
+# The <ridge_extents> of the fingerprint (see _compute_ridge_extents) may be
+# given if already computed; otherwise, they are computed here.
 # Returns a cleaned list of <ridge_endings> followed by a cleaned list of
 # <ridge_bifurcations>.
 def _remove_minutiae(fingerprint, ridge_endings, ridge_bifurcs, view=False,
-                             min_minutiae_dist = 10, opp_angle_tol = np.pi / 16):
+                             min_minutiae_dist = 10, opp_angle_tol = np.pi / 16,
+                             ridge_extents = None):
     # registers the minutiae that should be kept
     # (all good in the beginning)
     good_ridge_endings = [True] * len(ridge_endings)
     good_bifurcations = [True] * len(ridge_bifurcs)
 
     # here go the heuristics...
-    # removes colliding minutiae, keeping only the ones with largest quality
-    for i in range(0, len(ridge_endings) - 1):
-        for j in range(i + 1, len(ridge_endings)):
-            if good_ridge_endings[i] and good_ridge_endings[j]:
-                if np.sqrt((ridge_endings[i][0] - ridge_endings[j][0]) ** 2 +
-                 (ridge_endings[i][1] - ridge_endings[j][1]) ** 2) < 3:
-                    if ridge_endings[i][3] > ridge_endings[j][3]:
-                        good_ridge_endings[j] = False
-                    elif ridge_endings[i][3] < ridge_endings[j][3]:
-                        good_ridge_endings[i] = False
-
-    for i in range(0, len(ridge_bifurcs) - 1):
-        for j in range(i + 1, len(ridge_bifurcs)):
-            if good_bifurcations[i] and good_bifurcations[j]:
-                if np.sqrt((ridge_bifurcs[i][0] - ridge_bifurcs[j][0]) ** 2 +
-                 (ridge_bifurcs[i][1] - ridge_bifurcs[j][1]) ** 2) < 3:
-                    if ridge_bifurcs[i][3] > ridge_bifurcs[j][3]:
-                        good_bifurcations[j] = False
-                    elif ridge_bifurcs[i][3] < ridge_bifurcs[j][3]:
-                        good_bifurcations[i] = False
-
-    # removes ridge endings that are too close to the border of the fingerprint
-    for i in range(len(ridge_endings)):
-      if good_ridge_endings[i]:
-        x, y = ridge_endings[i][0:2]
-        h, w = fingerprint.shape[0:2]
-
-        # searchs for ridge collisions up, down, left, and right
-        collision_u = 0
-        collision_d = 0
-        collision_l = 0
-        collision_r = 0
-        no_collision = True
-
-        # if any collision is zero, removes the ridge
-        collision_u = np.sum(fingerprint[0:y, x])
-        if collision_u > 0:
-          collision_d = np.sum(fingerprint[y + 1:h, x])
-
-        if collision_d > 0:
-          collision_l = np.sum(fingerprint[y, 0:x])
-
-        if collision_l > 0:
-          collision_r = np.sum(fingerprint[y, x + 1:w])
-
-        if collision_r > 0:
-          no_collision = False
-
-        if no_collision:
-          good_ridge_endings[i] = False
+    # removes colliding minutiae, keeping only the ones with largest quality;
+    # only the pairs closer than 3 pixels are visited, in the same order
+    # as a visit to all pairs would do
+    for minutiae, good_minutiae in ((ridge_endings, good_ridge_endings),
+                                    (ridge_bifurcs, good_bifurcations)):
+        minutiae = np.array(minutiae, dtype=np.float64).reshape(-1, 4)
+        firsts, seconds, _ = _find_close_minutiae(minutiae[:, 0:2], 3)
+        qualities = minutiae[:, 3].tolist()
+        for i, j in zip(firsts.tolist(), seconds.tolist()):
+            if good_minutiae[i] and good_minutiae[j]:
+                if qualities[i] > qualities[j]:
+                    good_minutiae[j] = False
+                elif qualities[i] < qualities[j]:
+                    good_minutiae[i] = False
+
+    # removes ridge endings that are too close to the border of the fingerprint,
+    # i.e., with no ridge collisions up, down, left, or right
+    if ridge_extents is None:
+        ridge_extents = _compute_ridge_extents(fingerprint)
+    first_in_rows, last_in_rows, first_in_cols, last_in_cols = ridge_extents
+
+    endings = np.array(ridge_endings, dtype=np.float64).reshape(-1, 4)
+    xs = endings[:, 0].astype(np.int64)
+    ys = endings[:, 1].astype(np.int64)
+    collision = ((first_in_cols[xs] < ys) & (last_in_cols[xs] > ys) &
+                 (first_in_rows[ys] < xs) & (last_in_rows[ys] > xs))
+    good_ridge_endings = (np.array(good_ridge_endings, dtype=bool) &
+                          collision).tolist()
 
     # removes ridge endings that are too close to each other and
     # have opposing angles (either small ridge or small gap)
-    to_remove = []
-    for i in range(0, len(ridge_endings) - 1):
-        for j in range(i + 1, len(ridge_endings)):
-            if good_ridge_endings[i] and good_ridge_endings[j]:
-                if np.sqrt((ridge_endings[i][0] - ridge_endings[j][0]) ** 2 +
-                 (ridge_endings[i][1] - ridge_endings[j][1]) ** 2) < min_minutiae_dist:
-                 angle_diff = abs(ridge_endings[i][2] - ridge_endings[j][2])
-                 if angle_diff > np.pi:
-                     angle_diff = 2.0 * np.pi - angle_diff
-
-                 if abs(np.pi - angle_diff) < opp_angle_tol:
-                        to_remove.append(i)
-                        to_remove.append(j)
-
-    for i in to_remove:
-        good_ridge_endings[i] = False
+    good = np.array(good_ridge_endings, dtype=bool)
+    firsts, seconds, _ = _find_close_minutiae(endings[:, 0:2], min_minutiae_dist)
+    pairs = good[firsts] & good[seconds]
+    firsts, seconds = firsts[pairs], seconds[pairs]
+
+    angle_diffs = np.abs(endings[firsts, 2] - endings[seconds, 2])
+    angle_diffs = np.where(angle_diffs > np.pi, 2.0 * np.pi - angle_diffs,
+                           angle_diffs)
+    opposing = np.abs(np.pi - angle_diffs) < opp_angle_tol
+    good[firsts[opposing]] = False
+    good[seconds[opposing]] = False
+    good_ridge_endings = good.tolist()
 
     # filters out spurious minutiae
     if len(ridge_endings) > 0:
@@ -542,8 +663,19 @@ print('#bifurcations:', len(bifurcations_2))
 ### Auxiliary function
 * <code>_draw_matches</code>: to draw the matches between two given fingerprints.
 * <code>_compute_distance</code>: to compare two given minutiae, returning their distance in terms of how different they are.
+* <code>_compute_angle_costs</code>: to compute the type compatibility and angle costs between two sets of minutiae.
+* <code>_pair_minutiae</code>: to pair one-to-one two sets of minutiae, for a batch of placements of the second set.
+* <code>_bound_matches</code>: to compute upper bounds of the number of matches between two sets of minutiae.
+* <code>_rotate_angles</code>: to rotate the angles of a set of minutiae.
+* <code>_place_minutiae</code>: to place two sets of minutiae for the translation step, at a given rotation angle and scale change.
+* <code>_match_translations</code>: to match two placed sets of minutiae, for a batch of translations.
 * <code>_hough_translate</code>: to execute the translation step of the Hough transform at a given rotation angle and scale change.
+* <code>_hough_vote</code>: to align two sets of minutiae through Hough voting, verifying only the top voted peaks.
+* <code>_hough_coarse_to_fine</code>: to align two sets of minutiae through a coarse search refined around its best candidates.
+* <code>_init_hough_worker</code> and <code>_run_hough_task</code>: to run translation steps within the worker processes of a pool.
+* <code>_prune_hough_configs</code>: to execute the translation steps as a branch and bound search.
 * <code>_hough_transform</code>: to execute the full Hough transform.
+* <code>run_hough_benchmark</code>: to compare the search strategies of the Hough transform.
 """
 
 # Draws the matching minutiae between the two fingerprint images
@@ -646,23 +778,99 @@ c = _compute_distance(m1, m2)
 assert c < float('inf')
 print('Distance:', c)
 
-# Computes the matches between the given <minutiae_1_points>,
-# <minutiae_1_angles>, <minutiae_1_types> elements belonging to "fingerprint 1",
-# and the given <minutiae_2_points>, <minutiae_2_angles>, <minutiae_2_types>
-# elements belonging to "fingerprint 2".
-#
-# Parameters <x_scale>, <y_scale>, and <rotation> angle express the
-# transformation to be applied on top of the elements belonging to
-# "fingerprint 2" before doing the match (Hough transform step).
-#
-# Returns a list of matches, whose elements are (i, j) pairs, with "i" defining
-# the index of the matched minutiae within "fingerprint 1", and "j" defining
-# the index of the matched minutiae within "fingerprint 2".
-def _hough_translate(minutiae_1_points, minutiae_1_angles, minutiae_1_types,
-                     minutiae_2_points, minutiae_2_angles, minutiae_2_types,
-                     x_scale, y_scale, rotation,
-                     hough_transl_overlay_rate = 0.25,
-                     hough_transl_step = 10):
+# Computes the pairwise type compatibility and angle costs between the
+# minutiae of "fingerprint 1", given by their <minutiae_1_angles> and
+# <minutiae_1_types>, and the ones of "fingerprint 2", given by their
+# <minutiae_2_angles> and <minutiae_2_types>.
+# Returns the (n1 x n2) boolean matrix of pairs with same type and angle
+# difference below <angle_trsh>, followed by the (n1 x n2) matrix of angle
+# differences divided by <angle_trsh> (as in _compute_distance).
+def _compute_angle_costs(minutiae_1_angles, minutiae_1_types,
+                         minutiae_2_angles, minutiae_2_types,
+                         angle_trsh = np.pi / 9.0):
+  minutiae_1_angles = np.asarray(minutiae_1_angles, dtype=np.float64)
+  minutiae_2_angles = np.asarray(minutiae_2_angles, dtype=np.float64)
+  angle_diffs = np.abs(minutiae_1_angles[:, None] - minutiae_2_angles[None, :])
+  angle_diffs = np.where(angle_diffs > np.pi, 2.0 * np.pi - angle_diffs, angle_diffs)
+  compatible = (np.asarray(minutiae_1_types)[:, None] ==
+                np.asarray(minutiae_2_types)[None, :]) & (angle_diffs < angle_trsh)
+  return compatible, angle_diffs / angle_trsh
+
+# Pairs one-to-one the given <minutiae_1_points> of "fingerprint 1" with the
+# minutiae of "fingerprint 2", in a batch of T placements of the latter,
+# whose (T x n2) coordinates are given by <minutiae_2_xs> and <minutiae_2_ys>.
+# The <compatible> and <angle_costs> matrices come from _compute_angle_costs,
+# and only the <visible> (T x n2) minutiae of "fingerprint 2" are considered.
+# Each minutiae of "fingerprint 1", in order, is greedily paired to its
+# closest available minutiae (distance as in _compute_distance, ties kept by
+# the first one), for all the placements at once.
+# Returns a (T x n1) array with the index of the paired minutiae of
+# "fingerprint 2", or -1 if there is none.
+def _pair_minutiae(minutiae_1_points, minutiae_2_xs, minutiae_2_ys,
+                   compatible, angle_costs, visible, dist_trsh = 15):
+  rows = np.arange(len(minutiae_2_xs))
+  already_matched = np.zeros(visible.shape, dtype=bool)
+  matches = np.full((len(minutiae_2_xs), len(minutiae_1_points)), -1)
+  for i in range(len(minutiae_1_points)):
+    dists = np.sqrt((minutiae_1_points[i, 0] - minutiae_2_xs) ** 2 +
+                    (minutiae_1_points[i, 1] - minutiae_2_ys) ** 2)
+    costs = np.where(compatible[i] & visible & ~already_matched & (dists < dist_trsh),
+                     (dists / dist_trsh + angle_costs[i]) / 2.0, np.inf)
+    current_match = np.argmin(costs, axis=1)
+    found = costs[rows, current_match] < np.inf
+    matches[found, i] = current_match[found]
+    already_matched[rows[found], current_match[found]] = True
+
+  return matches
+
+# tests the one-to-one pairing, where the closest minutiae is taken first
+compatible, angle_costs = _compute_angle_costs([0.0, 0.0], [True, True],
+                                               [0.0, 0.1, np.pi], [True, True, True])
+assert compatible.tolist() == [[True, True, False], [True, True, False]]
+matches = _pair_minutiae(np.array([[0.0, 0.0], [0.0, 4.0]]),
+                         np.array([[0.0, 0.0, 0.0]]), np.array([[3.0, 5.0, 0.0]]),
+                         compatible, angle_costs, np.ones((1, 3), dtype=bool))
+assert matches.tolist() == [[0, 1]]
+
+# Computes upper bounds of the number of one-to-one matches between two sets
+# of minutiae, given their <compatible> matrix (see _compute_angle_costs)
+# and, optionally, the (T x n2) <visible> minutiae of "fingerprint 2" in a
+# batch of T placements (see _pair_minutiae).
+# A match needs a minutiae of each set with at least one compatible minutiae
+# of the other set, so the bound is the smallest number of such minutiae.
+# Returns the array of T bounds (or a single bound, if <visible> is None).
+def _bound_matches(compatible, visible=None):
+  row_count = np.sum(np.any(compatible, axis=1))
+  has_compatible = np.any(compatible, axis=0)
+  if visible is None:
+    return min(row_count, np.sum(has_compatible))
+  return np.minimum(row_count, np.sum(visible & has_compatible, axis=1))
+
+# tests the bounds of matches
+assert _bound_matches(compatible) == 2
+assert _bound_matches(compatible, np.array([[True, False, True], [False, False, True]])).tolist() == [1, 0]
+
+# Rotates the given minutiae <angles> by the given <rotation> angle, bringing
+# the rotated angles above pi back by 2 pi.
+# Returns the array of rotated angles.
+def _rotate_angles(angles, rotation):
+  angles = np.asarray(angles, dtype=np.float64) + rotation
+  return np.where(angles > np.pi, angles - 2.0 * np.pi, angles)
+
+# tests the rotation of angles
+assert np.allclose(_rotate_angles([0.0, np.pi / 2.0, np.pi], np.pi / 2.0), [np.pi / 2.0, np.pi, -np.pi / 2.0])
+
+# Places the given <minutiae_1_points> of "fingerprint 1" and the given
+# <minutiae_2_points> and <minutiae_2_angles> of "fingerprint 2" for the
+# translation step of the Hough transform, applying the <x_scale>, <y_scale>,
+# and <rotation> transformation to "fingerprint 2", and making the two sets of
+# minutiae be as close to their respective (x, y) axes as possible.
+# Returns the placed points of "fingerprint 1", the placed points and angles of
+# "fingerprint 2", the (start_x, stop_x, start_y, stop_y) range of interesting
+# translations, given the <hough_transl_overlay_rate>, and the (x, y) origin
+# to add to a translation to get it in the coordinates of "fingerprint 1".
+def _place_minutiae(minutiae_1_points, minutiae_2_points, minutiae_2_angles,
+                    x_scale, y_scale, rotation, hough_transl_overlay_rate = 0.25):
     # scales the second set of minutiae according to <x_scale> and <y_scale>
     scale_matrix = np.zeros((3, 3), dtype=np.float32)
     scale_matrix[0, 0] = x_scale
@@ -686,19 +894,13 @@ def _hough_translate(minutiae_1_points, minutiae_1_angles, minutiae_1_types,
 
     # updates the angles of the second set of minutiae according to the
     # applied rotation
-    minutiae_2_angles = minutiae_2_angles.copy()
-    for i in range(len(minutiae_2_angles)):
-        angle = minutiae_2_angles[i]
-
-        new_angle = angle + rotation
-        if new_angle > np.pi:
-            new_angle = new_angle - 2.0 * np.pi
-
-        minutiae_2_angles[i] = new_angle
+    minutiae_2_angles = _rotate_angles(minutiae_2_angles, rotation)
 
     # makes the sets of minutiae be as close to their respective (x,y) axes as possible
-    minutiae_1_points = minutiae_1_points - [np.min(minutiae_1_points[:, 0]), np.min(minutiae_1_points[:, 1])]
-    minutiae_2_points = minutiae_2_points - [np.max(minutiae_2_points[:, 0]), np.max(minutiae_2_points[:, 1])]
+    minutiae_1_min = np.array([np.min(minutiae_1_points[:, 0]), np.min(minutiae_1_points[:, 1])])
+    minutiae_2_max = np.array([np.max(minutiae_2_points[:, 0]), np.max(minutiae_2_points[:, 1])])
+    minutiae_1_points = minutiae_1_points - list(minutiae_1_min)
+    minutiae_2_points = minutiae_2_points - list(minutiae_2_max)
 
     # computes the variables to control minutiae translations
     minutiae_1_corner_1 = np.array([np.min(minutiae_1_points[:, 0]),
@@ -724,44 +926,447 @@ def _hough_translate(minutiae_1_points, minutiae_1_angles, minutiae_1_types,
     start_y = minutiae_1_y_offset + minutiae_2_y_offset
     stop_y = start_y + minutiae_1_h + minutiae_2_h - minutiae_1_y_offset - minutiae_2_y_offset
 
-    # stores the best matches found so far
-    best_matches = []
+    return minutiae_1_points, minutiae_2_points, minutiae_2_angles, \
+        (start_x, stop_x, start_y, stop_y), minutiae_1_min - minutiae_2_max.astype(np.float64)
+
+# Computes the matches between the given placed <minutiae_1_points> and
+# <minutiae_2_points> (see _place_minutiae), for each translation of the
+# second set given by <translations_x> and <translations_y>. The <compatible>
+# and <angle_costs> matrices come from _compute_angle_costs.
+# Translations whose upper bound of matches (see _bound_matches) does not
+# exceed <min_match_count> are skipped, since they cannot beat it.
+# Returns a (T x n1) array with the index of the matched minutiae of
+# "fingerprint 2" at each of the T translations, or -1 if there is none.
+def _match_translations(minutiae_1_points, minutiae_2_points, compatible, angle_costs,
+                        translations_x, translations_y, dist_trsh = 15, min_match_count = 0):
+  # applies all the translations at once
+  minutiae_2_points = minutiae_2_points.astype(np.float64)
+  minutiae_2_xs = minutiae_2_points[:, 0] + np.asarray(translations_x)[:, None]
+  minutiae_2_ys = minutiae_2_points[:, 1] + np.asarray(translations_y)[:, None]
+  visible = (minutiae_2_xs > 0.0) & (minutiae_2_ys > 0.0)
+
+  # skips the translations that cannot beat <min_match_count>
+  matches = np.full((len(visible), len(minutiae_1_points)), -1)
+  hopeful = _bound_matches(compatible, visible) > min_match_count
+  matches[hopeful] = _pair_minutiae(minutiae_1_points,
+                                    minutiae_2_xs[hopeful], minutiae_2_ys[hopeful],
+                                    compatible, angle_costs, visible[hopeful], dist_trsh)
+  return matches
 
-    # for each interesting translation of the second set of minutiae
-    for x_translation in range(start_x, stop_x, hough_transl_step):
-        for y_translation in range(start_y, stop_y, hough_transl_step):
-            # applies the current translation
-            minutiae_2_points_transl = minutiae_2_points + [x_translation, y_translation]
-
-            # computes the current matches
-            matches = []
-            already_matched = []
-            for i in range(minutiae_1_points.shape[0]):
-                current_match = None
-                current_match_dist = float('inf')
-
-                for j in range(minutiae_2_points_transl.shape[0]):
-                    if j not in already_matched and minutiae_1_types[i] == minutiae_2_types[j] and \
-                            minutiae_2_points_transl[j][0] > 0.0 and minutiae_2_points_transl[j][1] > 0.0:
-                        dist = _compute_distance((minutiae_1_points[i][0], minutiae_1_points[i][1], minutiae_1_angles[i]),
-                         (minutiae_2_points_transl[j][0], minutiae_2_points_transl[j][1], minutiae_2_angles[j]))
-                        if dist < current_match_dist:
-                            current_match = j
-                            current_match_dist = dist
-
-                if current_match is not None:
-                    matches.append((i, current_match))
-                    already_matched.append(current_match)
-
-            # if the number of matches is larger than the one found before,
-            # registers the current matches as the best ones
-            if len(best_matches) < len(matches):
-                best_matches = matches
+# Computes the matches between the given <minutiae_1_points>,
+# <minutiae_1_angles>, <minutiae_1_types> elements belonging to "fingerprint 1",
+# and the given <minutiae_2_points>, <minutiae_2_angles>, <minutiae_2_types>
+# elements belonging to "fingerprint 2".
+#
+# Parameters <x_scale>, <y_scale>, and <rotation> angle express the
+# transformation to be applied on top of the elements belonging to
+# "fingerprint 2" before doing the match (Hough transform step).
+# Parameters <dist_trsh> and <angle_trsh> are the ones of _compute_distance.
+# Only the translations of the given (block index, block count)
+# <hough_transl_block> of the translation grid are tried (default: all).
+# Translations whose upper bound of matches (see _bound_matches) does not
+# exceed <min_match_count> are skipped, since they cannot beat it.
+#
+# Returns a list of matches, whose elements are (i, j) pairs, with "i" defining
+# the index of the matched minutiae within "fingerprint 1", and "j" defining
+# the index of the matched minutiae within "fingerprint 2".
+def _hough_translate(minutiae_1_points, minutiae_1_angles, minutiae_1_types,
+                     minutiae_2_points, minutiae_2_angles, minutiae_2_types,
+                     x_scale, y_scale, rotation,
+                     hough_transl_overlay_rate = 0.25,
+                     hough_transl_step = 10,
+                     dist_trsh = 15, angle_trsh = np.pi / 9.0,
+                     hough_transl_block = (0, 1), min_match_count = 0):
+    # places the sets of minutiae according to the given transformation
+    minutiae_1_points, minutiae_2_points, minutiae_2_angles, \
+        (start_x, stop_x, start_y, stop_y), _ = _place_minutiae(
+            minutiae_1_points, minutiae_2_points, minutiae_2_angles,
+            x_scale, y_scale, rotation, hough_transl_overlay_rate)
+
+    # pairwise type compatibility and angle costs between the two sets
+    # of minutiae, computed once for all the translations
+    compatible, angle_costs = _compute_angle_costs(
+        minutiae_1_angles, minutiae_1_types,
+        minutiae_2_angles, minutiae_2_types, angle_trsh)
+
+    # every interesting translation of the second set of minutiae, one per row
+    x_translations = np.arange(start_x, stop_x, hough_transl_step)
+    y_translations = np.arange(start_y, stop_y, hough_transl_step)
+    translations_x = np.repeat(x_translations, len(y_translations))
+    translations_y = np.tile(y_translations, len(x_translations))
+    translations_x = np.array_split(translations_x, hough_transl_block[1])[hough_transl_block[0]]
+    translations_y = np.array_split(translations_y, hough_transl_block[1])[hough_transl_block[0]]
+
+    # computes the current matches of all the translations
+    matches = _match_translations(minutiae_1_points, minutiae_2_points,
+                                  compatible, angle_costs,
+                                  translations_x, translations_y,
+                                  dist_trsh, min_match_count)
+
+    # the best matches are the first ones with the largest number of matches
+    best_matches = []
+    if len(matches) > 0:
+        match_counts = np.sum(matches >= 0, axis=1)
+        best = np.argmax(match_counts)
+        best_matches = [(i, j) for i, j in enumerate(matches[best].tolist()) if j >= 0]
 
     # returns the best set of matches
     return best_matches
 
-# import multiprocessing
+# tests the translation step on a set of minutiae and its shifted copy
+minutiae_points = np.array([[10, 10], [60, 20], [30, 70], [90, 90], [50, 45]])
+minutiae_angles = [0.0, np.pi / 2.0, np.pi, 3.0 * np.pi / 2.0, np.pi / 4.0]
+minutiae_types = [True, True, False, False, True]
+matches = _hough_translate(minutiae_points, minutiae_angles, minutiae_types,
+                           minutiae_points + [7, 3], minutiae_angles, minutiae_types,
+                           1.0, 1.0, 0.0)
+assert sorted(matches) == [(i, i) for i in range(len(minutiae_points))]
+
+# Computes the matches between the given <minutiae_1_points>,
+# <minutiae_1_angles>, <minutiae_1_types> elements belonging to "fingerprint 1",
+# and the given <minutiae_2_points>, <minutiae_2_angles>, <minutiae_2_types>
+# elements belonging to "fingerprint 2", through Hough voting.
+#
+# For each (x_scale, y_scale, rotation) configuration, taken from
+# <hough_scale_range> and <hough_rotation_range>, every pair of minutiae that
+# may match (same type and close angles, once "fingerprint 2" is rotated)
+# votes for the translation it implies, quantized in <hough_transl_step> bins.
+# Votes of noisy minutiae spread over neighbor bins, so bins are ranked by the
+# votes of their 3x3 neighborhoods (overlapping votes), and only the
+# <hough_peak_count> best ones are verified with the one-to-one pairing of
+# _pair_minutiae: at the mean translation of the votes of every bin of the
+# neighborhood, and at the mean translation of the whole neighborhood.
+#
+# Returns the list of the best matches, whose elements are (i, j) pairs (see
+# _hough_translate), followed by their [x_scale, y_scale, rotation,
+# x_translation, y_translation] configuration (None if there are no votes).
+def _hough_vote(minutiae_1_points, minutiae_1_angles, minutiae_1_types,
+                minutiae_2_points, minutiae_2_angles, minutiae_2_types,
+                hough_scale_range = [1.0],
+                hough_rotation_range = np.arange(-np.pi / 4.0, np.pi / 4.0 + 0.1, np.pi/8.0),
+                hough_transl_step = 10, hough_peak_count = 5,
+                dist_trsh = 15, angle_trsh = np.pi / 9.0):
+    minutiae_1_points = np.asarray(minutiae_1_points, dtype=np.float64)
+    minutiae_2_points = np.asarray(minutiae_2_points, dtype=np.float64)
+    minutiae_2_angles = np.asarray(minutiae_2_angles, dtype=np.float64)
+
+    # Hough configurations
+    configs = [(x_scale, y_scale, rotation)
+               for x_scale in hough_scale_range
+               for y_scale in hough_scale_range
+               for rotation in hough_rotation_range]
+
+    # transforms the second set of minutiae according to a configuration
+    def transform(x_scale, y_scale, rotation):
+        sine = np.sin(rotation)
+        cosine = np.cos(rotation)
+        xs = minutiae_2_points[:, 0] * x_scale
+        ys = minutiae_2_points[:, 1] * y_scale
+        return cosine * xs - sine * ys, sine * xs + cosine * ys, _rotate_angles(minutiae_2_angles, rotation)
+
+    # votes of every possibly matching pair, for every configuration
+    vote_configs = []
+    vote_xs = []
+    vote_ys = []
+    for c, config in enumerate(configs):
+        xs, ys, angles = transform(*config)
+        compatible, _ = _compute_angle_costs(minutiae_1_angles, minutiae_1_types,
+                                             angles, minutiae_2_types, angle_trsh)
+        firsts, seconds = np.nonzero(compatible)
+        vote_configs.append(np.full(len(firsts), c))
+        vote_xs.append(minutiae_1_points[firsts, 0] - xs[seconds])
+        vote_ys.append(minutiae_1_points[firsts, 1] - ys[seconds])
+
+    vote_configs = np.concatenate(vote_configs)
+    vote_xs = np.concatenate(vote_xs)
+    vote_ys = np.concatenate(vote_ys)
+    if len(vote_configs) == 0:
+        return [], None
+
+    # quantized accumulator of votes, (configuration, x, y translation) bins
+    bin_xs = np.floor((vote_xs - vote_xs.min()) / hough_transl_step).astype(np.int64)
+    bin_ys = np.floor((vote_ys - vote_ys.min()) / hough_transl_step).astype(np.int64)
+    x_bin_count = bin_xs.max() + 1
+    y_bin_count = bin_ys.max() + 1
+    bins = (vote_configs * x_bin_count + bin_xs) * y_bin_count + bin_ys
+    bin_count = len(configs) * x_bin_count * y_bin_count
+    shape = (len(configs), x_bin_count, y_bin_count)
+    votes = np.bincount(bins, minlength=bin_count).reshape(shape)
+    votes_x = np.bincount(bins, weights=vote_xs, minlength=bin_count).reshape(shape)
+    votes_y = np.bincount(bins, weights=vote_ys, minlength=bin_count).reshape(shape)
+
+    # votes of the 3x3 neighborhood of every bin
+    padded_votes = np.pad(votes, ((0, 0), (1, 1), (1, 1)))
+    neighborhood_votes = sum(padded_votes[:, i:i + x_bin_count, j:j + y_bin_count]
+                             for i in range(3) for j in range(3)).ravel()
+
+    # verifies the top voted peaks (the most voted first, ties by bin order)
+    peaks = np.argsort(-neighborhood_votes, kind='stable')[:hough_peak_count]
+    best_matches = []
+    best_config = None
+    for peak in peaks[neighborhood_votes[peaks] > 0]:
+        c, x, y = np.unravel_index(peak, shape)
+        config = configs[c]
+
+        # mean translations of every voted bin of the neighborhood, and of
+        # the whole neighborhood
+        neighborhood = (c, slice(max(x - 1, 0), x + 2), slice(max(y - 1, 0), y + 2))
+        voted = votes[neighborhood] > 0
+        x_translations = np.append(votes_x[neighborhood][voted] / votes[neighborhood][voted],
+                                   np.sum(votes_x[neighborhood]) / np.sum(votes[neighborhood]))
+        y_translations = np.append(votes_y[neighborhood][voted] / votes[neighborhood][voted],
+                                   np.sum(votes_y[neighborhood]) / np.sum(votes[neighborhood]))
+
+        xs, ys, angles = transform(*config)
+        compatible, angle_costs = _compute_angle_costs(
+            minutiae_1_angles, minutiae_1_types,
+            angles, minutiae_2_types, angle_trsh)
+        matches = _pair_minutiae(minutiae_1_points,
+                                 xs[None, :] + x_translations[:, None],
+                                 ys[None, :] + y_translations[:, None],
+                                 compatible, angle_costs,
+                                 np.ones((len(x_translations), len(xs)), dtype=bool), dist_trsh)
+
+        best = np.argmax(np.sum(matches >= 0, axis=1))
+        matches = [(i, j) for i, j in enumerate(matches[best].tolist()) if j >= 0]
+        if len(best_matches) < len(matches):
+            best_matches = matches
+            best_config = list(config) + [x_translations[best], y_translations[best]]
+
+    return best_matches, best_config
+
+# tests the Hough voting on a set of minutiae and its rotated and shifted copy
+rotation = np.pi / 8.0
+minutiae_points = np.array([[10, 10], [60, 20], [30, 70], [90, 90], [50, 45]])
+minutiae_angles = np.array([0.0, np.pi / 2.0, np.pi, -np.pi / 2.0, np.pi / 4.0])
+minutiae_types = [True, True, False, False, True]
+shifted_points = minutiae_points - [25, -40]
+rotated_points = np.stack((np.cos(-rotation) * shifted_points[:, 0] - np.sin(-rotation) * shifted_points[:, 1],
+                           np.sin(-rotation) * shifted_points[:, 0] + np.cos(-rotation) * shifted_points[:, 1]), axis=1)
+matches, config = _hough_vote(minutiae_points, minutiae_angles, minutiae_types,
+                              rotated_points, minutiae_angles - rotation, minutiae_types)
+assert sorted(matches) == [(i, i) for i in range(len(minutiae_points))]
+assert np.isclose(config[2], rotation)
+assert np.allclose(config[3:], [25, -40])
+
+# tests the Hough voting on a noisy pair of minutiae sets (1.5 pixels of
+# noise, a third of the minutiae shared), against the translation grid
+rng = np.random.default_rng(1)
+noisy_points = rng.uniform(0, [300, 350], (60, 2))
+noisy_angles = rng.uniform(-np.pi, np.pi, 60)
+noisy_types = rng.random(60) < 0.5
+rotated_noisy_points = np.stack((np.cos(-rotation) * (noisy_points[:, 0] - 25) - np.sin(-rotation) * (noisy_points[:, 1] + 40),
+                                 np.sin(-rotation) * (noisy_points[:, 0] - 25) + np.cos(-rotation) * (noisy_points[:, 1] + 40)),
+                                axis=1) + rng.normal(0.0, 1.5, (60, 2))
+rotated_noisy_angles = np.where(noisy_angles - rotation < -np.pi, noisy_angles - rotation + 2.0 * np.pi, noisy_angles - rotation)
+rotated_noisy_points[20:] = rng.uniform(rotated_noisy_points.min(axis=0), rotated_noisy_points.max(axis=0), (40, 2))
+rotated_noisy_angles[20:] = rng.uniform(-np.pi, np.pi, 40)
+matches, config = _hough_vote(noisy_points, noisy_angles, noisy_types,
+                              rotated_noisy_points, rotated_noisy_angles, noisy_types)
+grid_matches = _hough_translate(noisy_points, noisy_angles, noisy_types,
+                                rotated_noisy_points, rotated_noisy_angles, noisy_types,
+                                1.0, 1.0, rotation)
+assert len(matches) >= len(grid_matches)
+
+# Computes the matches between the given <minutiae_1_points>,
+# <minutiae_1_angles>, <minutiae_1_types> elements belonging to "fingerprint 1",
+# and the given <minutiae_2_points>, <minutiae_2_angles>, <minutiae_2_types>
+# elements belonging to "fingerprint 2", through a coarse-to-fine search.
+#
+# Every (x_scale, y_scale, rotation) configuration, taken from
+# <hough_scale_range> and <hough_rotation_range>, is first tried with
+# translations every <coarse_transl_step> pixels (see _hough_translate).
+# Then, only around the <hough_top_count> best (configuration, translation)
+# candidates, rotations every <fine_rotation_step> radians (up to half of the
+# step of <hough_rotation_range>) and translations every <fine_transl_step>
+# pixels (up to half of <coarse_transl_step>, which reaches every point of a
+# finer grid) are tried.
+# The result is not guaranteed to be as good as the one of a finer grid
+# search (see _hough_translate): its best translation may lie away from the
+# refined candidates, namely when many coarse candidates tie.
+#
+# Returns the list of the best matches, whose elements are (i, j) pairs (see
+# _hough_translate), followed by their [x_scale, y_scale, rotation,
+# x_translation, y_translation] configuration (None if there are no matches),
+# and by the number of evaluated (configuration, translation) placements.
+def _hough_coarse_to_fine(minutiae_1_points, minutiae_1_angles, minutiae_1_types,
+                          minutiae_2_points, minutiae_2_angles, minutiae_2_types,
+                          hough_scale_range = [1.0],
+                          hough_rotation_range = np.arange(-np.pi / 4.0, np.pi / 4.0 + 0.1, np.pi/8.0),
+                          hough_transl_overlay_rate = 0.25,
+                          coarse_transl_step = 20, fine_transl_step = 5,
+                          fine_rotation_step = np.pi / 32.0, hough_top_count = 10,
+                          dist_trsh = 15, angle_trsh = np.pi / 9.0):
+    best_matches = []
+    best_config = None
+    evaluation_count = 0
+
+    # tries the given translations of a configuration, keeping the first best
+    # matches; returns the number of matches of each translation
+    def evaluate(config, translations_x, translations_y, around_candidates=False):
+        nonlocal best_matches, best_config, evaluation_count
+        points_1, points_2, angles_2, window, config_origin = _place_minutiae(
+            minutiae_1_points, minutiae_2_points, minutiae_2_angles,
+            *config, hough_transl_overlay_rate)
+
+        # translations are either given around the candidates, in the
+        # coordinates of "fingerprint 1", or as a (step) grid of the
+        # interesting window
+        if not around_candidates:
+            x_translations = np.arange(window[0], window[1], translations_x)
+            y_translations = np.arange(window[2], window[3], translations_y)
+            translations_x = np.repeat(x_translations, len(y_translations))
+            translations_y = np.tile(y_translations, len(x_translations))
+        else:
+            translations_x = translations_x - config_origin[0]
+            translations_y = translations_y - config_origin[1]
+
+        compatible, angle_costs = _compute_angle_costs(
+            minutiae_1_angles, minutiae_1_types,
+            angles_2, minutiae_2_types, angle_trsh)
+        matches = _match_translations(points_1, points_2, compatible, angle_costs,
+                                      translations_x, translations_y, dist_trsh)
+        match_counts = np.sum(matches >= 0, axis=1)
+        evaluation_count = evaluation_count + len(matches)
+
+        if len(matches) > 0 and len(best_matches) < np.max(match_counts):
+            best = np.argmax(match_counts)
+            best_matches = [(i, j) for i, j in enumerate(matches[best].tolist()) if j >= 0]
+            best_config = list(config) + [translations_x[best] + config_origin[0],
+                                          translations_y[best] + config_origin[1]]
+
+        return match_counts, translations_x + config_origin[0], translations_y + config_origin[1]
+
+    # coarse search, over every configuration
+    configs = [(x_scale, y_scale, rotation)
+               for x_scale in hough_scale_range
+               for y_scale in hough_scale_range
+               for rotation in hough_rotation_range]
+    candidates = []
+    for c, config in enumerate(configs):
+        match_counts, translations_x, translations_y = evaluate(config, coarse_transl_step,
+                                                                coarse_transl_step)
+        candidates.append((match_counts, np.full(len(match_counts), c),
+                           translations_x, translations_y))
+
+    # fine search, around the best candidates (ties kept in search order)
+    match_counts, config_ids, translations_x, translations_y = \
+        (np.concatenate(values) for values in zip(*candidates))
+    rotation_step = np.min(np.diff(np.sort(hough_rotation_range))) if len(hough_rotation_range) > 1 else 0.0
+    rotation_offsets = np.arange(1, int(rotation_step / 2.0 / fine_rotation_step + 1e-9) + 1) * fine_rotation_step
+    rotation_offsets = np.concatenate((-rotation_offsets[::-1], [0.0], rotation_offsets))
+    transl_offsets = np.arange(-(coarse_transl_step // 2), coarse_transl_step // 2 + 1, fine_transl_step)
+
+    for k in np.argsort(-match_counts, kind='stable')[:hough_top_count]:
+        x_scale, y_scale, rotation = configs[config_ids[k]]
+        for rotation_offset in rotation_offsets:
+            evaluate((x_scale, y_scale, rotation + rotation_offset),
+                     np.repeat(translations_x[k] + transl_offsets, len(transl_offsets)),
+                     np.tile(translations_y[k] + transl_offsets, len(transl_offsets)),
+                     around_candidates=True)
+
+    return best_matches, best_config, evaluation_count
+
+# tests the coarse-to-fine search on a set of minutiae and its rotated and
+# shifted copy
+matches, config, evaluation_count = _hough_coarse_to_fine(
+    minutiae_points, minutiae_angles, minutiae_types,
+    rotated_points, minutiae_angles - rotation, minutiae_types)
+assert sorted(matches) == [(i, i) for i in range(len(minutiae_points))]
+assert abs(config[2] - rotation) < np.pi / 9.0
+
+import concurrent.futures
+import contextlib
+import io
+import time
+
+# Minutiae data of the Hough transform, set within each worker process
+# of the pool by _init_hough_worker
+_hough_data = None
+
+# Sets the given minutiae of "fingerprint 1" and "fingerprint 2"
+# (see _hough_translate) as the data of the Hough transform tasks.
+def _init_hough_worker(minutiae_1_points, minutiae_1_angles, minutiae_1_types,
+                       minutiae_2_points, minutiae_2_angles, minutiae_2_types):
+  global _hough_data
+  _hough_data = (minutiae_1_points, minutiae_1_angles, minutiae_1_types,
+                 minutiae_2_points, minutiae_2_angles, minutiae_2_types)
+
+# Runs the translation step of the Hough transform over the data set by
+# _init_hough_worker, at the given (x_scale, y_scale, rotation) <config>,
+# trying only the translations of the <block>-th of <block_count> blocks,
+# every <hough_transl_step> pixels.
+# Returns the list of matches (see _hough_translate).
+def _run_hough_task(config, block, block_count, hough_transl_step):
+  return _hough_translate(*_hough_data, *config, hough_transl_step=hough_transl_step,
+                          hough_transl_block=(block, block_count))
+
+
+# Runs the translation steps of the Hough transform over the given
+# <shared_data> minutiae (see _init_hough_worker), within the current
+# process, for the given (x_scale, y_scale, rotation) <configs> with
+# <block_count> blocks of translations each (every <transl_step> pixels),
+# as a branch and bound search: configurations and translations whose upper
+# bound of matches (see _bound_matches) cannot beat the best matches found so
+# far are skipped, and the search stops (even within the blocks of a
+# configuration) once no configuration can beat them.
+# If a <match_trsh> number of matches is given, the search also stops once it
+# is reached, and skips everything that cannot reach it.
+# Provide <verbose> as True to log each configuration.
+# Returns the best list of matches (see _hough_translate), followed by
+# their [x_scale, y_scale, rotation] configuration (None if no matches).
+def _prune_hough_configs(shared_data, configs, block_count, match_trsh=None, verbose=False,
+                         transl_step=10):
+  minutiae_1_points, minutiae_1_angles, minutiae_1_types, \
+    minutiae_2_points, minutiae_2_angles, minutiae_2_types = shared_data
+
+  # upper bound of each configuration, from the minutiae of each set having
+  # a compatible minutiae on the other set, once rotated
+  config_bounds = []
+  for x_scale, y_scale, rotation in configs:
+    compatible, _ = _compute_angle_costs(minutiae_1_angles, minutiae_1_types,
+                                         _rotate_angles(minutiae_2_angles, rotation), minutiae_2_types)
+    config_bounds.append(_bound_matches(compatible))
+
+  # number of matches that settles the search: nothing can beat the largest
+  # bound (or reach the threshold, in case the threshold is reached)
+  settled_count = max(config_bounds) if len(configs) > 0 else 0
+  if match_trsh is not None:
+    settled_count = min(settled_count, match_trsh)
+
+  best_matches = []
+  best_config = None
+  for config, config_bound in zip(configs, config_bounds):
+    # matches to beat, or one less than the threshold, if it is the case
+    min_match_count = len(best_matches)
+    if match_trsh is not None:
+      min_match_count = max(min_match_count, match_trsh - 1)
+
+    config_matches = []
+    if config_bound > min_match_count and len(best_matches) < settled_count:
+      for block in range(block_count):
+        matches = _hough_translate(*shared_data, *config, hough_transl_step=transl_step,
+                                   hough_transl_block=(block, block_count),
+                                   min_match_count=max(min_match_count, len(config_matches)))
+        if len(config_matches) < len(matches):
+          config_matches = matches
+
+        # the remaining blocks cannot settle the search any further
+        if len(config_matches) >= settled_count:
+          break
+
+      if verbose:
+        print('[INFO] Hough transform at', str(list(config)) + ':',
+              len(config_matches), 'matches.')
+
+    elif verbose:
+      print('[INFO] Hough transform at', str(list(config)) + ': pruned.')
+
+    if len(best_matches) < len(config_matches):
+      best_matches = config_matches
+      best_config = list(config)
+
+  return best_matches, best_config
 
 # Applies Hough transform to simultaneously match <ridge_endings_1> to <ridge_endings_2>,
 # and <ridge_bifurcations_1> to <ridge_bifurcations_2>.
@@ -769,10 +1374,54 @@ def _hough_translate(minutiae_1_points, minutiae_1_angles, minutiae_1_types,
 # The elements of these lists are (minutiae_1, minutiae_2) pairs, where each minutiae is represented by
 # a (x, y, angle) triple; "x" and "y" define the pixel position of the minutiae on its respective fingerprint image,
 # and "angle" define the minutiae orientation in radians.
+# The given <hough_method> defines how the minutiae are aligned:
+# 'grid': every translation of every configuration is tried; configurations
+# and blocks of translations (<hough_transl_blocks> per configuration,
+# default: 1) are spread over <hough_workers> processes (None: all CPUs;
+# 1: everything within the current process); the best configuration is the
+# same, regardless of the number of processes.
+# 'voting': through Hough voting (see _hough_vote), verifying only the
+# <hough_peak_count> top peaks.
+# 'coarse_to_fine': refining only the best candidates of a coarse search
+# (see _hough_coarse_to_fine).
+# 'pruning': as 'grid', within the current process, skipping the
+# configurations and translations whose upper bound of matches cannot beat
+# the best matches found so far, stopping once no configuration can (also
+# between its <hough_transl_blocks> blocks of translations, default: 8); the
+# best number of matches is the same. If a <hough_match_trsh> number of
+# matches is also given, the search stops as soon as it is reached (accept),
+# and skips everything that cannot reach it (reject); the returned number of
+# matches is then only guaranteed to be on the right side of the threshold.
+# Translations are tried (or, for voting, quantized) every
+# <hough_transl_step> pixels (default: 10), except by 'coarse_to_fine', which
+# has its own steps.
+# Raises ValueError for an unknown method, or for options the method ignores.
+# Provide <verbose> as False to silence the per-configuration logging.
 def _hough_transform(ridge_endings_1, ridge_bifurcations_1,
                      ridge_endings_2, ridge_bifurcations_2,
                      hough_scale_range = [1.0],
-                     hough_rotation_range = np.arange(-np.pi / 4.0, np.pi / 4.0 + 0.1, np.pi/8.0)):
+                     hough_rotation_range = np.arange(-np.pi / 4.0, np.pi / 4.0 + 0.1, np.pi/8.0),
+                     hough_method = 'grid', hough_peak_count = 5,
+                     hough_workers = 1, hough_transl_blocks = None, verbose = True,
+                     hough_match_trsh = None, hough_transl_step = None):
+    # options checking, as each method only takes some of them
+    if hough_method not in ('grid', 'voting', 'coarse_to_fine', 'pruning'):
+        raise ValueError('Unknown Hough method: ' + str(hough_method))
+    if hough_workers != 1 and hough_method != 'grid':
+        raise ValueError('Hough workers are only supported by the grid method.')
+    if hough_transl_blocks is not None and hough_method not in ('grid', 'pruning'):
+        raise ValueError('Hough translation blocks are only supported by the grid and pruning methods.')
+    if hough_match_trsh is not None and hough_method != 'pruning':
+        raise ValueError('Hough match threshold is only supported by the pruning method.')
+    if hough_transl_step is not None and hough_method == 'coarse_to_fine':
+        raise ValueError('Hough translation step is not supported by the coarse-to-fine method.')
+
+    # the pruning search stops early within the blocks of a configuration
+    if hough_transl_blocks is None:
+        hough_transl_blocks = 8 if hough_method == 'pruning' else 1
+    if hough_transl_step is None:
+        hough_transl_step = 10
+
     # data preparation for performing the Hough transform
     if len(ridge_endings_1) > 0 and len(ridge_bifurcations_1) > 0:
         minutiae_set_1 = np.concatenate((ridge_endings_1, ridge_bifurcations_1), axis=0)
@@ -813,50 +1462,69 @@ def _hough_transform(ridge_endings_1, ridge_bifurcations_1,
     best_matches = []
     best_config = None
 
-    # for each Hough configuration...
-    # # multiprocessing in action
-    # pool = multiprocessing.Pool(processes=multiprocessing.cpu_count())
-    # pool_result = [pool.apply_async(_hough_translate,
-    #                                 args=(minutiae_1_points, minutiae_1_angles, minutiae_1_types,
-    #                                       minutiae_2_points, minutiae_2_angles, minutiae_2_types,
-    #                                       x_scale, y_scale, rotation))
-    #                for x_scale in hough_scale_range
-    #                for y_scale in hough_scale_range
-    #                for rotation in hough_rotation_range]
-    # results = [r.get() for r in pool_result]
-    # pool.close()
-
-    # i = -1
-    # for x_scale in hough_scale_range:
-    #     for y_scale in hough_scale_range:
-    #         for rotation in hough_rotation_range:
-    #             i = i + 1
-    #             print('[INFO] Hough transform at', str([x_scale, y_scale, rotation]) + ':',
-    #                   len(results[i]), 'matches.')
-    #             if len(best_matches) < len(results[i]):
-    #                 best_matches = results[i]
-    #                 best_config = [x_scale, y_scale, rotation]
-    # # end of multiprocessing
-
-    # if you get a "freeze support" runtime error when running this solution, please comment the multiprocessing
-    # code block above and replace it with the following commented "for" block...
-    for x_scale in hough_scale_range:
-       for y_scale in hough_scale_range:
-           for rotation in hough_rotation_range:
-               results = _hough_translate(minutiae_1_points, minutiae_1_angles, minutiae_1_types,
-                                          minutiae_2_points, minutiae_2_angles, minutiae_2_types,
-                                          x_scale, y_scale, rotation)
-
-               print('[INFO] Hough transform at', str([x_scale, y_scale, rotation]) + ':',
-                     len(results), 'matches.')
-
-               if len(best_matches) < len(results):
-                   best_matches = results
-                   best_config = [x_scale, y_scale, rotation]
-    # end of non-multiprocessing solution
+    # Hough configurations, minutiae shared by all of them
+    configs = [(x_scale, y_scale, rotation)
+               for x_scale in hough_scale_range
+               for y_scale in hough_scale_range
+               for rotation in hough_rotation_range]
+    shared_data = (minutiae_1_points, minutiae_1_angles, minutiae_1_types,
+                   minutiae_2_points, minutiae_2_angles, minutiae_2_types)
+
+    # Hough voting solution, verifying only the most voted configurations
+    if hough_method == 'voting':
+        best_matches, best_config = _hough_vote(*shared_data,
+                                                hough_scale_range, hough_rotation_range,
+                                                hough_transl_step=hough_transl_step,
+                                                hough_peak_count=hough_peak_count)
+
+    # coarse-to-fine solution, refining only the best coarse candidates
+    elif hough_method == 'coarse_to_fine':
+        best_matches, best_config, _ = _hough_coarse_to_fine(*shared_data,
+                                                             hough_scale_range, hough_rotation_range)
+
+    # branch and bound solution, skipping the hopeless configurations
+    elif hough_method == 'pruning':
+        best_matches, best_config = _prune_hough_configs(shared_data, configs, hough_transl_blocks,
+                                                         hough_match_trsh, verbose, hough_transl_step)
+
+    # else, for each Hough configuration and block of translations...
+    else:
+        task_configs = [config for config in configs for _ in range(hough_transl_blocks)]
+        task_blocks = list(range(hough_transl_blocks)) * len(configs)
+        task_block_counts = [hough_transl_blocks] * len(task_configs)
+
+        # within the current process, the minutiae are given explicitly; worker
+        # processes get them once, through _init_hough_worker
+        if hough_workers == 1:
+            results = [_hough_translate(*shared_data, *config, hough_transl_step=hough_transl_step,
+                                        hough_transl_block=(block, block_count))
+                       for config, block, block_count in zip(task_configs, task_blocks, task_block_counts)]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=hough_workers,
+                                                        initializer=_init_hough_worker,
+                                                        initargs=shared_data) as executor:
+                results = list(executor.map(_run_hough_task, task_configs, task_blocks, task_block_counts,
+                                            [hough_transl_step] * len(task_configs)))
+
+        # results are visited in the sequential order, so the first best
+        # configuration (and translation) is kept
+        for c, config in enumerate(configs):
+            config_matches = []
+            for matches in results[c * hough_transl_blocks:(c + 1) * hough_transl_blocks]:
+                if len(config_matches) < len(matches):
+                    config_matches = matches
+
+            if verbose:
+                print('[INFO] Hough transform at', str(list(config)) + ':',
+                      len(config_matches), 'matches.')
+
+            if len(best_matches) < len(config_matches):
+                best_matches = config_matches
+                best_config = list(config)
 
     # found the best matches up here
-    print('[INFO] Best Hough with:', len(best_matches), 'matches, at:', str(best_config) + '.')
+    if verbose:
+        print('[INFO] Best Hough with:', len(best_matches), 'matches, at:', str(best_config) + '.')
 
     # returns the matches separated in ridge endings and bifurcations
     ridge_ending_matches = []
@@ -870,7 +1538,113 @@ def _hough_transform(ridge_endings_1, ridge_bifurcations_1,
             bifurcation_matches.append(((minutiae_set_1[m[0]][0], minutiae_set_1[m[0]][1], minutiae_1_angles[m[0]]),
                                         (minutiae_set_2[m[1]][0], minutiae_set_2[m[1]][1], minutiae_2_angles[m[1]])))
 
-    return (len(ridge_ending_matches) + len(bifurcation_matches))
+    return ridge_ending_matches, bifurcation_matches
+
+try:
+    _hough_transform([], [], [], [], hough_method='voting', hough_workers=2)
+except ValueError:
+    print("Hough voting won't silently ignore the worker processes.")
+
+# tests the grid search on the set of minutiae and its rotated and shifted
+# copy: spreading it over processes and blocks of translations changes
+# nothing, and nothing is logged without verbose
+synthetic_pair = tuple([(x, y, angle) for (x, y), angle, ending in zip(points, angles, minutiae_types)
+                        if ending == is_ending]
+                       for points, angles in ((minutiae_points, minutiae_angles),
+                                              (rotated_points, minutiae_angles - rotation))
+                       for is_ending in (True, False))
+with contextlib.redirect_stdout(io.StringIO()) as output:
+    grid_result = _hough_transform(*synthetic_pair, verbose=False)
+    assert _hough_transform(*synthetic_pair, hough_workers=2, hough_transl_blocks=3,
+                            verbose=False) == grid_result
+assert output.getvalue() == ''
+assert len(grid_result[0]) + len(grid_result[1]) == len(minutiae_points)
+
+# tests the pruning search on the synthetic and noisy pairs: with or without
+# blocks of translations, it keeps the best number of matches of the grid,
+# and a match threshold is answered on its right side
+noisy_pair = tuple([(x, y, angle) for (x, y), angle, ending in zip(points, angles, noisy_types)
+                    if ending == is_ending]
+                   for points, angles in ((noisy_points, noisy_angles),
+                                          (rotated_noisy_points, rotated_noisy_angles))
+                   for is_ending in (True, False))
+for minutiae_pair in (synthetic_pair, noisy_pair):
+    grid_count = sum(len(matches) for matches in _hough_transform(*minutiae_pair, verbose=False))
+    for blocks in (1, 3, None):
+        assert sum(len(matches) for matches in _hough_transform(
+            *minutiae_pair, hough_method='pruning', hough_transl_blocks=blocks, verbose=False)) == grid_count
+    for match_trsh in (grid_count - 1, grid_count, grid_count + 1):
+        count = sum(len(matches) for matches in _hough_transform(
+            *minutiae_pair, hough_method='pruning', hough_match_trsh=match_trsh, verbose=False))
+        assert (count >= match_trsh) == (grid_count >= match_trsh)
+
+# Benchmarks the grid search of the Hough transform (see _hough_transform)
+# against its coarse-to-fine search (see _hough_coarse_to_fine), over the given
+# <minutiae_pairs>, a list of (ridge_endings_1, ridge_bifurcations_1,
+# ridge_endings_2, ridge_bifurcations_2) tuples with minutiae on both sides.
+# Both searches use the given <hough_scale_range> and <hough_rotation_range>,
+# the grid one with translations every <hough_transl_step> pixels, and are
+# timed (best of <repeats> runs).
+# Returns a list of (pair, method, matches, evaluations, seconds) records,
+# one per pair and search, where "evaluations" is the number of tried
+# (configuration, translation) placements.
+def run_hough_benchmark(minutiae_pairs, repeats = 1,
+                        hough_scale_range = [1.0],
+                        hough_rotation_range = np.arange(-np.pi / 4.0, np.pi / 4.0 + 0.1, np.pi/8.0),
+                        hough_transl_step = 10):
+    records = []
+    for p, minutiae_pair in enumerate(minutiae_pairs):
+        # minutiae arrays, as prepared by _hough_transform
+        minutiae = []
+        for ridge_endings, ridge_bifurcations in (minutiae_pair[0:2], minutiae_pair[2:4]):
+            minutiae_set = list(ridge_endings) + list(ridge_bifurcations)
+            minutiae.append((np.array([[m[0], m[1]] for m in minutiae_set]),
+                             [m[2] for m in minutiae_set],
+                             [True] * len(ridge_endings) + [False] * len(ridge_bifurcations)))
+
+        # number of placements tried by each search
+        grid_evaluations = 0
+        for x_scale in hough_scale_range:
+            for y_scale in hough_scale_range:
+                for rotation in hough_rotation_range:
+                    _, _, _, (start_x, stop_x, start_y, stop_y), _ = _place_minutiae(
+                        minutiae[0][0], minutiae[1][0], minutiae[1][1], x_scale, y_scale, rotation)
+                    grid_evaluations += len(range(start_x, stop_x, hough_transl_step)) * \
+                                        len(range(start_y, stop_y, hough_transl_step))
+
+        _, _, coarse_to_fine_evaluations = _hough_coarse_to_fine(*minutiae[0], *minutiae[1],
+                                                                 hough_scale_range, hough_rotation_range)
+
+        # times each search
+        for method, evaluations, options in (('grid', grid_evaluations, {'hough_transl_step': hough_transl_step}),
+                                             ('coarse_to_fine', coarse_to_fine_evaluations, {})):
+            seconds = float('inf')
+            for _ in range(repeats):
+                start = time.perf_counter()
+                matches = _hough_transform(*minutiae_pair, hough_scale_range, hough_rotation_range,
+                                           hough_method=method, verbose=False, **options)
+                seconds = min(seconds, time.perf_counter() - start)
+
+            records.append((p, method, len(matches[0]) + len(matches[1]), evaluations, seconds))
+
+    return records
+
+# tests the benchmark on the set of minutiae and its rotated and shifted copy,
+# and on the noisy pair; on both, refining the best coarse candidates finds
+# as many matches as the grid (not guaranteed, see _hough_coarse_to_fine)
+synthetic_records = run_hough_benchmark([synthetic_pair, noisy_pair])
+assert [record[1] for record in synthetic_records] == ['grid', 'coarse_to_fine'] * 2
+assert synthetic_records[1][2] >= synthetic_records[0][2] == len(minutiae_points)
+assert synthetic_records[3][2] >= synthetic_records[2][2]
+assert run_hough_benchmark([synthetic_pair], hough_transl_step=20)[0][3] < synthetic_records[0][3]
+
+# tests the benchmark of the Hough transform searches
+records = run_hough_benchmark([(ridge_endings_1, bifurcations_1, ridge_endings_2, bifurcations_2),
+                               (ridge_endings_1, bifurcations_1, ridge_endings_1, bifurcations_1)])
+for pair, method, matches, evaluations, seconds in records:
+  print('[INFO] Pair', pair, method + ':', matches, 'matches,', evaluations, 'evaluations,',
+        '{:.3f}'.format(seconds), 'seconds.')
+assert records[3][2] == len(ridge_endings_1) + len(bifurcations_1)
 
 """### Main function"""
 
@@ -1026,7 +1800,7 @@ def matching_method(fingerprint_1, fingerprint_2):
 
     min1 = len(ridge_endings_1)+len(bifurcations_1)
     min2 = len(ridge_endings_2)+len(bifurcations_2)
-    similarity_score = ((matches)/((min1+min2)*.5))
+    similarity_score = ((len(matches[0]) + len(matches[1]))/((min1+min2)*.5))
     print(similarity_score)
 
 import os
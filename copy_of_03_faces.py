@@ -590,6 +590,26 @@ assert not float('-inf') < compute_d_prime([(1, 0.1)]) < float('inf')  # missing
 d_prime_Val = compute_d_prime([("/content/subject01.glasses.png"), ("/content/subject01.happy.png"), ("/content/subject01.leftlight.png"), ("/content/subject01.noglasses.png")])
 print(d_prime_Val)
 
+"""---
+### Metrics engine
+
+The metrics are not copied into this notebook: they are loaded from the export of the metrics
+notebook (<code>copy_of_01_metrics.py</code>, uploaded to <code>/content</code>) by the loader
+shared with the irises notebook (<code>notebook_loader.py</code>, uploaded there too), so that
+the notebooks share the same engine.
+"""
+
+# imports the loader of notebook functions (see notebook_loader.py,
+# uploaded to /content)
+import sys
+sys.path.append('/content')
+from notebook_loader import load_notebook_functions
+
+metrics = load_notebook_functions('/content/copy_of_01_metrics.py')
+
+# tests the loaded metrics: genuine distances below the impostor ones
+assert metrics.compute_fmr_fnmr_eer([(1, 0.2), (0, 0.8)], is_similarity=False) == (0.0, 0.0, 0.2)
+
 from google.colab import drive
 drive.mount('/content/assign_03_data')
 
@@ -629,16 +649,21 @@ def create_genuine_pairs(face_encodings, labels):
 
     return genuine_pairs
 
-# Function to create impostor pairs
-def create_impostor_pairs(face_encodings, labels, num_pairs):
-    impostor_pairs = []
+# Draws about <num_pairs> impostor pairs of different subjects (the label
+# prefix before the first '.', e.g., 'subject01' for 'subject01.happy'),
+# without replacement (see <code>sample_impostor_pairs</code> of the
+# metrics notebook).
+# Returns the pairs and their importance weights, to be given to the
+# metrics as weighted observations.
+def create_impostor_pairs(face_encodings, labels, num_pairs, seed=None):
+    subject_ids = [label.split('.')[0] for label in labels]
+    firsts, seconds, weights = metrics.sample_impostor_pairs(subject_ids, num_pairs, seed)
 
-    for _ in range(num_pairs):
-        pair_labels = random.sample(labels, 2)
-        pair_encodings = [face_encodings[labels.index(pair_labels[0])], face_encodings[labels.index(pair_labels[1])]]
-        impostor_pairs.append(((pair_encodings[0], pair_labels[0]), (pair_encodings[1], pair_labels[1])))
+    impostor_pairs = []
+    for i, j in zip(firsts, seconds):
+        impostor_pairs.append(((face_encodings[i], labels[i]), (face_encodings[j], labels[j])))
 
-    return impostor_pairs
+    return impostor_pairs, weights
 
 # Example usage
 
@@ -648,11 +673,11 @@ def create_impostor_pairs(face_encodings, labels, num_pairs):
 
 import os
 import zipfile
-from itertools import combinations
 import pandas as pd
 
-# for every subject create combinations create combinations
-# Create the directory if it doesn't exist
+# all genuine pairs are compared, while only about <num_impostor_pairs>
+# impostor pairs are sampled, each one standing for <weight> pairs
+num_impostor_pairs = 1000
 
 path = "/content/sample_data/dataset"
 
@@ -662,33 +687,31 @@ pairs = []
 for value in file:
   list2.append(os.path.join(path, value))
 
+# dynamicaly acquired faces, described only once
+descriptions = []
+for file_path in list2:
+  face = enhance(acquire_from_file(file_path), view=False)
+  descriptions.append(describe(face))
 
-for pair in combinations(list2 ,2):
-  # dynamicaly acquired faces
-  image_1 = acquire_from_file(pair[0])
-  image_2 = acquire_from_file(pair[1])
-  face_1 = enhance(image_1, view=False)
-  face_2 = enhance(image_2)
-
-  description_1 = describe(face_1)
-  description_2 = describe(face_2)
-
-  distance = match(description_1, description_2)
-  file1 = pair[0].split('/')
-  file1 = file1[2].split('.')
-
-  file2 = pair[1].split('/')
-  file2 = file2[2].split('.')
-
-  if (file1[0] == file2[0]):
-    pairs.append([1, distance])
-  else:
-    pairs.append([0, distance])
+subject_ids = [os.path.basename(file_path).split('.')[0] for file_path in list2]
+genuine_firsts, genuine_seconds = metrics.enumerate_genuine_pairs(subject_ids)
+impostor_firsts, impostor_seconds, impostor_weights = \
+  metrics.sample_impostor_pairs(subject_ids, num_impostor_pairs, seed=0)
 
+for i, j in zip(genuine_firsts, genuine_seconds):
+  pairs.append([1, match(descriptions[i], descriptions[j]), 1.0])
+for i, j, weight in zip(impostor_firsts, impostor_seconds, impostor_weights):
+  pairs.append([0, match(descriptions[i], descriptions[j]), weight])
 
 df = pd.DataFrame(pairs)
 df.to_csv('output.csv', index=None, header=None)
 
+# weighted observations estimate the FMR, EER, AUC and d' of all the impostor pairs
+observations = (df[0].to_numpy(), df[1].to_numpy(dtype=np.float64), df[2].to_numpy(dtype=np.float64))
+print('EER:', metrics.compute_fmr_fnmr_eer(observations, is_similarity=False))
+print('AUC:', metrics.compute_fmr_tmr_auc(observations, is_similarity=False)[0])
+print("d':", metrics.compute_d_prime(observations))
+
 import os
 import zipfile
 import pandas as pd
@@ -733,48 +756,15 @@ df.to_csv('outputQueries.csv', index=None)
 
 
 
-# Computes FNMR and FMR at EER from the given similarity observations.
-# Observations must be an array of (<label>,<score>) elements.
-# Labels must be either 0 (impostor) or something else (genuine).
-# Output: FNMR, FMR, EER_THRESHOLD.
-# If either the number of impostors or genuine observations is zero,
-# it returns 'NaN', 'NaN', 'NaN'.
-def compute_fmr_fnmr_eer(observations, is_similarity=True):
-    # computed FNMR and FMR at EER, and EER threshold
-    output_fnmr = float('NaN') # nothing computed, returns not-a-number
-    output_fmr = float('NaN')
-    output_threshold = float('NaN')
-
-    # holds the difference between FMR and FNMR
-    fnmr_fmr_diff = float('inf') # a very large float
-
-    # sorted list of scores
-    scores = sorted([obs[1] for obs in observations])
-    if len(scores) > 0:
-      # for each score taken as threshold
-      for threshold in scores:
-        current_fnmr = compute_fnmr(observations, threshold, is_similarity)
-        current_fmr = compute_fmr(observations, threshold, is_similarity)
-
-        # cancels computation if any of the FNMR or FMR values are 'NaN' (impossible to compute them)
-        if not float('-inf') < current_fnmr < float('inf') or not float('-inf') < current_fmr < float('inf'):
-          break
-
-        # updates the difference between FNMR and FMR, if it is the case
-        current_diff = abs(current_fnmr - current_fmr)
-        if current_diff <= fnmr_fmr_diff:
-          fnmr_fmr_diff = current_diff
-
-          # updates current values
-          output_fnmr = current_fnmr
-          output_fmr = current_fmr
-          output_threshold = threshold
-
-        else:
-          # difference will start to increase, nothing to do anymore
-          break
+# Match scores of this notebook are ArcFace distances, thus the metrics
+# below take <is_similarity> as False by default; they are computed by the
+# engine of the metrics notebook (see <code>load_notebook_functions</code>).
 
-    return output_fnmr, output_fmr, output_threshold
+# Computes FNMR and FMR at EER from the given observations
+# (see <code>compute_fmr_fnmr_eer</code> of the metrics notebook).
+# Output: FNMR, FMR, EER_THRESHOLD.
+def compute_fmr_fnmr_eer(observations, is_similarity=False):
+    return metrics.compute_fmr_fnmr_eer(observations, is_similarity)
 
 import pandas as pd
 
@@ -811,47 +801,13 @@ def plot_hist(observations):
 
     plt.show()
 
-# Computes FMR x TMR (a.k.a. 1.0 - FNMR) AUC from the given similarity observations.
-# Observations must be an array of (<label>,<score>) elements.
-# Labels must be either 0 (impostor) or something else (genuine).
+# Computes FMR x TMR (a.k.a. 1.0 - FNMR) AUC from the given observations
+# (see <code>compute_fmr_tmr_auc</code> of the metrics notebook).
 # Output: AUC, array with FMR values, array with TMR values.
-# If either the number of impostors or genuine observations is zero, it returns 'NaN', [], [].
 def compute_fmr_tmr_auc(observations, is_similarity=False):
-    # output values
-    auc = float('NaN') # nothing computed, returns not-a-number
-    fmrs = []
-    tmrs = []
-
-    # sorted list of scores
-    scores = 4004
-    if len(scores) > 0:
-      # for each score taken as a threshold
-      for threshold in scores:
-        current_fmr = compute_fmr(observations, threshold, is_similarity)
-        current_fnmr = compute_fnmr(observations, threshold, is_similarity)
-
-        # cancels computation if any of the FNMR or FMR values are 'NaN' (impossible to compute them)
-        if not float('-inf') < current_fmr < float('inf') or not float('-inf') < current_fnmr < float('inf'):
-          break
-
-        # adds the computed values to the proper lists
-        fmrs.append(current_fmr)
-        tmrs.append(1.0 - current_fnmr)
-
-      # computes the AUC
-      if len(fmrs) > 0 and len(tmrs) > 0:
-        # adds the last points on [0.0, 0.0] for completeness
-        fmrs.append(0.0)
-        tmrs.append(0.0)
-
-        auc_parts = []
-        for i in range(len(fmrs) - 1):
-          auc_parts.append(abs(fmrs[i] - fmrs[i + 1]) * (tmrs[i] + tmrs[i + 1]) / 2.0)
-        auc = _pairwise_sum(auc_parts)
-
-    return auc, fmrs, tmrs
-
-def plot_fmr_tmr_auc(observations, is_similarity):
+    return metrics.compute_fmr_tmr_auc(observations, is_similarity)
+
+def plot_fmr_tmr_auc(observations, is_similarity=False):
     plt.xlabel('FMR')
     plt.ylabel('TMR')
 
@@ -545,6 +545,25 @@ desc_2 = describe(norm_iris_2)
 distance = match(desc_1, mask_iris_1, desc_2, mask_iris_2)
 print('Distance:', distance)
 
+"""---
+### Metrics engine
+
+The distances are evaluated with the metrics notebook: its functions are loaded from its export
+(<code>copy_of_01_metrics.py</code>, uploaded to <code>/content</code>) by the loader shared with
+the faces notebook (<code>notebook_loader.py</code>, uploaded there too), instead of being copied here.
+"""
+
+# imports the loader of notebook functions (see notebook_loader.py,
+# uploaded to /content)
+import sys
+sys.path.append('/content')
+from notebook_loader import load_notebook_functions
+
+metrics = load_notebook_functions('/content/copy_of_01_metrics.py')
+
+# tests the loaded metrics: genuine distances below the impostor ones
+assert metrics.compute_fmr_fnmr_eer([(1, 0.2), (0, 0.8)], is_similarity=False) == (0.0, 0.0, 0.2)
+
 """---
 ## Exercise
 Compute the distances for all the possible iris pairs:
@@ -562,7 +581,10 @@ Do the distance values make sense?
 
 import os
 import pandas as pd
-from itertools import combinations
+
+# all genuine pairs are compared, while only about <num_impostor_pairs>
+# impostor pairs are sampled, each one standing for <weight> pairs
+num_impostor_pairs = 1000
 
 path = "/content/sample_data/assign_4_data/dataset"
 
@@ -574,36 +596,34 @@ pairs = []
 
 reference_image = acquire_from_file('/content/sample_data/assign_4_data/dataset/0311.png')
 
-for file_path in combinations(list2, 2):
-  iris_1 = acquire_from_file(file_path[0])
-  iris_2 = acquire_from_file(file_path[1])
-
-  norm_iris_1, mask_iris_1 = enhance(iris_1)
-  norm_iris_2, mask_iris_2 = enhance(iris_2)
-
-  desc_1 = describe(norm_iris_1)
-  desc_2 = describe(norm_iris_2)
-
-  distance = match(desc_1, mask_iris_1, desc_2, mask_iris_2)
-  print('Distance:', distance)
-
-  print(f"File: {file_path}, Distance: {distance}")
-
-
-  file1 = os.path.basename(file_path[0]).split('.')
-  file2 = os.path.basename(file_path[1]).split('.')
-  id1 = file1[0].split('_')
-  id2 = file2[0].split('_')
-
-    # Check if the images are of the same subject
-  if id1[0] == id2[0]:
-      pairs.append([1, distance])
-      print('gen')
-  else:
-      pairs.append([0, distance])
-      print('imp')
+# every iris is enhanced and described only once
+descriptions = []
+for file_path in list2:
+  norm_iris, mask_iris = enhance(acquire_from_file(file_path))
+  descriptions.append((describe(norm_iris), mask_iris))
+
+# subject of every file: the name prefix before the first '_'
+subject_ids = [os.path.basename(file_path).split('.')[0].split('_')[0] for file_path in list2]
+genuine_firsts, genuine_seconds = metrics.enumerate_genuine_pairs(subject_ids)
+impostor_firsts, impostor_seconds, impostor_weights = \
+  metrics.sample_impostor_pairs(subject_ids, num_impostor_pairs, seed=0)
+
+sampled_pairs = [(i, j, 1, 1.0) for i, j in zip(genuine_firsts, genuine_seconds)] + \
+                [(i, j, 0, weight) for i, j, weight in zip(impostor_firsts, impostor_seconds, impostor_weights)]
+for i, j, label, weight in sampled_pairs:
+  distance = match(descriptions[i][0], descriptions[i][1], descriptions[j][0], descriptions[j][1])
+  print(f"Files: {list2[i]}, {list2[j]}, Distance: {distance}")
+  pairs.append([label, distance, weight])
 
 # Create a DataFrame and save it to a CSV file
-df = pd.DataFrame(pairs, columns=['Same_Subject', 'Distance'])
+df = pd.DataFrame(pairs, columns=['Same_Subject', 'Distance', 'Weight'])
 df.to_csv('outputQueries.csv', index=None)
 
+# Hamming distances: the smaller, the more likely of the same subject;
+# weighted observations estimate the FMR, EER, AUC and d' of all the impostor pairs
+observations = (df['Same_Subject'].to_numpy(), df['Distance'].to_numpy(dtype=np.float64),
+                df['Weight'].to_numpy(dtype=np.float64))
+print('EER:', metrics.compute_fmr_fnmr_eer(observations, is_similarity=False))
+print('AUC:', metrics.compute_fmr_tmr_auc(observations, is_similarity=False)[0])
+print("d':", metrics.compute_d_prime(observations))
+
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Loader of the functions of exported notebooks.
+
+Lets a notebook use the functions of another one (e.g., the metrics engine of
+<code>copy_of_01_metrics.py</code>), loaded from its export uploaded to
+<code>/content</code>, instead of copying them.
+
+Language: Python 3
+"""
+
+import ast
+import builtins
+import types
+
+# Returns the set of names read by the given function <node> (a FunctionDef)
+# that are not bound within it, i.e., the global names it depends on.
+def _get_global_names(node):
+    read_names = set()
+    bound_names = set()
+    global_names = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name):
+            if isinstance(child.ctx, ast.Load):
+                read_names.add(child.id)
+            else:
+                bound_names.add(child.id)
+        elif isinstance(child, ast.arg):
+            bound_names.add(child.arg)
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and child is not node:
+            bound_names.add(child.name)
+        elif isinstance(child, (ast.Import, ast.ImportFrom)):
+            bound_names.update((alias.asname or alias.name).split('.')[0] for alias in child.names)
+        elif isinstance(child, ast.ExceptHandler) and child.name is not None:
+            bound_names.add(child.name)
+        elif isinstance(child, ast.Global):
+            global_names.update(child.names)
+
+    return (read_names - bound_names) | global_names
+
+# Returns the set of names read by the given module-level statement <node>.
+def _get_read_names(node):
+    return {child.id for child in ast.walk(node)
+            if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load)}
+
+# Returns the set of names assigned by the given module-level statement <node>.
+def _get_assigned_names(node):
+    targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+    return {child.id for target in targets for child in ast.walk(target)
+            if isinstance(child, ast.Name)}
+
+# Loads the functions of the notebook exported into the given <file_path>,
+# together with its imports and the module-level values the functions depend
+# on (and those values, on their turn), skipping its shell commands, tests,
+# and plots.
+# Raises NameError if a loaded function depends on a name that the notebook
+# does not define this way, instead of failing only once it is called.
+# Output: namespace with the loaded functions (e.g., <code>metrics.compute_fmr_fnmr_eer</code>).
+def load_notebook_functions(file_path):
+    with open(file_path) as f:
+        source = ''.join(line for line in f if not line.lstrip().startswith(('!', '%')))
+
+    module = ast.parse(source, file_path)
+    functions = [node for node in module.body if isinstance(node, ast.FunctionDef)]
+    assignments = [node for node in module.body if isinstance(node, (ast.Assign, ast.AnnAssign))]
+    defined_names = {node.name for node in functions} | set(dir(builtins))
+    for node in module.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            defined_names.update((alias.asname or alias.name).split('.')[0] for alias in node.names)
+
+    # module-level values the functions depend on, transitively
+    needed_names = set().union(*(_get_global_names(node) for node in functions)) - defined_names
+    kept_assignments = set()
+    while True:
+        new_assignments = [node for node in assignments
+                           if node not in kept_assignments and _get_assigned_names(node) & needed_names]
+        if len(new_assignments) == 0:
+            break
+        for node in new_assignments:
+            kept_assignments.add(node)
+            defined_names.update(_get_assigned_names(node))
+            needed_names.update(_get_read_names(node))
+        needed_names = needed_names - defined_names
+
+    if len(needed_names) > 0:
+        raise NameError('Names not defined by ' + str(file_path) + ': ' + ', '.join(sorted(needed_names)))
+
+    module.body = [node for node in module.body
+                   if isinstance(node, (ast.FunctionDef, ast.Import, ast.ImportFrom)) or node in kept_assignments]
+    namespace = {}
+    exec(compile(module, file_path, 'exec'), namespace)
+    return types.SimpleNamespace(**namespace)